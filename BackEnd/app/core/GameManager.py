@@ -155,6 +155,10 @@ class GameManager:
             2: "mcts",
             3: "mcts-parallel",
             4: "alphazero",
+            5: "mcts-threads",
+            6: "alphabeta",
+            7: "paranoid",
+            8: "maxn",
         }
 
         turn_info = TurnInfo(
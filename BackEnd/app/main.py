@@ -5,16 +5,20 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.api import users, lobby, game, local_game
 from app.api.websockets import connection
+from engine.core.matrices.warmup import warm_up
+from engine.agents.MCTSWorkerPool import MCTSWorkerPool
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Start the background task for cleaning up expired lobbies."""
+    """Compile the engine kernels and start the background task for cleaning up expired lobbies."""
+    app.state.warm_up_metrics = warm_up(verbose=1)
     lobby_task = asyncio.create_task(lobby.remove_expired_lobbies())  
     game_task = asyncio.create_task(game.check_game_timeouts())  
     yield  
     lobby_task.cancel()
     game_task.cancel()
+    MCTSWorkerPool.shutdown_all()
 
 
 app = FastAPI(title="Chess Game API", lifespan=lifespan)
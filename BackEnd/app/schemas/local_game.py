@@ -5,7 +5,7 @@ from typing import List, Literal, Dict, Optional
 class PlayerData(BaseModel):
     name: str
     index: int
-    type: Literal["human", "random", "mcts", "mcts-parallel", "alphazero"]
+    type: Literal["human", "random", "mcts", "mcts-parallel", "alphazero", "mcts-threads", "alphabeta", "paranoid", "maxn"]
     color: str
 
 class TurnInfo(BaseModel):
@@ -95,7 +95,7 @@ class ChessFactory:
         return players
     
     @staticmethod
-    def create_player_data(num_players: int = 4, types: List[Literal['human', 'random', 'mcts', 'mcts-parallel', 'alphazero']] = ['random'] * 4) -> List[Tuple[str]]: 
+    def create_player_data(num_players: int = 4, types: List[Literal['human', 'random', 'mcts', 'mcts-parallel', 'alphazero', 'mcts-threads', 'alphabeta', 'paranoid', 'maxn']] = ['random'] * 4) -> List[Tuple[str]]: 
         if len(types) == 1: 
             types *= num_players
         if num_players == 4: 
@@ -207,6 +207,7 @@ class ChessFactory:
         for i, piece in enumerate(game.board.pieces): 
             if piece[2] != -1: 
                 game.board.nodes[piece[2]] = i
+        game.update_attack_maps()
 
         return game, data['history']
 
@@ -267,6 +268,10 @@ class MatrixChessFactory:
             "mcts":          2,
             "mcts-parallel": 3, 
             "alphazero":     4,
+            "mcts-threads":  5,
+            "alphabeta":     6,
+            "paranoid":      7,
+            "maxn":          8,
         }
         
         players_list = [(0, 0, False, 0, 'none') for _ in range(4)]
@@ -0,0 +1,135 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+import time
+
+import numpy as np
+
+from engine.agents.Agent import Agent
+from engine.utils.TranspositionTable import TranspositionTable
+from engine.core.matrices.alpha_beta import (
+    negamax,
+    MAX_PLY,
+    MATE_BOUND,
+    INFINITY,
+    NODES,
+    NODE_LIMIT,
+    DEADLINE,
+    ABORTED,
+    ROOT_UPDATED,
+    PLIES_LEFT,
+    NO_CAPTURE_LIMIT
+)
+from engine.core.matrices.matrix_constants import MAX_POSSIBLE_MOVES
+from engine.core.constants import MAX_MOVES_WITHOUT_CAPTURE
+
+if TYPE_CHECKING:
+    from engine.core.GameMatrices import GameMatrices
+
+
+class AlphaBeta(Agent):
+    def __init__(self, game: GameMatrices, **kwargs) -> None:
+        """ Alpha-beta search for 2 player games: iterative deepening principal variation search with a
+        transposition table, MVV-LVA / killer / history move ordering and a quiescence search on captures.
+        The search stops at the time or node limit, whichever comes first, and plays the best move found.
+
+        Args:
+            game (GameMatrices): instance of game in wich we will search.
+            time: seconds per move. Defaults to 5
+            max_nodes: nodes searched per move. Defaults to 2000000
+            max_depth: deepest iteration. Defaults to 32
+            tt_bytes: memory of the transposition table. Defaults to 16 MB
+        """
+        self.game = game
+        self.time = kwargs.get('time', 5)
+        self.max_nodes = kwargs.get('max_nodes', 2000000)
+        self.max_depth = min(kwargs.get('max_depth', 32), MAX_PLY - 1)
+
+        # Kept between moves, the entries are identified by the position hash
+        self.table = TranspositionTable(max_bytes=kwargs.get('tt_bytes', 16 << 20), values=1)
+
+        self.moves = np.empty((MAX_PLY, MAX_POSSIBLE_MOVES, 2), dtype=np.uint8)
+        self.hashes = np.empty((MAX_PLY, MAX_POSSIBLE_MOVES), dtype=np.uint64)
+        self.counts = np.zeros(MAX_PLY, dtype=np.uint8)
+        self.scores = np.empty((MAX_PLY, MAX_POSSIBLE_MOVES), dtype=np.int32)
+
+        # Statistics of the last search
+        self.depth = 0
+        self.score = 0
+        self.nodes = 0
+
+    def choose_move(self):
+        game = self.game
+        if game.number_of_players != 2:
+            raise ValueError("AlphaBeta only plays 2 player games")
+
+        start = time.perf_counter_ns()
+        player = game.get_turn(auto_play_bots=False)
+        moves = game.get_movements()
+        if len(moves) == 0:
+            return
+        if len(moves) == 1:
+            return moves[0]
+
+        self.table.new_search()
+        b = game.board
+        nodes = b.nodes.copy()
+        pieces = b.pieces.copy()
+        attacks = game.attacks.copy()
+        history = np.zeros((game.moves_count + MAX_PLY + 1, game.history.shape[1]), dtype=game.history.dtype)
+        history[:game.moves_count] = game.history[:game.moves_count]
+        teams = np.array([game.players[player]['team'], game.players[1 - player]['team']], dtype=np.uint8)
+        alive = game.players['is_alive'][:game.number_of_players]
+        side_keys = np.array([game.hasher.state_key(player, alive), game.hasher.state_key(1 - player, alive)],
+                             dtype=np.uint64)
+
+        # Positions already played (the search treats a single repetition as a draw), then the search path
+        path_base = sum(game.positions_counter.values())
+        path_hashes = np.empty(path_base + MAX_PLY, dtype=np.uint64)
+        path_hashes[:path_base] = np.repeat(
+            np.array(list(game.positions_counter.keys()), dtype=np.uint64),
+            np.array(list(game.positions_counter.values()), dtype=np.int64)
+        )
+
+        killers = np.full((MAX_PLY, 2, 2), -1, dtype=np.int16)
+        history_scores = np.zeros((len(nodes), len(nodes)), dtype=np.int32)
+        root_move = np.zeros(2, dtype=np.uint8)
+        info = np.zeros(7, dtype=np.int64)
+        info[PLIES_LEFT] = game.max_turns - game.moves_count
+        info[NO_CAPTURE_LIMIT] = MAX_MOVES_WITHOUT_CAPTURE * game.number_of_players
+
+        info[DEADLINE] = start + int(self.time * 1e9)
+
+        best_move = moves[0]
+        self.depth, self.score, self.nodes = 0, 0, 0
+        for depth in range(1, self.max_depth + 1):
+            if time.perf_counter_ns() >= info[DEADLINE] or self.nodes >= self.max_nodes:
+                break
+            # Both limits are checked by the compiled search, which is aborted when one is reached
+            info[NODES], info[NODE_LIMIT], info[ABORTED], info[ROOT_UPDATED] = 0, self.max_nodes - self.nodes, 0, 0
+
+            score = negamax(
+                depth, 0, -INFINITY, INFINITY, 0, np.uint64(game.board_hash), game.moves_without_capture, teams,
+                nodes, pieces, attacks, history, game.moves_count, b.adjacency_list, b.patterns_offsets,
+                b.pieces_offsets, b.tiles_offsets, b.promotion_zones, game.hasher.table, side_keys, b.pieces_per_player,
+                self.moves, self.hashes, self.counts, self.scores, path_hashes, path_base, self.table.entries,
+                self.table.header, killers, history_scores,
+                root_move, info
+            )
+            self.nodes += int(info[NODES])
+
+            # The first root move is the best one of the previous iteration: a move that replaced it
+            # before the search was aborted is better, even if the iteration is not complete
+            if info[ROOT_UPDATED]:
+                best_move = root_move.copy()
+            if info[ABORTED]:
+                break
+            self.depth, self.score = depth, score
+            if abs(score) > MATE_BOUND:
+                break
+
+        # The move from the list, as the other agents return
+        for move in moves:
+            if move[0] == best_move[0] and move[1] == best_move[1]:
+                return move
+        return moves[0]
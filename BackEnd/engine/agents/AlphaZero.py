@@ -7,7 +7,9 @@ import torch
 device = torch.device("cpu")
 
 from engine.agents.Agent import Agent
-from engine.agents.alpha_zero_training.GNNetwork import AlphaZeroGNN
+from engine.agents.ModelRegistry import ModelRegistry
+from engine.utils.InferenceCache import InferenceCache
+from engine.core.matrices.matrix_constants import MAX_POSSIBLE_MOVES
 
 if TYPE_CHECKING: 
     from engine.core.GameMatrices import GameMatrices
@@ -18,23 +20,55 @@ class AlphaZero(Agent):
     def __init__(self, 
                  game: GameMatrices, 
                  representation: BaseMatrixBoard, 
-                 network, 
+                 network = None, 
                  mcts_simulations: int = 1500,
-                 C: int = 1.4):
+                 C: int = 1.4, 
+                 model_path: str = None, 
+                 batch_size: int = 8, 
+                 virtual_loss: int = 1, 
+                 use_cache: bool = True):
+        """ network: a loaded network to use. If None, the shared model of model_path (or the default model) 
+        is taken from the ModelRegistry, and only loaded when the first move is chosen. 
+        batch_size: leaves evaluated together in one forward pass of the network (see run_batch). 
+        virtual_loss: visits lost added to the moves that lead to a leaf waiting to be evaluated. 
+        use_cache: reuse the evaluations of the network kept in its InferenceCache (shared by every agent 
+        using the same network), so the positions of the previous searches are not evaluated again. """
         self.game = game
         self.representation = representation
     
-        self.network = network.to(device)
+        self._network = network.to(device) if network is not None else None
+        self.model_path = model_path
 
         self.mcts_simulations = mcts_simulations
         self.C = C
+        self.batch_size = batch_size
+        self.virtual_loss = virtual_loss
+        self.use_cache = use_cache
+
+    @property
+    def network(self): 
+        if self._network is not None: 
+            return self._network
+        return ModelRegistry.get(self.model_path)
+
+    @property
+    def cache(self): 
+        return InferenceCache.for_network(self.network) if self.use_cache else None
 
     def choose_move(self): 
         player = self.game.get_turn(auto_play_bots=False)
 
+        # The search plays the moves on one copy of the game and of the representation and undoes them 
+        # after every descent, so they are back at the current position for the next one
+        game = self.game.copy()
+        representation = self.representation.copy()
+        self.allocate(game, representation)
+
         N, W, Q, P = {}, {}, {}, {}
-        for sim in range(self.mcts_simulations): 
-            self.run_simulation(self.game.copy(), self.representation.copy(), N, W, Q, P)
+        simulations = 0
+        while simulations < self.mcts_simulations: 
+            simulations += self.run_batch(game, representation, N, W, Q, P, 
+                                          min(self.batch_size, self.mcts_simulations - simulations))
 
         moves, hashes = self.game.get_movements(include_hashes=True)
 
@@ -43,14 +77,83 @@ class AlphaZero(Agent):
         move = moves[best_move_index]
 
         return move
+
+    def allocate(self, game, representation): 
+        """ Buffers of the search: the leaves of a batch (players, node features, moves and the hashes 
+        they lead to) and the features of the tiles changed by every move of a descent, to undo them. """
+        num_nodes, num_features = representation.nodes.shape
+        self.players = np.zeros(self.batch_size, dtype=np.int64)
+        self.states = np.empty((self.batch_size, num_nodes, num_features), dtype=representation.nodes.dtype)
+        self.moves = np.empty((self.batch_size, MAX_POSSIBLE_MOVES, 2), dtype=np.int64)
+        self.hashes = np.empty((self.batch_size, MAX_POSSIBLE_MOVES), dtype=np.uint64)
+        self.counts = np.zeros(self.batch_size, dtype=np.int64)
+        self.saved = np.empty((game.max_turns + 1, 2, num_features), dtype=representation.nodes.dtype)
+
+    def run_batch(self, game, representation, N, W, Q, P, batch_size): 
+        """ Runs up to batch_size simulations, evaluating their leaves with a single forward pass of the network, 
+        and backpropagates their values. Returns the simulations done. 
+        While a leaf waits to be evaluated, the moves leading to it count as visits that were lost (virtual loss), 
+        so the next descents of the batch prefer other paths. A descent that reaches a leaf already in the batch 
+        is discarded, and the batch is evaluated once batch_size descents have been discarded. 
+        The leaves found in the cache are expanded and backpropagated without waiting for the batch. """
+        cache = self.cache
+        virtual = {}
+        leaves, leaf_hashes = [], set()
+        path = []
+        simulations, discarded = 0, 0
+
+        while simulations < batch_size and discarded < batch_size: 
+            trajectory, player = self.select_leaf(game, representation, N, Q, P, virtual, path)
+
+            if player == -1: 
+                # The game finished during the descent
+                self.backpropagate(trajectory, game.rewards, N, W, Q)
+                simulations += 1
+            elif game.hash in leaf_hashes: 
+                discarded += 1
+            else: 
+                entry = cache.load(player, game.hash) if cache is not None else None
+                if entry is not None: 
+                    priors, v = entry
+                    self.expand(player, priors['hash'], priors['prior'], P)
+                    self.backpropagate(trajectory, self.leaf_rewards(player, v), N, W, Q)
+                else: 
+                    i = len(leaves)
+                    moves, hashes = game.get_movements(include_hashes=True)
+                    self.players[i] = player
+                    self.states[i] = representation.nodes
+                    self.moves[i, :len(moves)] = moves
+                    self.hashes[i, :len(moves)] = hashes
+                    self.counts[i] = len(moves)
+
+                    leaf_hashes.add(game.hash)
+                    leaves.append((trajectory, game.hash))
+                    for key in trajectory: 
+                        virtual[key] = virtual.get(key, 0) + self.virtual_loss
+                simulations += 1
+
+            self.unwind(game, representation, path)
+
+        if leaves: 
+            count = len(leaves)
+            probs, values = self.evaluate(self.states[:count], self.players[:count], 
+                                          self.moves[:count], self.counts[:count])
+            for i, (trajectory, position_hash) in enumerate(leaves): 
+                player, hashes, priors = self.players[i], self.hashes[i, :self.counts[i]], probs[i, :self.counts[i]]
+                self.expand(player, hashes, priors, P)
+                if cache is not None: 
+                    cache.store(player, position_hash, hashes, priors, values[i])
+                self.backpropagate(trajectory, self.leaf_rewards(player, values[i]), N, W, Q)
+        return simulations
     
-    def run_simulation(self, game, representation, N, W, Q, P): 
+    def select_leaf(self, game, representation, N, Q, P, virtual, path): 
+        """ Descends by PUCT, playing the moves on game and representation (and adding them to path), until 
+        a position whose moves have no prior yet. Returns the moves played, as (player, position hash) keys, 
+        and the player in turn at the leaf, -1 if the game finished. 
+        The visits of the virtual loss count as visits with a value of -1 for the player that moves. """
         trajectory = []
 
         player = game.get_turn(auto_play_bots=False)
-        expand = True
-        v = None
-
         while not game.is_finished():
             if player == -1:
                 game.next_turn()
@@ -59,32 +162,11 @@ class AlphaZero(Agent):
 
             moves, hashes = game.get_movements(include_hashes=True)
 
-            if any((player, child_hash) not in P for child_hash in hashes) and expand:
-                expand = False  # Only expand once per simulation
-                state = representation.to_pyg_data(device)
-
-                moves_tensor = torch.tensor(moves, dtype=torch.long).to(device)
-                player_tensor = torch.tensor([player], dtype=torch.long).to(device)
-
-                with torch.no_grad():   
-                    prior_policy, v = self.network(
-                        x=state.x,
-                        edge_index=state.edge_index,
-                        move_index=moves_tensor,
-                        player=player_tensor,
-                    )
-                prior_policy = prior_policy[0]
-                v = v[0]
-
-                probs = torch.softmax(prior_policy, dim=0).detach().cpu().numpy()
-
-                for i, state_hash in enumerate(hashes):
-                    P[(player, state_hash)] = probs[i]
-
-                break  # Stop simulation, backpropagate value v
+            if any((player, child_hash) not in P for child_hash in hashes):
+                return trajectory, player
 
             # Otherwise select move by UCB as usual
-            total_N = sum(N.get((player, h), 1) for h in hashes)
+            total_N = sum(N.get((player, h), 1) + virtual.get((player, h), 0) for h in hashes)
             best_score = -float('inf')
             best_move, best_state = None, None
 
@@ -95,6 +177,11 @@ class AlphaZero(Agent):
                 q = Q.get(key, 0)
                 p = P.get(key, 0)
 
+                lost = virtual.get(key, 0)
+                if lost: 
+                    q = (q * n - lost) / (n + lost)
+                    n += lost
+
                 ucb = q + self.C * p * np.sqrt(total_N + 1) / (1 + n)
                 if ucb > best_score:
                     best_score = ucb
@@ -102,20 +189,55 @@ class AlphaZero(Agent):
                     best_state = state_hash
 
             history_movement = game.make_move(best_move, precomputed_hash=best_state)
-            representation.update_board(history_movement)
+            representation.update_board(history_movement, self.saved[len(path)])
+            path.append(history_movement)
 
             trajectory.append((player, best_state))
 
             game.next_turn()
             player = game.get_turn(auto_play_bots=False)
 
+        return trajectory, -1
+
+    def unwind(self, game, representation, path): 
+        """ Undoes the moves of the descent, back to the position of the root. """
+        while path: 
+            game.undo_move()
+            representation.undo_update(path.pop(), self.saved[len(path)])
+
+    def evaluate(self, states, players, moves, counts): 
+        """ Evaluates a batch of positions in one forward pass: node features [B, nodes, features], player in turn 
+        [B], legal moves [B, max moves, 2] and number of legal moves [B]. Returns the priors of the moves [B, max moves] 
+        and the value of every position for the player in turn. """
+        max_moves = counts.max()
+
+        move_index = moves[:, :max_moves].copy()
+        move_index[np.arange(max_moves)[None, :] >= counts[:, None]] = -1
+
+        batch = self.representation.batch_to_pyg_data(states, device)
+        with torch.no_grad():   
+            prior_policy, v = self.network(
+                x=batch.x,
+                edge_index=batch.edge_index,
+                move_index=torch.from_numpy(move_index).to(device),
+                player=torch.from_numpy(players).to(device),
+                batch=batch.batch,
+            )
+        return torch.softmax(prior_policy, dim=1).cpu().numpy(), v.cpu().numpy()
+
+    @staticmethod
+    def expand(player, hashes, priors, P): 
+        for state_hash, prior in zip(hashes, priors):
+            P[(player, state_hash)] = prior
+
+    @staticmethod
+    def leaf_rewards(player, v): 
         rewards = [0, 0]
-        if v is not None: 
-            rewards[1 - player] = -v
-        else: 
-            rewards = game.rewards
+        rewards[1 - player] = -v
+        return rewards
 
-        # BackPropagate
+    @staticmethod
+    def backpropagate(trajectory, rewards, N, W, Q): 
         for player, state_hash in trajectory:
             key = (player, state_hash)
             reward = rewards[player]
@@ -123,13 +245,7 @@ class AlphaZero(Agent):
             N[key] = N.get(key, 0) + 1
             W[key] = W.get(key, 0) + reward
             Q[key] = W[key] / N[key]
-
-        return trajectory
     
     @staticmethod
     def load_network(network_path): 
-        network = AlphaZeroGNN(13, 256)
-        state_dict = torch.load(network_path)
-        network.load_state_dict(state_dict)
-        network.eval()
-        return network
\ No newline at end of file
+        return ModelRegistry.load(network_path)
@@ -0,0 +1,356 @@
+from typing import List
+from numba import njit
+import numpy as np
+
+
+@njit(cache=True)
+def find_slot(table: np.array, node_hash: np.array, node_player: np.array, hash_: np.uint64, player: int) -> int:
+    """ Slot of the (player, hash) node in the open addressing index, or of the empty slot where it would go. """
+    mask = table.shape[0] - 1
+    slot = (hash_ ^ np.uint64(player + 1)) & np.uint64(mask)
+    while True:
+        node = table[slot]
+        if node == -1 or (node_hash[node] == hash_ and node_player[node] == player):
+            return slot
+        slot = (slot + np.uint64(1)) & np.uint64(mask)
+
+
+@njit(cache=True)
+def get_or_add_node(table: np.array, node_hash: np.array, node_player: np.array, visits: np.array, wins: np.array,
+                    in_tree: np.array, to_move: np.array, num_children: np.array, hash_: np.uint64, player: int,
+                    num_nodes: int) -> int:
+    """ Node of (player, hash). If it does not exist it is created as node num_nodes (there must be room). """
+    slot = find_slot(table, node_hash, node_player, hash_, player)
+    if table[slot] != -1:
+        return table[slot]
+
+    node = num_nodes
+    table[slot] = node
+    node_hash[node] = hash_
+    node_player[node] = player
+    visits[node] = 0
+    wins[node] = 0
+    in_tree[node] = False
+    to_move[node] = -1
+    num_children[node] = 0
+    return node
+
+
+@njit(cache=True)
+def add_children(hashes: np.array, to_move: int, start: int, child_node: np.array, table: np.array,
+                 node_hash: np.array, node_player: np.array, visits: np.array, wins: np.array,
+                 in_tree: np.array, node_to_move: np.array, num_children: np.array, num_nodes: int) -> int:
+    """ Fills the block of children starting at start with the nodes of the given positions.
+    Returns the new number of nodes. """
+    for i in range(hashes.shape[0]):
+        node = get_or_add_node(table, node_hash, node_player, visits, wins, in_tree, node_to_move,
+                               num_children, hashes[i], to_move, num_nodes)
+        if node == num_nodes:
+            num_nodes += 1
+        child_node[start + i] = node
+    return num_nodes
+
+
+@njit(cache=True)
+def rebuild_table(table: np.array, node_hash: np.array, node_player: np.array, num_nodes: int) -> None:
+    table[:] = -1
+    for node in range(num_nodes):
+        table[find_slot(table, node_hash, node_player, node_hash[node], node_player[node])] = node
+
+
+@njit(cache=True)
+def reachable_nodes(root: int, first_child: np.array, num_children: np.array, child_node: np.array,
+                    num_nodes: int) -> tuple:
+    """ Nodes reachable from the root through the child blocks, in breadth first order (the root first),
+    and the new index of every node (-1 if it is not reachable). """
+    new_index = np.full(num_nodes, -1, dtype=np.int32)
+    order = np.empty(num_nodes, dtype=np.int32)
+    new_index[root] = 0
+    order[0] = root
+    count = 1
+    i = 0
+    while i < count:
+        node = order[i]
+        i += 1
+        for c in range(first_child[node], first_child[node] + num_children[node]):
+            child = child_node[c]
+            if new_index[child] == -1:
+                new_index[child] = count
+                order[count] = child
+                count += 1
+    return order[:count], new_index
+
+
+@njit(cache=True)
+def compact_children(order: np.array, new_index: np.array, first_child: np.array, num_children: np.array,
+                     child_node: np.array, child_move: np.array, new_first_child: np.array,
+                     new_child_node: np.array, new_child_move: np.array) -> int:
+    """ Copies the child blocks of the kept nodes one after the other, with the new node indexes.
+    Returns the number of children stored. """
+    total = 0
+    for i in range(order.shape[0]):
+        node = order[i]
+        start = first_child[node]
+        new_first_child[i] = total
+        for j in range(num_children[node]):
+            new_child_node[total + j] = new_index[child_node[start + j]]
+            new_child_move[total + j] = child_move[start + j]
+        total += num_children[node]
+    return total
+
+
+@njit(cache=True)
+def select_child(first_child: int, num_children: int, child_node: np.array, visits: np.array,
+                 wins: np.array, C: float) -> int:
+    """ UCB1 over the children of a node. Returns the index of the best child (relative to first_child),
+    or -1 if some child has not been visited yet. """
+    total = 0
+    for i in range(first_child, first_child + num_children):
+        n = visits[child_node[i]]
+        if n == 0:
+            return -1
+        total += n
+
+    log_total = np.log(total)
+    best, best_value = 0, -np.inf
+    for i in range(num_children):
+        node = child_node[first_child + i]
+        value = wins[node] / visits[node] + C * np.sqrt(log_total / visits[node])
+        if value > best_value:
+            best, best_value = i, value
+    return best
+
+
+@njit(cache=True)
+def backpropagate(path: np.array, rewards: np.array, player: np.array, visits: np.array, wins: np.array) -> None:
+    for node in path:
+        visits[node] += 1
+        wins[node] += rewards[player[node]]
+
+
+@njit(cache=True)
+def add_virtual_loss(path: np.array, amount: int, visits: np.array, wins: np.array) -> None:
+    """ Counts amount lost simulations (reward -1) on every node of the path, or removes them if amount is negative. """
+    for node in path:
+        visits[node] += amount
+        wins[node] -= amount
+
+
+class MCTSTree:
+    """ Search tree of MonteCarlo stored in numpy arrays.
+
+    A node is a position identified by (player that moved into it, hash), the same key the dictionaries
+    of the previous implementation used, so transpositions share their statistics. Nodes are found through
+    an open addressing table (table) indexed by the hash.
+    The children of a node are a contiguous block of the child arrays (one entry per legal move),
+    created the first time the node is searched. Child nodes are allocated with them but only count
+    as part of the tree (in_tree) once a simulation expands them.
+
+    Nodes are never removed one by one: collect keeps the nodes reachable from the current position and
+    compacts them to the front of the arrays, and prune evicts the least visited subtrees when the tree
+    goes over a size limit.
+    """
+    NODE_ARRAYS = ['visits', 'wins', 'player', 'hash', 'in_tree', 'to_move', 'first_child', 'num_children']
+    # Bytes per node: node arrays (29), index (8) and child entries (4 per node, 6 bytes each),
+    # doubled because the arrays grow by doubling
+    BYTES_PER_NODE = 2 * (29 + 8 + 4 * 6)
+
+    def __init__(self, capacity: int = 1 << 14) -> None:
+        self.visits = np.zeros(capacity, dtype=np.int32)
+        self.wins = np.zeros(capacity, dtype=np.float64) # Sum of the rewards of the player that moved into the node
+        self.player = np.zeros(capacity, dtype=np.int8)
+        self.hash = np.zeros(capacity, dtype=np.uint64)
+        self.in_tree = np.zeros(capacity, dtype=np.bool_)
+        self.to_move = np.full(capacity, -1, dtype=np.int8) # Player whose moves are stored as children
+        self.first_child = np.zeros(capacity, dtype=np.int32)
+        self.num_children = np.zeros(capacity, dtype=np.int16)
+        self.num_nodes = 0
+
+        self.child_node = np.zeros(capacity * 4, dtype=np.int32)
+        self.child_move = np.zeros((capacity * 4, 2), dtype=np.uint8)
+        self.num_children_total = 0
+
+        self.table = np.full(capacity * 2, -1, dtype=np.int32)
+
+    def __len__(self) -> int:
+        return self.num_nodes
+
+    @property
+    def nbytes(self) -> int:
+        arrays = [getattr(self, name) for name in self.NODE_ARRAYS] + [self.child_node, self.child_move, self.table]
+        return sum(a.nbytes for a in arrays)
+
+    @staticmethod
+    def nodes_for_bytes(max_bytes: int) -> int:
+        """ Approximate number of nodes that fit in max_bytes. """
+        return max(max_bytes // MCTSTree.BYTES_PER_NODE, 1)
+
+    def __getstate__(self) -> dict:
+        # Only the used part of the arrays is sent to other processes, the index is rebuilt there
+        state = self.__dict__.copy()
+        for name in self.NODE_ARRAYS:
+            state[name] = state[name][:self.num_nodes]
+        state['child_node'] = self.child_node[:self.num_children_total]
+        state['child_move'] = self.child_move[:self.num_children_total]
+        del state['table']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        capacity = 1 << 14
+        while capacity < self.num_nodes:
+            capacity *= 2
+        self._resize_nodes(capacity)
+        child_capacity = 4 * capacity
+        while child_capacity < self.num_children_total:
+            child_capacity *= 2
+        self._resize_children(child_capacity)
+        self.table = np.empty(2 * capacity, dtype=np.int32)
+        rebuild_table(self.table, self.hash, self.player, self.num_nodes)
+
+    def get_node(self, player: int, hash_: int) -> int:
+        """ Node of the position, created (outside of the tree) if it does not exist. """
+        self._reserve_nodes(1)
+        node = get_or_add_node(self.table, self.hash, self.player, self.visits, self.wins, self.in_tree,
+                               self.to_move, self.num_children, np.uint64(hash_), player, self.num_nodes)
+        if node == self.num_nodes:
+            self.num_nodes += 1
+        return node
+
+    def expand(self, node: int, to_move: int, moves: np.array, hashes: np.array) -> None:
+        """ Stores the moves of to_move from the node and their resulting positions as children. """
+        count = len(moves)
+        self._reserve_nodes(count)
+        while self.num_children_total + count > len(self.child_node):
+            self._grow_children()
+
+        start = self.num_children_total
+        self.num_children_total += count
+        self.child_move[start:start + count] = moves
+        self.num_nodes = add_children(hashes, to_move, start, self.child_node, self.table, self.hash, self.player,
+                                      self.visits, self.wins, self.in_tree, self.to_move, self.num_children,
+                                      self.num_nodes)
+
+        self.first_child[node] = start
+        self.num_children[node] = count
+        self.to_move[node] = to_move
+
+    def children(self, node: int) -> np.array:
+        start = self.first_child[node]
+        return self.child_node[start:start + self.num_children[node]]
+
+    def select(self, node: int, C: float) -> int:
+        return select_child(self.first_child[node], self.num_children[node], self.child_node,
+                            self.visits, self.wins, C)
+
+    def backpropagate(self, path: List[int], rewards: List[int]) -> None:
+        path = np.fromiter(dict.fromkeys(path), dtype=np.int32) # Transpositions are counted once per simulation
+        backpropagate(path, np.asarray(rewards, dtype=np.float64), self.player, self.visits, self.wins)
+
+    def changes_since(self, num_nodes: int, visits: np.array, wins: np.array, to_move: np.array) -> dict:
+        """ What the searches added to a copy of the tree whose first num_nodes nodes had the given statistics:
+        the statistics gained by every node and the nodes expanded, identified by (player, hash) so they can be
+        merged into another tree. """
+        base_visits = np.zeros(self.num_nodes, dtype=self.visits.dtype)
+        base_wins = np.zeros(self.num_nodes, dtype=self.wins.dtype)
+        base_to_move = np.full(self.num_nodes, -1, dtype=self.to_move.dtype)
+        base_visits[:num_nodes], base_wins[:num_nodes], base_to_move[:num_nodes] = visits, wins, to_move
+
+        updated = np.flatnonzero(self.visits[:self.num_nodes] != base_visits)
+        expansions = []
+        for node in np.flatnonzero(self.to_move[:self.num_nodes] != base_to_move):
+            children = self.children(node)
+            start = self.first_child[node]
+            expansions.append((self.player[node], self.hash[node], self.to_move[node],
+                               self.child_move[start:start + len(children)].copy(), self.hash[children]))
+        return {
+            'player': self.player[updated],
+            'hash': self.hash[updated],
+            'visits': self.visits[updated] - base_visits[updated],
+            'wins': self.wins[updated] - base_wins[updated],
+            'expansions': expansions,
+        }
+
+    def merge(self, changes: dict) -> None:
+        """ Adds the changes of another copy of the tree (see changes_since). """
+        for player, hash_, to_move, moves, hashes in changes['expansions']:
+            node = self.get_node(player, hash_)
+            if self.to_move[node] == -1:
+                self.expand(node, to_move, moves, hashes)
+
+        for player, hash_, visits, wins in zip(changes['player'], changes['hash'], changes['visits'], changes['wins']):
+            node = self.get_node(player, hash_)
+            self.visits[node] += visits
+            self.wins[node] += wins
+            self.in_tree[node] = True
+
+    def collect(self, root: int) -> int:
+        """ Removes every node that can not be reached from the root (positions that can not happen anymore
+        once the game has moved past them) and compacts the rest. Returns the new index of the root (always 0). """
+        order, new_index = reachable_nodes(root, self.first_child, self.num_children, self.child_node, self.num_nodes)
+
+        first_child = np.zeros_like(self.first_child)
+        child_node = np.zeros_like(self.child_node)
+        child_move = np.zeros_like(self.child_move)
+        self.num_children_total = compact_children(order, new_index, self.first_child, self.num_children,
+                                                   self.child_node, self.child_move, first_child, child_node, child_move)
+        self.first_child, self.child_node, self.child_move = first_child, child_node, child_move
+
+        self.num_nodes = len(order)
+        for name in self.NODE_ARRAYS:
+            if name != 'first_child':
+                array = getattr(self, name)
+                array[:self.num_nodes] = array[order]
+        rebuild_table(self.table, self.hash, self.player, self.num_nodes)
+        return 0
+
+    def prune(self, root: int, max_nodes: int) -> int:
+        """ Evicts the children of the least visited nodes (and so their subtrees) until at most max_nodes
+        remain. The evicted nodes stay as leaves with their statistics and are expanded again if the search
+        comes back to them. Returns the new index of the root. """
+        root = self.collect(root)
+        while self.num_nodes > max_nodes:
+            expanded = np.flatnonzero(self.num_children[1:self.num_nodes]) + 1 # The root is never evicted
+            if len(expanded) == 0:
+                break
+            expanded = expanded[np.argsort(self.visits[expanded], kind='stable')]
+            freed = np.cumsum(self.num_children[expanded])
+            evicted = expanded[:np.searchsorted(freed, self.num_nodes - max_nodes) + 1]
+            self.num_children[evicted] = 0
+            self.to_move[evicted] = -1
+            root = self.collect(root)
+        return root
+
+    def add_virtual_loss(self, path: List[int], amount: int) -> None:
+        """ Makes the nodes of a simulation that is still running look worse, so other threads choose other paths. """
+        path = np.fromiter(dict.fromkeys(path), dtype=np.int32)
+        add_virtual_loss(path, amount, self.visits, self.wins)
+
+    def _reserve_nodes(self, count: int) -> None:
+        """ Makes room for count new nodes, keeping the index at most half full. """
+        if self.num_nodes + count > len(self.visits):
+            capacity = 2 * len(self.visits)
+            while self.num_nodes + count > capacity:
+                capacity *= 2
+            self._resize_nodes(capacity)
+
+        if 2 * (self.num_nodes + count) > len(self.table):
+            self.table = np.empty(2 * len(self.visits), dtype=np.int32)
+            rebuild_table(self.table, self.hash, self.player, self.num_nodes)
+
+    def _resize_nodes(self, capacity: int) -> None:
+        for name in self.NODE_ARRAYS:
+            array = getattr(self, name)
+            resized = np.zeros(capacity, dtype=array.dtype)
+            resized[:len(array)] = array
+            setattr(self, name, resized)
+
+    def _grow_children(self) -> None:
+        self._resize_children(2 * len(self.child_node))
+
+    def _resize_children(self, capacity: int) -> None:
+        child_node = np.zeros(capacity, dtype=np.int32)
+        child_move = np.zeros((capacity, 2), dtype=np.uint8)
+        child_node[:len(self.child_node)] = self.child_node
+        child_move[:len(self.child_move)] = self.child_move
+        self.child_node, self.child_move = child_node, child_move
@@ -0,0 +1,378 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Dict, Tuple
+
+import datetime
+import multiprocessing
+import random
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+from numba import njit
+import numpy as np
+
+if TYPE_CHECKING:
+    from engine.core.GameMatrices import GameMatrices, GameSnapshot
+
+
+KEY_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15) # Spreads the player over the bits of the key
+HEADER_SIZE = 4 # [number of nodes, capacity, max nodes, unused]
+
+
+@njit(cache=True)
+def node_key(hash_: np.uint64, player: int) -> np.uint64:
+    """ Key of the (player that moved into the position, hash) node. 0 marks the empty slots. """
+    key = hash_ ^ (np.uint64(player + 1) * KEY_MULTIPLIER)
+    return key if key != 0 else np.uint64(1)
+
+
+@njit(cache=True)
+def find_slot(keys: np.array, key: np.uint64) -> int:
+    """ Slot of the key in the open addressing table, or the empty slot where it would go. """
+    mask = np.uint64(keys.shape[0] - 1)
+    slot = key & mask
+    while keys[slot] != key and keys[slot] != 0:
+        slot = (slot + np.uint64(1)) & mask
+    return slot
+
+
+@njit(cache=True)
+def find_nodes(keys: np.array, player: int, hashes: np.array, out_slots: np.array) -> None:
+    """ Slots of the positions reached by player (-1 if they are not in the table). """
+    for i in range(hashes.shape[0]):
+        key = node_key(hashes[i], player)
+        slot = find_slot(keys, key)
+        out_slots[i] = slot if keys[slot] == key else -1
+
+
+@njit(cache=True)
+def insert_node(keys: np.array, players: np.array, visits: np.array, wins: np.array, generations: np.array,
+                header: np.array, hash_: np.uint64, player: int) -> int:
+    """ Slot of the node, added if it is not in the table (only one process can insert at a time).
+    Returns -1 if the table is full. """
+    key = node_key(hash_, player)
+    slot = find_slot(keys, key)
+    if keys[slot] == key:
+        return slot
+    if header[0] >= header[2]:
+        return -1
+
+    players[slot] = player
+    visits[slot] = 0
+    wins[slot] = 0
+    generations[slot] = 0
+    keys[slot] = key # Written last, the node becomes visible to the other processes once it is initialized
+    header[0] += 1
+    return slot
+
+
+@njit(cache=True)
+def select_node(slots: np.array, visits: np.array, wins: np.array, C: float) -> int:
+    """ UCB1 over the children. Returns -1 if some child is not in the table or has not been visited yet. """
+    total = 0
+    for slot in slots:
+        if slot == -1 or visits[slot] == 0:
+            return -1
+        total += visits[slot]
+
+    log_total = np.log(total)
+    best, best_value = 0, -np.inf
+    for i in range(slots.shape[0]):
+        slot = slots[i]
+        value = wins[slot] / visits[slot] + C * np.sqrt(log_total / visits[slot])
+        if value > best_value:
+            best, best_value = i, value
+    return best
+
+
+@njit(cache=True)
+def backpropagate(slots: np.array, rewards: np.array, players: np.array, visits: np.array, wins: np.array,
+                  generations: np.array, generation: int) -> None:
+    for slot in slots:
+        visits[slot] += 1
+        wins[slot] += rewards[players[slot]]
+        generations[slot] = generation
+
+
+@njit(cache=True)
+def evict_nodes(keys: np.array, players: np.array, visits: np.array, wins: np.array, generations: np.array,
+                header: np.array, min_generation: int) -> None:
+    """ Removes the nodes not updated since min_generation, reinserting the rest. """
+    kept = np.flatnonzero((keys != 0) & (generations >= min_generation))
+    kept_keys, kept_players = keys[kept], players[kept]
+    kept_visits, kept_wins, kept_generations = visits[kept], wins[kept], generations[kept]
+
+    keys[:] = 0
+    for i in range(kept.shape[0]):
+        slot = find_slot(keys, kept_keys[i])
+        keys[slot] = kept_keys[i]
+        players[slot] = kept_players[i]
+        visits[slot] = kept_visits[i]
+        wins[slot] = kept_wins[i]
+        generations[slot] = kept_generations[i]
+    header[0] = kept.shape[0]
+
+
+class SharedStats:
+    """ Statistics of a parallel MCTS search, in shared memory: an open addressing table from
+    (player that moved into the position, hash) to visits and wins, like the dictionaries MonteCarlo used.
+    Every worker reads and updates it in place, so there is nothing to merge after a search.
+    Updates are not locked (a concurrent update of the same node can be lost, which barely changes the
+    statistics), only insertions are, since two of them could claim the same slot.
+    The table has a fixed capacity: once it holds max_nodes the searches stop adding nodes. """
+    def __init__(self, max_nodes: int = None, name: str = None) -> None:
+        self.owner = name is None
+        if self.owner:
+            capacity = 1
+            while capacity < 2 * max_nodes:
+                capacity *= 2
+            self.shm = shared_memory.SharedMemory(create=True, size=self.nbytes_for(capacity))
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            capacity = int(np.ndarray(HEADER_SIZE, dtype=np.int64, buffer=self.shm.buf)[1])
+
+        offset = 0
+        arrays = {}
+        for array_name, dtype, size in self._layout(capacity):
+            arrays[array_name] = np.ndarray(size, dtype=dtype, buffer=self.shm.buf, offset=offset)
+            offset += np.dtype(dtype).itemsize * size
+        self.header = arrays['header']
+        self.keys = arrays['keys']
+        self.wins = arrays['wins']
+        self.visits = arrays['visits']
+        self.generations = arrays['generations']
+        self.players = arrays['players']
+
+        if self.owner:
+            self.header[:] = 0
+            self.header[1] = capacity
+            self.header[2] = max_nodes
+            self.keys[:] = 0
+
+    @staticmethod
+    def _layout(capacity: int) -> list:
+        return [
+            ('header', np.int64, HEADER_SIZE),
+            ('keys', np.uint64, capacity),
+            ('wins', np.float64, capacity),
+            ('visits', np.int32, capacity),
+            ('generations', np.int32, capacity),
+            ('players', np.int8, capacity),
+        ]
+
+    @staticmethod
+    def nbytes_for(capacity: int) -> int:
+        return sum(np.dtype(dtype).itemsize * size for _, dtype, size in SharedStats._layout(capacity))
+
+    @staticmethod
+    def nodes_for_bytes(max_bytes: int) -> int:
+        """ Number of nodes whose table fits in max_bytes (the capacity is a power of two over twice the nodes). """
+        max_nodes = 1
+        while SharedStats.nbytes_for(4 * max_nodes) <= max_bytes:
+            max_nodes *= 2
+        return max_nodes
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def __len__(self) -> int:
+        return int(self.header[0])
+
+    def find(self, player: int, hashes: np.array) -> np.array:
+        slots = np.empty(len(hashes), dtype=np.int64)
+        find_nodes(self.keys, player, hashes, slots)
+        return slots
+
+    def insert(self, player: int, hash_: np.uint64) -> int:
+        return insert_node(self.keys, self.players, self.visits, self.wins, self.generations, self.header,
+                           np.uint64(hash_), player)
+
+    def backpropagate(self, slots: list, rewards: list, generation: int) -> None:
+        slots = np.fromiter(dict.fromkeys(slots), dtype=np.int64) # Transpositions are counted once per simulation
+        backpropagate(slots, np.asarray(rewards, dtype=np.float64), self.players, self.visits, self.wins,
+                      self.generations, generation)
+
+    def evict(self, min_generation: int) -> None:
+        """ Removes the nodes no search has updated since min_generation. No worker can be using the table. """
+        evict_nodes(self.keys, self.players, self.visits, self.wins, self.generations, self.header, min_generation)
+
+    def close(self) -> None:
+        if getattr(self, 'shm', None) is None:
+            return
+        # The views must be released before the memory is unmapped
+        self.header = self.keys = self.wins = self.visits = self.generations = self.players = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+        self.shm = None
+
+    def __del__(self) -> None:
+        self.close()
+
+
+# Worker process state: set by init_worker and kept for the whole life of the process
+_insert_lock = None
+_games: Dict[Tuple, GameMatrices] = {}
+_tables: OrderedDict[str, SharedStats] = OrderedDict()
+MAX_ATTACHED_TABLES = 8
+
+
+def init_worker(insert_lock: multiprocessing.Lock) -> None:
+    """ Initializer of the pool processes: keeps the lock of the tables and loads the kernels. """
+    global _insert_lock
+    _insert_lock = insert_lock
+    from engine.core.matrices.warmup import warm_up
+    warm_up()
+
+
+def worker_ready() -> bool:
+    return True
+
+
+def worker_game(config: Tuple[int, Tuple[int, int], str, int]) -> GameMatrices:
+    """ Game of the worker for a (players, size, game mode, max turns) config, created on its first search.
+    Searches only send a snapshot of the root position, which is restored into it. """
+    game = _games.get(config)
+    if game is None:
+        from engine.ChessFactory import ChessFactory
+        num_players, size, game_mode, max_turns = config
+        game = ChessFactory.create_game(
+            player_data=ChessFactory.create_player_data(num_players=num_players),
+            program_mode='matrix',
+            game_mode=game_mode,
+            size=size,
+            max_turns=max_turns,
+        )
+        game.verbose = 0
+        _games[config] = game
+    return game
+
+
+def worker_table(name: str) -> SharedStats:
+    """ Table of a bot, attached on its first search. Only the last ones used stay attached. """
+    stats = _tables.pop(name, None)
+    if stats is None:
+        stats = SharedStats(name=name)
+    _tables[name] = stats
+    if len(_tables) > MAX_ATTACHED_TABLES:
+        _tables.popitem(last=False)[1].close()
+    return stats
+
+
+def search_worker(table_name: str, config: Tuple, root: GameSnapshot, generation: int, C: float,
+                  end_time: datetime.datetime, max_games: int) -> Tuple[int, int]:
+    """ Runs simulations from the root until the time or the number of games runs out.
+    Returns the number of games played and the maximum depth reached. """
+    stats = worker_table(table_name)
+    game = worker_game(config)
+
+    games, max_depth = 0, 0
+    while datetime.datetime.now(datetime.timezone.utc) < end_time and games < max_games:
+        max_depth = max(max_depth, run_simulation(game, root, stats, C, generation))
+        games += 1
+    return games, max_depth
+
+
+def run_simulation(game: GameMatrices, root: GameSnapshot, stats: SharedStats, C: float, generation: int) -> int:
+    """ One MCTS simulation on the shared table. Returns the depth at which a node was added. """
+    game.restore(root)
+    player = game.get_turn(auto_play_bots=False)
+
+    path = []
+    depth = 0
+    expand = True
+    rewards = None
+    while not game.is_finished():
+        if not expand:
+            # The tree has already been expanded, the rest of the game is played in compiled code
+            rewards = game.random_playout()
+            break
+
+        if player == -1:
+            game.next_turn()
+            player = game.get_turn(auto_play_bots=False)
+            continue
+
+        moves, hashes = game.get_movements(include_hashes=True)
+        slots = stats.find(player, hashes)
+        i = select_node(slots, stats.visits, stats.wins, C)
+        if i == -1:
+            i = random.randrange(len(moves))
+        slot = slots[i]
+        game.make_move(moves[i], precomputed_hash=hashes[i])
+        depth += 1
+
+        if slot == -1:
+            expand = False
+            with _insert_lock:
+                slot = stats.insert(player, hashes[i])
+        if slot != -1:
+            path.append(slot)
+
+        game.next_turn()
+        player = game.get_turn(auto_play_bots=False)
+
+    if rewards is None:
+        rewards = game.rewards
+    stats.backpropagate(path, rewards, generation)
+    return depth if not expand else 0
+
+
+class MCTSWorkerPool:
+    """ Long lived pool of search processes, started once per process (server) and number of workers and shared
+    by every MonteCarloParallel bot. The workers load the kernels when they start, keep a game per board config
+    and receive only the root position of each search. """
+    _pools: Dict[int, MCTSWorkerPool] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, num_workers: int) -> None:
+        # Spawned, not forked: forked workers would share the random state of the parent (and of each other)
+        context = multiprocessing.get_context('spawn')
+        self.num_workers = num_workers
+        self.insert_lock = context.Lock()
+        self.executor = ProcessPoolExecutor(
+            max_workers=num_workers,
+            mp_context=context,
+            initializer=init_worker,
+            initargs=(self.insert_lock,),
+        )
+        # Start every worker now instead of on the first search
+        wait([self.executor.submit(worker_ready) for _ in range(num_workers)])
+
+    @classmethod
+    def get(cls, num_workers: int) -> MCTSWorkerPool:
+        pool = cls._pools.get(num_workers)
+        if pool is None:
+            with cls._lock:
+                pool = cls._pools.get(num_workers)
+                if pool is None:
+                    pool = MCTSWorkerPool(num_workers)
+                    cls._pools[num_workers] = pool
+        return pool
+
+    @classmethod
+    def shutdown_all(cls) -> None:
+        with cls._lock:
+            for pool in cls._pools.values():
+                pool.executor.shutdown(cancel_futures=True)
+            cls._pools.clear()
+
+    def search(self, stats: SharedStats, game: GameMatrices, generation: int, C: float,
+               end_time: datetime.datetime, max_games: int) -> Tuple[int, int]:
+        """ Runs a search from the position of the game on every worker, updating stats.
+        Returns the number of games played and the maximum depth reached. """
+        config = (game.number_of_players, tuple(game.board.size), game.board.game_mode, game.max_turns)
+        root = game.snapshot()
+        futures = [
+            self.executor.submit(search_worker, stats.name, config, root, generation, C, end_time,
+                                 max_games / self.num_workers)
+            for _ in range(self.num_workers)
+        ]
+        games, max_depth = 0, 0
+        for future in futures:
+            worker_games, worker_depth = future.result()
+            games += worker_games
+            max_depth = max(max_depth, worker_depth)
+        return games, max_depth
@@ -0,0 +1,74 @@
+import threading
+from typing import Dict, Tuple
+
+import torch
+
+from engine.agents.alpha_zero_training.GNNetwork import AlphaZeroGNN
+
+
+DEFAULT_MODEL = './engine/agents/alpha_zero_training/models/backups_0/version_8.pt'
+DEFAULT_ARCHITECTURE = (13, 256) # (node_feat_dim, hidden_dim) of AlphaZeroGNN
+
+
+class ModelRegistry:
+    """ Process wide cache of the AlphaZero networks. A model is loaded from disk the first time a bot needs it
+    and then shared (read only, in eval mode) by every game and thread. Models are keyed by (path, architecture). """
+    _models: Dict[Tuple[str, Tuple[int, int]], torch.nn.Module] = {}
+    _lock = threading.Lock()
+    _default = (DEFAULT_MODEL, DEFAULT_ARCHITECTURE)
+    device = torch.device("cpu")
+
+    @staticmethod
+    def load(path: str, architecture: Tuple[int, int] = DEFAULT_ARCHITECTURE) -> torch.nn.Module:
+        """ Loads a new instance of the network, not shared (e.g. to be trained). """
+        network = AlphaZeroGNN(*architecture)
+        state_dict = torch.load(path, map_location=ModelRegistry.device)
+        network.load_state_dict(state_dict)
+        network.eval()
+        return network.to(ModelRegistry.device)
+
+    @classmethod
+    def get(cls, path: str = None, architecture: Tuple[int, int] = None) -> torch.nn.Module:
+        """ Shared network for the given path and architecture (the default model if not given). """
+        key = cls._key(path, architecture)
+        network = cls._models.get(key)
+        if network is None:
+            with cls._lock:
+                network = cls._models.get(key)
+                if network is None:
+                    network = cls.load(*key)
+                    cls._models[key] = network
+        return network
+
+    @classmethod
+    def register(cls, network: torch.nn.Module, path: str, architecture: Tuple[int, int] = DEFAULT_ARCHITECTURE) -> None:
+        """ Shares an already built network under (path, architecture), replacing the one there was. """
+        network.eval()
+        with cls._lock:
+            cls._models[(path, tuple(architecture))] = network
+
+    @classmethod
+    def set_default(cls, path: str, architecture: Tuple[int, int] = DEFAULT_ARCHITECTURE) -> None:
+        """ Changes the model used by the bots that do not ask for a specific one, from their next move. """
+        with cls._lock:
+            cls._default = (path, tuple(architecture))
+
+    @classmethod
+    def evict(cls, path: str = None, architecture: Tuple[int, int] = None) -> None:
+        """ Removes a model from the cache (every model if no path is given).
+        Bots still holding it keep working, it is loaded again the next time it is requested. """
+        with cls._lock:
+            if path is None:
+                cls._models.clear()
+            else:
+                cls._models.pop(cls._key(path, architecture), None)
+
+    @classmethod
+    def is_loaded(cls, path: str = None, architecture: Tuple[int, int] = None) -> bool:
+        return cls._key(path, architecture) in cls._models
+
+    @classmethod
+    def _key(cls, path: str, architecture: Tuple[int, int]) -> Tuple[str, Tuple[int, int]]:
+        if path is None:
+            return cls._default
+        return (path, tuple(architecture or DEFAULT_ARCHITECTURE))
@@ -1,13 +1,12 @@
 from __future__ import annotations
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, List
 
 import datetime
 import random 
 import time
-from math import log, sqrt
-from pympler import asizeof
 
 from engine.agents.Agent import Agent
+from engine.agents.MCTSTree import MCTSTree
 
 if TYPE_CHECKING: 
     from engine.core.Game import Game
@@ -23,10 +22,16 @@ class MonteCarlo(Agent):
             time: seconds to let the AI spend calculating the move. Defaults to 30
             max_moves: maximum number of moves per simulation. Defaults to 120
             C: UCB1 hyperparameter to encourage more or less exploration. Defaults to 1.4
+            max_nodes: maximum size of the tree, the least visited subtrees are evicted above it. Defaults to 500000
+            max_bytes: maximum memory of the tree (approximate), instead of max_nodes
         """
         self.game = game
-        self.wins = {}
-        self.plays = {}
+        self.tree = None # Created on the first search, so the engines of games that never search do not allocate it
+        self.root_node = None
+        if 'max_bytes' in kwargs: 
+            self.max_nodes = MCTSTree.nodes_for_bytes(kwargs['max_bytes'])
+        else: 
+            self.max_nodes = kwargs.get('max_nodes', 500000)
 
         seconds = kwargs.get('time', 25)
         self.calculation_time = datetime.timedelta(seconds=seconds)
@@ -38,7 +43,6 @@ class MonteCarlo(Agent):
         # current game state and return it.
         # print("\n \n - - - - - - - - - - - Choosing move (MCTS) - - - - - - - - - - - - - - ")
         
-        self.max_depth = 0
         player = self.game.get_turn(auto_play_bots=False)
         moves, hashes = self.game.get_movements(include_hashes=True)
         if len(moves) == 0: 
@@ -46,57 +50,30 @@ class MonteCarlo(Agent):
         if len(moves) == 1: 
             return moves[0]
 
-        games = 0
-        begin = datetime.datetime.now(datetime.timezone.utc)
-    
-        simulation_time = 0
-        self.move_calc_time = 0
-        self.copytime = 0
-        self.update_tree_time = 0
-        self.back_propagation_time = 0
-        self.hashing_time = 0
-        self.make_move_time = 0
-        self.invalid_player_time = 0
-        self.move_and_hash_extraction_time = 0
-        self.expansion_time = 0
-        while datetime.datetime.now(datetime.timezone.utc) - begin < self.calculation_time and games < self.simulations_per_move:
-            start = time.time()
-            self.run_simulation()
-            simulation_time += time.time() - start
-            games += 1
+        self.prepare_search(self.game.copy())
 
-        moves_states = list(zip(moves, hashes))
+        begin = datetime.datetime.now(datetime.timezone.utc)
+        games = self.search()
 
         # Display the number of calls of `run_simulation` and the time elapsed.
         print(games, datetime.datetime.now(datetime.timezone.utc) - begin)
         
         # Pick the move with the highest percentage of wins.
-        percent_wins, move = max(
-            ((self.wins.get((player, S), 0) /
-            self.plays.get((player, S), 1), move)
-            for move, S in moves_states),
-            key=lambda x: x[0]  # compare only by win rate
-        )
+        tree = self.tree
+        children = [tree.get_node(player, S) for S in hashes]
+        best = max(range(len(moves)), key=lambda i: tree.wins[children[i]] / max(tree.visits[children[i]], 1))
+        move = moves[best]
 
         # Display the stats for each possible play.
-        # for x in sorted(  # x = (percent, wins, plays, move)
-        #     ((100 * self.wins.get((player, S), 0) /
-        #     self.plays.get((player, S), 1),
-        #     self.wins.get((player, S), 0),
-        #     self.plays.get((player, S), 0), move)
-        #     for move, S in moves_states),
-        #     key=lambda x: x[0],  # sort only by percent
-        #     reverse=True
-        # ):
-        #     print("{3}: {0:.2f}% ({1} / {2})".format(*x))
+        # for i in sorted(range(len(moves)), key=lambda i: tree.wins[children[i]] / max(tree.visits[children[i]], 1), reverse=True):
+        #     node = children[i]
+        #     print("{3}: {0:.2f}% ({1} / {2})".format(100 * tree.wins[node] / max(tree.visits[node], 1), tree.wins[node], tree.visits[node], moves[i]))
 
         # print("Maximum depth searched:", self.max_depth)
 
         # print("Chosen move:", move)
         
-        # print(f"Tree size: {asizeof.asizeof(self.plays)} (plays) + {asizeof.asizeof(self.wins)} (wins)")
-        # print(f"Average time per simulation: {simulation_time / games:.6f}")
-        # print(f"Total time spent in simulations: {simulation_time:.6f}")
+        # print(f"Tree size: {len(tree)} nodes, {tree.nbytes} bytes")
         # print(f" - Average time per move calculation: {self.move_calc_time / games:.6f}")
         # print(f" - Total time spent calculating move: {self.move_calc_time:.6f}")
         # print(f" - Average time per skiping player: {self.invalid_player_time / games:.6f}")
@@ -118,19 +95,80 @@ class MonteCarlo(Agent):
 
         return move
 
+    def search(self) -> int: 
+        """ Runs simulations until the time or the number of simulations runs out. Returns the number of simulations. """
+        games = 0
+        begin = datetime.datetime.now(datetime.timezone.utc)
+        while datetime.datetime.now(datetime.timezone.utc) - begin < self.calculation_time and games < self.simulations_per_move:
+            self.run_simulation()
+            games += 1
+        return games
+
+    def prepare_search(self, game: Game | GameMatrices) -> None: 
+        """ Re-roots the tree at the position of the game, dropping the statistics of the positions that can not be 
+        reached anymore (the moves played since the last search, by this or other players, decide which ones). """
+        # Simulations run on a single copy of the game that goes back to the current position each time. 
+        # Games without snapshots (base and layer engines) are copied for every simulation. 
+        self.search_game = game
+        self.root = game.snapshot() if hasattr(game, 'snapshot') else None
+        # The nodes have the hash of the position right after the move (before the turn passed to the next player)
+        root_hash = game.last_move_hash() if hasattr(game, 'last_move_hash') else game.hash
+        if self.tree is None: 
+            self.tree = MCTSTree()
+        self.root_node = self.tree.get_node(self.last_mover(game), root_hash)
+        self.root_node = self.tree.prune(self.root_node, self.max_nodes)
+
+        self.max_depth = 0
+        self.move_calc_time = 0
+        self.copytime = 0
+        self.update_tree_time = 0
+        self.back_propagation_time = 0
+        self.hashing_time = 0
+        self.make_move_time = 0
+        self.invalid_player_time = 0
+        self.move_and_hash_extraction_time = 0
+        self.expansion_time = 0
+
+    @staticmethod
+    def last_mover(game: Game | GameMatrices) -> int: 
+        """ Player that made the move leading to the current position (-1 at the start of the game). """
+        state_stack = getattr(game, 'state_stack', None)
+        return state_stack[-1][1] if state_stack else -1
+
     def run_simulation(self):
-        # Optimization for faster accessing
-        plays, wins = self.plays, self.wins
+        tree = self.tree
+        if len(tree) > self.max_nodes: 
+            # Evicting a bit more than needed so it does not happen again on the next simulation
+            self.root_node = tree.prune(self.root_node, self.max_nodes * 3 // 4)
 
-        visited_states = set()
         copytime = time.time()
-        game_copy = self.game.copy()
-        player = game_copy.get_turn(auto_play_bots=False)
+        if self.root is not None: 
+            game_copy = self.search_game
+            game_copy.restore(self.root)
+        else: 
+            game_copy = self.game.copy()
         self.copytime += time.time() - copytime
 
+        path = self.descend(game_copy)
+
+        # The tree has already been expanded, the rest of the game is played in compiled code
+        rewards = game_copy.rewards if game_copy.is_finished() else game_copy.random_playout()
+
+        # BackPropagation 
+        back_propagation_time = time.time()
+        tree.backpropagate(path, rewards)
+        self.back_propagation_time += time.time() - back_propagation_time
+
+    def descend(self, game_copy: Game | GameMatrices) -> List[int]: 
+        """ Selection and expansion: plays the moves chosen by UCB1 from the root until a node is added to 
+        the tree (or the game ends). Returns the nodes visited. """
+        tree = self.tree
+        player = game_copy.get_turn(auto_play_bots=False)
+        node = self.root_node
+        path = []
         move_count = 1
         expand = True
-        while not game_copy.is_finished():
+        while expand and not game_copy.is_finished():
             invalid_player_time = time.time()
             if player == -1: 
                 game_copy.next_turn()
@@ -139,43 +177,34 @@ class MonteCarlo(Agent):
             self.invalid_player_time += time.time() - invalid_player_time
 
             move_and_hash_extraction_time = time.time()
-            moves, hashes = game_copy.get_movements(include_hashes=True)
-            moves_states = list(zip(moves, hashes))
+            if tree.to_move[node] != player: 
+                moves, hashes = game_copy.get_movements(include_hashes=True)
+                tree.expand(node, player, moves, hashes)
             self.move_and_hash_extraction_time += time.time() - move_and_hash_extraction_time 
 
             update_tree_time = time.time()
-            if all(plays.get((player, S), 0) > 0 for _, S in moves_states):
-                # If we have stats on all of the legal moves here, use them with UCB1.
-                log_total = log(
-                    sum(plays[(player, S)] for move, S in moves_states))
-                value, move, state = max(
-                    (
-                        ((wins[(player, S)] / plays[(player, S)]) +
-                        self.C * sqrt(log_total / plays[(player, S)]), move, S)
-                        for move, S in moves_states
-                    ),
-                    key=lambda x: x[0]  # compare only by the score
-                )
-            else:
-                # Otherwise, just make an arbitrary decision.
-                move, state = random.choice(moves_states)
+            # If we have stats on all of the legal moves here, use them with UCB1.
+            # Otherwise, just make an arbitrary decision.
+            i = tree.select(node, self.C)
+            if i == -1: 
+                i = random.randrange(tree.num_children[node])
+            child = tree.first_child[node] + i
+            node = tree.child_node[child]
             self.update_tree_time += time.time() - update_tree_time
 
             make_move_time = time.time()
-            game_copy.make_move(move, precomputed_hash=state)
+            game_copy.make_move(tree.child_move[child], precomputed_hash=tree.hash[node])
             self.make_move_time += time.time() - make_move_time
 
-            # `player` here and below refers to the player
-            # who moved into that particular state.
+            # The node belongs to the player who moved into that particular state.
             expansion_time = time.time()
-            if expand and (player, state) not in plays:
+            if not tree.in_tree[node]:
                 expand = False
-                plays[(player, state)] = 0
-                wins[(player, state)] = 0
+                tree.in_tree[node] = True
                 if move_count > self.max_depth:
                     self.max_depth = move_count
 
-            visited_states.add((player, state))
+            path.append(node)
             move_count += 1
             self.expansion_time += time.time() - expansion_time
 
@@ -184,17 +213,4 @@ class MonteCarlo(Agent):
             player = game_copy.get_turn(auto_play_bots=False)
             self.move_calc_time += time.time() - move_calc_time
 
-        rewards = game_copy.rewards
-        # print(rewards)
-
-        # BackPropagation 
-        back_propagation_time = time.time()
-        for player, state in visited_states:
-            if (player, state) not in plays:
-                continue
-            plays[(player, state)] += 1
-
-            reward = rewards[player]
-            wins[(player, state)] += reward
-
-        self.back_propagation_time += time.time() - back_propagation_time
+        return path
@@ -0,0 +1,64 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+import datetime
+import os
+import threading
+
+from engine.agents.MonteCarlo import MonteCarlo
+
+if TYPE_CHECKING:
+    from engine.core.GameMatrices import GameMatrices, GameSnapshot
+
+
+class MonteCarloThreads(MonteCarlo):
+    def __init__(self, game: GameMatrices, **kwargs) -> None:
+        """ Tree parallel Monte Carlo Tree Search: several threads run simulations on the same tree.
+        The playouts are compiled without the GIL, so they run at the same time, while selection, expansion and
+        backpropagation (Python code holding the GIL anyway) are done under a lock. A simulation in progress
+        counts as a virtual loss on its path, so the threads do not all follow the same one.
+
+        Args:
+            game (GameMatrices): instance of game in wich we will simulate.
+            num_threads: threads running simulations. Defaults to the number of cores
+            virtual_loss: lost simulations counted on the path of each running simulation. Defaults to 1
+            Any other argument of MonteCarlo (time, simulations_per_move, C, max_nodes, max_bytes)
+        """
+        super().__init__(game, **kwargs)
+        self.num_threads = kwargs.get('num_threads', os.cpu_count())
+        self.virtual_loss = kwargs.get('virtual_loss', 1)
+        self.lock = threading.Lock()
+
+    def search(self) -> int:
+        """ Runs the simulations on num_threads threads, each one on its own copy of the game.
+        The tree is not pruned during the search (other threads hold node indexes), only between moves. """
+        end_time = datetime.datetime.now(datetime.timezone.utc) + self.calculation_time
+        self.games = 0
+
+        threads = []
+        for i in range(self.num_threads):
+            game = self.search_game if i == 0 else self.search_game.copy()
+            root = self.root if i == 0 else game.snapshot()
+            threads.append(threading.Thread(target=self.search_thread, args=(game, root, end_time)))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return self.games
+
+    def search_thread(self, game: GameMatrices, root: GameSnapshot, end_time: datetime.datetime) -> None:
+        tree = self.tree
+        while datetime.datetime.now(datetime.timezone.utc) < end_time:
+            with self.lock:
+                if self.games >= self.simulations_per_move:
+                    return
+                self.games += 1
+                game.restore(root)
+                path = self.descend(game)
+                tree.add_virtual_loss(path, self.virtual_loss)
+
+            rewards = game.rewards if game.is_finished() else game.random_playout()
+
+            with self.lock:
+                tree.add_virtual_loss(path, -self.virtual_loss)
+                tree.backpropagate(path, rewards)
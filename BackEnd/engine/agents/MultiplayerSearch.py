@@ -0,0 +1,144 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING
+
+import time
+
+import numpy as np
+
+from engine.agents.Agent import Agent
+from engine.utils.TranspositionTable import TranspositionTable
+from engine.core.matrices.multiplayer_search import paranoid, maxn, ROOT_KEYS
+from engine.core.matrices.alpha_beta import (
+    MAX_PLY,
+    MATE_BOUND,
+    INFINITY,
+    NODES,
+    NODE_LIMIT,
+    DEADLINE,
+    ABORTED,
+    ROOT_UPDATED,
+    PLIES_LEFT,
+    NO_CAPTURE_LIMIT
+)
+from engine.core.matrices.matrix_constants import MAX_POSSIBLE_MOVES
+from engine.core.constants import MAX_MOVES_WITHOUT_CAPTURE
+
+if TYPE_CHECKING:
+    from engine.core.GameMatrices import GameMatrices
+
+
+class MultiplayerSearch(Agent):
+    def __init__(self, game: GameMatrices, **kwargs) -> None:
+        """ Iterative deepening search for games of more than 2 players (see multiplayer_search.py).
+        One instance can play for every bot of the game, as MonteCarlo does.
+
+        Args:
+            game (GameMatrices): instance of game in wich we will search.
+            mode: 'paranoid' (alpha-beta on the score of the player in turn, against all the others) or
+                'maxn' (every player maximizes its own score). Defaults to 'paranoid'
+            time: seconds per move. Defaults to 0.5
+            max_nodes: nodes searched per move. Defaults to 500000
+            max_depth: deepest iteration. Defaults to 16
+            tt_bytes: memory of the transposition table. Defaults to 8 MB
+        """
+        self.game = game
+        self.mode = kwargs.get('mode', 'paranoid')
+        if self.mode not in ('paranoid', 'maxn'):
+            raise ValueError(f"Unknown search mode: {self.mode}")
+        self.time = kwargs.get('time', 0.5)
+        self.max_nodes = kwargs.get('max_nodes', 500000)
+        self.max_depth = min(kwargs.get('max_depth', 16), MAX_PLY - 2)
+
+        # Shared by the searches of every player, the entries are identified by the position hash (which includes
+        # the player in turn and the players alive) and (paranoid mode) the root player
+        self.table = TranspositionTable(max_bytes=kwargs.get('tt_bytes', 8 << 20), values=game.number_of_players)
+
+        self.moves = np.empty((MAX_PLY, MAX_POSSIBLE_MOVES, 2), dtype=np.uint8)
+        self.hashes = np.empty((MAX_PLY, MAX_POSSIBLE_MOVES), dtype=np.uint64)
+        self.counts = np.zeros(MAX_PLY, dtype=np.uint8)
+        self.scores = np.empty((MAX_PLY, MAX_POSSIBLE_MOVES), dtype=np.int32)
+        self.utilities = np.zeros((MAX_PLY + 1, 4), dtype=np.int64)
+        self.killed = np.zeros((MAX_PLY, 4), dtype=np.bool_)
+
+        # Statistics of the last search
+        self.depth = 0
+        self.score = 0
+        self.nodes = 0
+
+    def choose_move(self):
+        game = self.game
+        start = time.perf_counter_ns()
+        player = game.get_turn(auto_play_bots=False)
+        moves = game.get_movements()
+        if len(moves) == 0:
+            return
+        if len(moves) == 1:
+            return moves[0]
+
+        self.table.new_search()
+        b = game.board
+        nodes = b.nodes.copy()
+        pieces = b.pieces.copy()
+        attacks = game.attacks.copy()
+        history = np.zeros((game.moves_count + MAX_PLY + 1, game.history.shape[1]), dtype=game.history.dtype)
+        history[:game.moves_count] = game.history[:game.moves_count]
+        players = game.players[:game.number_of_players]
+        teams = players['team'].copy()
+        alive = players['is_alive'].copy()
+
+        # Positions already played (the search treats a single repetition as a draw), then the search path
+        path_base = sum(game.positions_counter.values())
+        path_hashes = np.empty(path_base + MAX_PLY, dtype=np.uint64)
+        path_hashes[:path_base] = np.repeat(
+            np.array(list(game.positions_counter.keys()), dtype=np.uint64),
+            np.array(list(game.positions_counter.values()), dtype=np.int64)
+        )
+
+        killers = np.full((MAX_PLY, 2, 2), -1, dtype=np.int16)
+        history_scores = np.zeros((len(nodes), len(nodes)), dtype=np.int32)
+        root_move = np.zeros(2, dtype=np.uint8)
+        info = np.zeros(7, dtype=np.int64)
+        info[DEADLINE] = start + int(self.time * 1e9)
+        info[PLIES_LEFT] = game.max_turns - game.moves_count
+        info[NO_CAPTURE_LIMIT] = MAX_MOVES_WITHOUT_CAPTURE * game.number_of_players
+
+        arrays = (
+            teams, alive, nodes, pieces, attacks, history, game.moves_count, b.adjacency_list, b.patterns_offsets,
+            b.pieces_offsets, b.tiles_offsets, b.promotion_zones, game.hasher.table, game.hasher.state_keys,
+            b.pieces_per_player, self.moves, self.hashes, self.counts, self.scores, self.utilities, self.killed,
+            path_hashes, path_base, self.table.entries, self.table.header
+        )
+
+        best_move = moves[0]
+        self.depth, self.score, self.nodes = 0, 0, 0
+        for depth in range(1, self.max_depth + 1):
+            if time.perf_counter_ns() >= info[DEADLINE] or self.nodes >= self.max_nodes:
+                break
+            # Both limits are checked by the compiled search, which is aborted when one is reached
+            info[NODES], info[NODE_LIMIT], info[ABORTED], info[ROOT_UPDATED] = 0, self.max_nodes - self.nodes, 0, 0
+
+            if self.mode == 'paranoid':
+                score = paranoid(depth, 0, -INFINITY, INFINITY, player, player, np.uint64(game.board_hash),
+                                 game.moves_without_capture, *arrays, ROOT_KEYS[player], killers, history_scores,
+                                 root_move, info)
+            else:
+                maxn(depth, 0, player, np.uint64(game.board_hash), game.moves_without_capture, *arrays, np.uint64(0),
+                     killers, history_scores, root_move, info)
+                score = self.utilities[0, player]
+            self.nodes += int(info[NODES])
+
+            # The first root move is the best one of the previous iteration: a move that replaced it
+            # before the search was aborted is better, even if the iteration is not complete
+            if info[ROOT_UPDATED]:
+                best_move = root_move.copy()
+            if info[ABORTED]:
+                break
+            self.depth, self.score = depth, int(score)
+            if abs(score) > MATE_BOUND:
+                break
+
+        # The move from the list, as the other agents return
+        for move in moves:
+            if move[0] == best_move[0] and move[1] == best_move[1]:
+                return move
+        return moves[0]
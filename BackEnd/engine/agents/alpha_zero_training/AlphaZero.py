@@ -2,7 +2,6 @@ from __future__ import annotations
 from typing import TYPE_CHECKING
 
 from tqdm import tqdm, trange
-import matplotlib.pyplot as plt
 import numpy as np
 import random
 import os
@@ -12,10 +11,10 @@ import torch.nn.functional as F
 # device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 device = torch.device("cpu")
 print(device)
-torch.autograd.set_detect_anomaly(True)
 
 from engine.agents.alpha_zero_training.ReplayBuffer import AlphaZeroReplayBuffer
 from engine.agents.alpha_zero_training.GNNetwork import AlphaZeroGNN
+from engine.utils.InferenceCache import InferenceCache
 from engine.core.matrices.matrix_constants import MAX_POSSIBLE_MOVES
 if TYPE_CHECKING: 
     from engine.core.GameMatrices import GameMatrices
@@ -66,6 +65,8 @@ class AlphaZero:
         self.__decay_rate = 1e-5
 
         self.replay_buffer = AlphaZeroReplayBuffer(replay_size, self.representation.nodes.shape, self.max_moves)
+        # Features of the tiles changed by every move of a simulation, to undo them
+        self.saved = np.empty((game.max_turns + 1, 2, self.representation.nodes.shape[1]), dtype=self.representation.nodes.dtype)
 
         if initial_model is None: 
             self.network = AlphaZeroGNN(self.representation.nodes.shape[1] + 2, self.hidden_layers)
@@ -84,6 +85,7 @@ class AlphaZero:
         self.plots_path = save_path + 'plots'
 
     def train(self):
+        torch.autograd.set_detect_anomaly(True)
         all_avg_losses = []
 
         for iteration in range(self.iterations):
@@ -104,6 +106,8 @@ class AlphaZero:
                     break
                 loss = self.learn(batch)
                 losses.append(loss)
+            # The evaluations of the previous weights are not valid anymore
+            InferenceCache.for_network(self.network).clear()
             if losses:
                 avg_loss = sum(losses) / len(losses)
                 print(f" --> Average loss of: {avg_loss:.6f}")
@@ -141,9 +145,7 @@ class AlphaZero:
 
             N, W, Q, P = {}, {}, {}, {}
             for sim in range(self.mcts_simulations): 
-                game_copy = game.copy()
-                representation_copy = representation.copy()
-                self.run_simulation(game_copy, representation_copy, N, W, Q, P)
+                self.run_simulation(game, representation, N, W, Q, P)
 
             state = representation.nodes.copy()
             moves, hashes = game.get_movements(include_hashes=True)
@@ -172,7 +174,10 @@ class AlphaZero:
             self.replay_buffer.put(visited[0], visited[1], visited[2], visited[3], rewards[visited[0]])
          
     def run_simulation(self, game, representation, N, W, Q, P, frozen=False):
+        """ Plays the moves of the simulation on game and representation and undoes them at the end, 
+        so both are back at the position the simulation started from. """
         trajectory = []
+        path = []
 
         player = game.get_turn(auto_play_bots=False)
         expand = True
@@ -188,12 +193,22 @@ class AlphaZero:
 
             if any((player, child_hash) not in P for child_hash in hashes) and expand:
                 expand = False  # Only expand once per simulation
+                model = self.frozen if frozen else self.network
+                cache = InferenceCache.for_network(model)
+
+                # Positions evaluated in a previous move or game, with the same weights
+                entry = cache.load(player, game.hash)
+                if entry is not None: 
+                    priors, v = entry
+                    for state_hash, prior in zip(priors['hash'], priors['prior']):
+                        P[(player, state_hash)] = prior
+                    break
+
                 state = representation.to_pyg_data(device)
 
                 moves_tensor = torch.tensor(moves, dtype=torch.long).to(device)
                 player_tensor = torch.tensor([player], dtype=torch.long).to(device)
 
-                model = self.frozen if frozen else self.network
                 model.eval()
                 with torch.no_grad():   
                     prior_policy, v = model(
@@ -209,6 +224,7 @@ class AlphaZero:
 
                 for i, state_hash in enumerate(hashes):
                     P[(player, state_hash)] = probs[i]
+                cache.store(player, game.hash, hashes, probs, v)
 
                 break  # Stop simulation, backpropagate value v
 
@@ -231,7 +247,8 @@ class AlphaZero:
                     best_state = state_hash
 
             history_movement = game.make_move(best_move, precomputed_hash=best_state)
-            representation.update_board(history_movement)
+            representation.update_board(history_movement, self.saved[len(path)])
+            path.append(history_movement)
 
             trajectory.append((player, best_state))
 
@@ -253,6 +270,10 @@ class AlphaZero:
             W[key] = W.get(key, 0) + reward
             Q[key] = W[key] / N[key]
 
+        while path: 
+            game.undo_move()
+            representation.undo_update(path.pop(), self.saved[len(path)])
+
         return trajectory
 
     def evaluate_model(self, game, representation): 
@@ -272,7 +293,7 @@ class AlphaZero:
             N, W, Q, P = {}, {}, {}, {}
             frozen = False if frozen_team != player else True
             for sim in range(self.mcts_simulations_eval): 
-                self.run_simulation(game.copy(), representation.copy(), N, W, Q, P, frozen)
+                self.run_simulation(game, representation, N, W, Q, P, frozen)
 
             moves, hashes = game.get_movements(include_hashes=True)
 
@@ -301,6 +322,7 @@ class AlphaZero:
         if win_rate > self.update_frozen_threshold: 
             print(f"Model has imporved! Win rate against frozen: {win_rate:.4f}")
             self.frozen.load_state_dict(self.network.state_dict())
+            InferenceCache.for_network(self.frozen).clear()
             version = len(os.listdir(self.backups_path))  
             torch.save(self.network.state_dict(), f"{self.backups_path}/version_{version}.pt")
         else:
@@ -343,6 +365,8 @@ class AlphaZero:
         return total_loss.detach().cpu().item()
 
     def plot_loss(self, iteration, losses):
+        import matplotlib.pyplot as plt
+
         fig, ax = plt.subplots()
         ax.plot(losses, label="Loss per training step")
         ax.set_xlabel("Training step")
@@ -358,6 +382,8 @@ class AlphaZero:
 
     def plot_avg_loss(self, avg_loss):
         """Plot and overwrite the average loss summary (single file)."""
+        import matplotlib.pyplot as plt
+
         fig, ax = plt.subplots()
         ax.plot(avg_loss, marker='o', label="Average Loss")
         ax.set_xlabel("Iteration")
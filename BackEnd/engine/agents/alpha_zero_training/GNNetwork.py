@@ -42,7 +42,7 @@ class AlphaZeroGNN(torch.nn.Module):
         # x: [num_nodes, node_feat_dim]
         # edge_index: [2, num_edges] - adjacency (for message passing)
         # batch: [num_nodes] - for global pooling across graphs
-        # move_index: [2, num_legal_moves] - (source, target) node indices for legal moves
+        # move_index: [num_legal_moves, 2] or [batch_size, max_moves, 2] - (source, target) node indices of the legal moves in their own graph, -1 for padding
 
         device = x.device 
         if batch is None:
@@ -72,27 +72,27 @@ class AlphaZeroGNN(torch.nn.Module):
         predicted_values = value.squeeze(-1)
 
         # Policy head (predict scores for legal moves only)
+        policy_logits = self.policy_logits(x, move_index, batch)
+
+        return policy_logits, predicted_values
+
+    def policy_logits(self, x, move_index, batch):
+        # x: [num_nodes, hidden_dim] - node embeddings of every graph of the batch
+        # move_index: [batch_size, max_moves, 2] - (source, target) node indices of the legal moves in their own graph, -1 for padding
+        # batch: [num_nodes] - graph of every node
         if move_index.dim() == 2:
             # no batch: add batch dim = 1
             move_index = move_index.unsqueeze(0)
-        
-        B, M, _ = move_index.shape
 
-        policy_logits_per_graph = []
-        for i in range(B):
-            moves_i = move_index[i]  
-            valid_i = ~(moves_i == -1).any(dim=1)  
+        # The moves of every graph, flattened and shifted to the first node of their graph in x, go through the edge MLP together
+        valid = ~(move_index == -1).any(dim=2)
+        counts = torch.bincount(batch, minlength=move_index.shape[0])
+        first_node = torch.cumsum(counts, dim=0) - counts
+        moves = (move_index + first_node[:, None, None])[valid]
 
-            src = moves_i[valid_i, 0]
-            tgt = moves_i[valid_i, 1]
+        edge_feat = torch.cat([x[moves[:, 0]], x[moves[:, 1]]], dim=1)
+        logits = self.policy_edge_mlp(edge_feat).squeeze(-1)
 
-            edge_feat = torch.cat([x[src], x[tgt]], dim=1)          
-            logits_i  = self.policy_edge_mlp(edge_feat).squeeze(-1) 
-
-            full_logits = torch.full((M,), -1e9, device=device)  
-            full_logits[valid_i] = logits_i
-            policy_logits_per_graph.append(full_logits)
-        
-        policy_logits = torch.stack(policy_logits_per_graph, dim=0)
-
-        return policy_logits, predicted_values
+        policy_logits = torch.full(valid.shape, -1e9, device=x.device)
+        policy_logits[valid] = logits
+        return policy_logits
@@ -5,19 +5,49 @@ from typing import List, Tuple, Dict
 
 from engine.core.matrices.MatrixBoard import LayerMatrixBoard
 from engine.utils.ZobristHasherMatrices import ZobristHasher
+from engine.utils.MoveCache import MoveCache
 from engine.core.matrices.chess_logic_bounds import (
     get_possible_moves, 
     filter_legal_moves, 
+    generate_legal_moves, 
     is_in_check, 
     make_move,
     undo_move
 )
+from engine.core.matrices.playout import random_playout
+from engine.core.matrices.batch_moves import generate_legal_moves_batch
+from engine.core.matrices.attack_maps import (
+    compute_attack_maps, 
+    make_move_attacks, 
+    undo_move_attacks, 
+    is_attacked
+)
 from engine.core.matrices.matrix_constants import * 
 from engine.core.constants import * 
 from engine.agents.RandomAI import RandomAI
 from engine.agents.MonteCarlo import MonteCarlo
 from engine.agents.MonteCarloParallel import MonteCarloParallel
-from engine.agents.AlphaZero import AlphaZero
+
+
+class GameSnapshot: 
+    """ Buffers holding the mutable state of a GameMatrices, so it can be saved and restored without 
+    creating a new game. The board topology, the hasher and the bot engines are shared, not stored. """
+    def __init__(self, game: 'GameMatrices') -> None: 
+        self.nodes = np.empty_like(game.board.nodes)
+        self.pieces = np.empty_like(game.board.pieces)
+        self.attacks = np.empty_like(game.attacks)
+        self.players = np.empty_like(game.players)
+        self.history = np.empty_like(game.history)
+        self.rewards = list(game.rewards)
+        self.positions_counter = {}
+        self.state_stack = []
+        self.position_hashes = []
+        self.turn = 0
+        self.hash = 0
+        self.moves_count = 0
+        self.moves_without_capture = 0
+        self.game_state = GameState.PLAYING
+        self.killed_player = None
 
 
 class GameMatrices: 
@@ -29,6 +59,7 @@ class GameMatrices:
                  verbose: int = 0,
                  hasher: ZobristHasher = None, 
                  max_turns: int = 120,
+                 move_cache: MoveCache = None, 
                  **kwargs): 
     
         self.players = players
@@ -40,11 +71,11 @@ class GameMatrices:
         self.game_state = GameState.PLAYING
         
         self.representation = None
-        self.network = AlphaZero.load_network('./engine/agents/alpha_zero_training/models/backups_0/version_8.pt')
 
         self.board = board
         self.hasher = ZobristHasher() if hasher is None else hasher
-        self.hash = self.hasher.compute_hash(self.board.pieces)
+        self.hash = self.hasher.compute_hash(self.board.pieces, self.turn, self.players['is_alive'][:self.number_of_players])
+        self.move_cache = move_cache # Optional, legal moves of the positions seen before (shared by the copies)
 
         self.bot_engines = {
             1: RandomAI(self),
@@ -59,8 +90,12 @@ class GameMatrices:
         self._cached_count = np.zeros(1, dtype=np.uint8)
 
         self.history = np.zeros((max_turns + 20, 7), dtype=np.int16) # [[moving_piece_index, from_tile, to_tile, captured_piece_index, first_move, original_type, new_type, player]]
+        self.attacks = np.zeros((self.board.num_pieces // self.board.pieces_per_player, len(self.board.nodes)), dtype=np.int16) # [team, tile] -> number of pieces of the team attacking the tile
+        self.update_attack_maps()
         self.initial_positions = self.board.pieces.copy()
         self.positions_counter = {self.hash: 1}
+        self.state_stack = [] # State before every stored move, restored by undo_move
+        self.position_hashes = [] # Key under which the position after every stored move was counted
         self.max_turns = max_turns
         self.moves_count = 0
         self.moves_without_capture = 0
@@ -73,24 +108,106 @@ class GameMatrices:
     def copy(self) -> 'GameMatrices':
         board = self.board.copy()
         players = self.players.copy()
-        game_copy = GameMatrices(board, players, self.turn, hasher=self.hasher, max_turns=self.max_turns)
+        game_copy = GameMatrices(board, players, self.turn, hasher=self.hasher, max_turns=self.max_turns, 
+                                 move_cache=self.move_cache)
         game_copy.history = np.array(self.history, dtype=np.int16, copy=True)
         game_copy.positions_counter = self.positions_counter.copy()
+        game_copy.state_stack = self.state_stack.copy()
+        game_copy.position_hashes = self.position_hashes.copy()
         game_copy.moves_count = self.moves_count
         game_copy.moves_without_capture = self.moves_without_capture
         return game_copy
 
+    def snapshot(self, snapshot: GameSnapshot = None) -> GameSnapshot: 
+        """ Saves the current state, reusing the buffers of snapshot if one is given. """
+        if snapshot is None: 
+            snapshot = GameSnapshot(self)
+        np.copyto(snapshot.nodes, self.board.nodes)
+        np.copyto(snapshot.pieces, self.board.pieces)
+        np.copyto(snapshot.attacks, self.attacks)
+        np.copyto(snapshot.players, self.players)
+        snapshot.history[:self.moves_count] = self.history[:self.moves_count]
+        snapshot.rewards[:] = self.rewards
+        snapshot.positions_counter = self.positions_counter.copy()
+        snapshot.state_stack = self.state_stack.copy()
+        snapshot.position_hashes = self.position_hashes.copy()
+        snapshot.turn = self.turn
+        snapshot.hash = self.hash
+        snapshot.moves_count = self.moves_count
+        snapshot.moves_without_capture = self.moves_without_capture
+        snapshot.game_state = self.game_state
+        snapshot.killed_player = self.killed_player
+        return snapshot
+
+    def restore(self, snapshot: GameSnapshot) -> None: 
+        """ Goes back to the state saved in snapshot, which can be restored again later. """
+        np.copyto(self.board.nodes, snapshot.nodes)
+        np.copyto(self.board.pieces, snapshot.pieces)
+        np.copyto(self.attacks, snapshot.attacks)
+        np.copyto(self.players, snapshot.players)
+        self.history[:snapshot.moves_count] = snapshot.history[:snapshot.moves_count]
+        self.rewards[:] = snapshot.rewards
+        self.positions_counter = snapshot.positions_counter.copy()
+        self.state_stack = snapshot.state_stack.copy()
+        self.position_hashes = snapshot.position_hashes.copy()
+        self.turn = snapshot.turn
+        self.hash = snapshot.hash
+        self.moves_count = snapshot.moves_count
+        self.moves_without_capture = snapshot.moves_without_capture
+        self.game_state = snapshot.game_state
+        self.killed_player = snapshot.killed_player
+        self._cached_turn = None
+        self._recalculate = True
+
     def reset(self) -> None: 
         ... 
 
     def set_representation(self, representation) -> None: 
         self.representation = representation
-        self.bot_engines[4] = AlphaZero(self, self.representation, self.network, 1000)
+        self.bot_engines.pop(4, None) # The AlphaZero engine is created with the new representation when needed
+
+    def get_bot_engine(self, opponent_type: int): 
+        if opponent_type == 4 and 4 not in self.bot_engines: 
+            # Imported here so that torch is only loaded when there is an AlphaZero player
+            from engine.agents.AlphaZero import AlphaZero
+            self.bot_engines[4] = AlphaZero(self, self.representation, mcts_simulations=1000) # The network is loaded on its first move
+        elif opponent_type == 5 and 5 not in self.bot_engines: 
+            from engine.agents.MonteCarloThreads import MonteCarloThreads
+            self.bot_engines[5] = MonteCarloThreads(self)
+        elif opponent_type == 6 and 6 not in self.bot_engines: 
+            from engine.agents.AlphaBeta import AlphaBeta
+            self.bot_engines[6] = AlphaBeta(self)
+        elif opponent_type in (7, 8) and opponent_type not in self.bot_engines: 
+            from engine.agents.MultiplayerSearch import MultiplayerSearch
+            self.bot_engines[opponent_type] = MultiplayerSearch(self, mode='paranoid' if opponent_type == 7 else 'maxn')
+        return self.bot_engines[opponent_type]
 
     def next_turn(self) -> None: 
-        self.turn = (self.turn + 1) % self.number_of_players
+        turn = (self.turn + 1) % self.number_of_players
+        self.hash ^= self.hasher.turn_keys[self.turn] ^ self.hasher.turn_keys[turn]
+        self.turn = turn
         self._recalculate = True
 
+    def next_alive_turn(self) -> int: 
+        """ Player that moves after the one in turn, skipping the dead players. """
+        turn = (self.turn + 1) % self.number_of_players
+        while not self.players[turn]['is_alive'] and turn != self.turn: 
+            turn = (turn + 1) % self.number_of_players
+        return turn
+
+    @property
+    def board_hash(self) -> np.uint64: 
+        """ Hash of the pieces only, without the keys of the turn and the players alive. """
+        return self.hash ^ self.hasher.state_key(self.turn, self.players['is_alive'][:self.number_of_players])
+
+    def last_move_hash(self) -> np.uint64: 
+        """ Hash the position had right after the last move, before the turn passed (the hash of the child 
+        computed by generate_legal_moves). """
+        if not self.state_stack: 
+            return self.hash
+        mover = self.state_stack[-1][1]
+        return self.hash ^ self.hasher.turn_keys[self.turn] ^ self.hasher.turn_keys[mover]
+
     def get_turn(self, auto_play_bots=True) -> int: 
         if not self.players[self.turn]['is_alive']:
             return -1
@@ -113,9 +230,13 @@ class GameMatrices:
 
         
         if self.players[self.turn]['is_alive']: 
-            team = self.players[self.turn]['team']
-            self.get_possible_moves(team)
-            self.filter_legal_moves(team)
+            cache = self.move_cache
+            if cache is None or not cache.load(self.hash, self._cached_movements, self._cached_hashes, self._cached_count): 
+                team = self.players[self.turn]['team']
+                self.generate_legal_moves(team)
+                if cache is not None: 
+                    count = self._cached_count[0]
+                    cache.store(self.hash, self._cached_movements[:count], self._cached_hashes[:count])
             
             # If possible, implement Castles in the future 
             result = self._cached_movements[:self._cached_count[0]]
@@ -166,6 +287,77 @@ class GameMatrices:
             self.hasher.table
         )
     
+    def generate_legal_moves(self, player: int) -> None: 
+        b = self.board
+        generate_legal_moves(
+            player, 
+            b.nodes, 
+            b.pieces,
+            b.adjacency_list,
+            b.patterns_offsets, 
+            b.pieces_offsets,
+            b.tiles_offsets,
+            self._cached_movements, 
+            self._cached_count,
+            self.history, 
+            self.moves_count,
+            self.board.promotion_zones,
+            self.hash, 
+            self._cached_hashes, 
+            self.hasher.table, 
+            b.pieces_per_player
+        )
+    
+    @staticmethod
+    def get_movements_batch(games: List['GameMatrices'], include_hashes: bool = False) -> List[np.array]: 
+        """ Legal moves of the player in turn of every game, generated in a single parallel call. 
+        All the games must be played on the same board (size and game mode). Dead players get no moves. """
+        if len(games) == 0: 
+            return []
+        
+        b = games[0].board
+        for game in games: 
+            if game.board.nodes.shape != b.nodes.shape or game.board.pieces.shape != b.pieces.shape: 
+                raise ValueError("All the games of a batch must be played on the same board")
+
+        teams = np.array([game.players[game.turn]['team'] for game in games], dtype=np.uint8)
+        alive = np.array([game.players[game.turn]['is_alive'] for game in games], dtype=np.bool_)
+        nodes = np.stack([game.board.nodes for game in games])
+        pieces = np.stack([game.board.pieces for game in games])
+        hashes = np.array([game.hash for game in games], dtype=np.uint64)
+        offsets, moves, child_hashes = generate_legal_moves_batch(
+            teams, 
+            alive, 
+            nodes, 
+            pieces, 
+            b.adjacency_list, 
+            b.patterns_offsets, 
+            b.pieces_offsets, 
+            b.tiles_offsets, 
+            b.promotion_zones, 
+            hashes, 
+            games[0].hasher.table, 
+            b.pieces_per_player
+        )
+
+        result = []
+        for i in range(len(games)): 
+            start, end = offsets[i], offsets[i + 1]
+            result.append((moves[start:end], child_hashes[start:end]) if include_hashes else moves[start:end])
+        return result
+
+    def update_attack_maps(self) -> None: 
+        b = self.board
+        compute_attack_maps(
+            b.nodes, 
+            b.pieces, 
+            b.adjacency_list, 
+            b.patterns_offsets, 
+            b.pieces_offsets, 
+            b.tiles_offsets, 
+            self.attacks
+        )
+
     def is_in_check(self, player: int) -> bool: 
         b = self.board
         king_tile = None
@@ -180,27 +372,35 @@ class GameMatrices:
         if king_tile is None:
             raise RuntimeError("King not found for player:", player)
 
-        return is_in_check(
-            player, 
-            king_tile, 
-            b.nodes,
-            b.pieces, 
-            b.adjacency_list, 
-            b.patterns_offsets, 
-            b.pieces_offsets, 
-            b.tiles_offsets, 
-            np.empty((MAX_POSSIBLE_MOVES, 2), dtype=np.uint8)
-        )
+        return is_attacked(player, king_tile, self.attacks)
 
     def make_move(self, move: np.array, store: bool = True, precomputed_hash: int = 0) -> None: 
-        make_move(
+        if store: 
+            # Everything the move (and the eliminations that follow it) can change, to be restored by undo_move
+            self.state_stack.append((
+                self.hash, 
+                self.turn, 
+                self.moves_without_capture, 
+                self.killed_player, 
+                self.players['is_alive'].copy(), 
+                self.rewards.copy(), 
+                self.game_state
+            ))
+
+        b = self.board
+        make_move_attacks(
             move, 
-            self.board.nodes, 
-            self.board.pieces, 
+            b.nodes, 
+            b.pieces, 
             self.history, 
             self.moves_count, 
-            self.board.promotion_zones,
-            store
+            b.promotion_zones,
+            store, 
+            b.adjacency_list, 
+            b.patterns_offsets, 
+            b.pieces_offsets, 
+            b.tiles_offsets, 
+            self.attacks
         )
 
         if precomputed_hash: 
@@ -220,7 +420,12 @@ class GameMatrices:
                     
                     if self.number_of_players == 2:
                         raise RuntimeError("KING CAPTURED", self.board.node_names[from_], self.board.node_names[to])
-            self.positions_counter[self.hash] = self.positions_counter.get(self.hash, 0) + 1
+
+            # The position is counted with the player that moves next, the key it has when next_turn gets there
+            next_turn = self.next_alive_turn()
+            position_hash = self.hash ^ self.hasher.turn_keys[self.turn] ^ self.hasher.turn_keys[next_turn]
+            self.positions_counter[position_hash] = self.positions_counter.get(position_hash, 0) + 1
+            self.position_hashes.append(position_hash)
             self.moves_count += 1
 
             # FOR ALPHA ZERO TRAINING
@@ -228,20 +433,88 @@ class GameMatrices:
             return self.turn, history_movement[1], history_movement[2], history_movement[6]
 
     def undo_move(self, remove: bool = True) -> None: 
+        """ Undoes the last move. With remove, the move is taken out of the history and the game goes back 
+        to the exact state it had before make_move, including the turn and any player eliminated after the move. 
+        Without remove, only the board is restored (for moves made with store=False). """
         if remove:
-            # This should also remove one from position counter, restore moves without capture, etc. 
+            position_hash = self.position_hashes.pop()
+            self.positions_counter[position_hash] -= 1
+            if self.positions_counter[position_hash] == 0: 
+                del self.positions_counter[position_hash]
             self.moves_count -= 1
-        undo_move(
-            self.board.nodes,
-            self.board.pieces, 
+        b = self.board
+        undo_move_attacks(
+            b.nodes,
+            b.pieces, 
             self.history, 
-            self.moves_count
+            self.moves_count, 
+            b.adjacency_list, 
+            b.patterns_offsets, 
+            b.pieces_offsets, 
+            b.tiles_offsets, 
+            self.attacks
         )
-        self.hash = self.hasher.update_hash(self.hash, self.history[self.moves_count], self.board.pieces)
+
+        if remove: 
+            hash_, turn, moves_without_capture, killed_player, alive, rewards, game_state = self.state_stack.pop()
+            self.hash = hash_
+            self.turn = turn
+            self.moves_without_capture = moves_without_capture
+            self.killed_player = killed_player
+            self.players['is_alive'] = alive
+            self.rewards[:] = rewards
+            self.game_state = game_state
+            self._recalculate = True
+        else: 
+            self.hash = self.hasher.update_hash(self.hash, self.history[self.moves_count], self.board.pieces)
+
+    def random_playout(self, seed: int = -1, rejection_sampling: bool = True) -> List[int]: 
+        """ Plays the rest of the game with random legal moves inside compiled code and returns the rewards. 
+        The game itself is not modified. By default each move is sampled from the pseudo legal moves and only 
+        that one is checked (see sample_legal_move), rejection_sampling=False generates every legal move instead. """
+        if self.game_state != GameState.PLAYING: 
+            return self.rewards
+        
+        b = self.board
+        players = self.players[:self.number_of_players]
+        rewards = np.array(self.rewards, dtype=np.int8)
+        hash_stack = np.empty(self.moves_count + self.max_turns + 1, dtype=np.uint64)
+        stack_size = 0
+        for position_hash, count in self.positions_counter.items(): 
+            hash_stack[stack_size:stack_size + count] = position_hash
+            stack_size += count
+
+        random_playout(
+            b.nodes.copy(), 
+            b.pieces.copy(), 
+            b.adjacency_list, 
+            b.patterns_offsets, 
+            b.pieces_offsets, 
+            b.tiles_offsets, 
+            b.promotion_zones, 
+            self.hasher.table, 
+            self.hasher.state_keys, 
+            players['team'].copy(), 
+            players['is_alive'].copy(), 
+            rewards, 
+            self.turn, 
+            np.uint64(self.hash), 
+            self.history.copy(), 
+            self.moves_count, 
+            self.moves_without_capture, 
+            self.max_turns, 
+            MAX_MOVES_WITHOUT_CAPTURE * self.number_of_players, 
+            hash_stack, 
+            stack_size, 
+            b.pieces_per_player, 
+            seed, 
+            rejection_sampling
+        )
+        return rewards.tolist()
 
     def make_move_bot(self) -> None: 
         bot = self.players[self.turn]
-        engine = self.bot_engines[bot['opponent_type']]
+        engine = self.get_bot_engine(bot['opponent_type'])
         move = engine.choose_move()
         if move is not None: 
             self.make_move(move)
@@ -266,11 +539,15 @@ class GameMatrices:
     def kill_player(self, player: int, print_text: str = None) -> None: 
         if print_text and self.verbose > 0: 
             print(f"{player['color']} loses {print_text}")
+        if player['is_alive']: 
+            self.hash ^= self.hasher.alive_keys[player['id']]
         player['is_alive'] = False
         self.killed_player = player['color']
         self.rewards[player['id']] = -1 
 
     def revive_player(self, player: int) -> None: 
+        if not player['is_alive']: 
+            self.hash ^= self.hasher.alive_keys[player['id']]
         player['is_alive'] = True
     
     def is_finished(self) -> bool: 
@@ -1,8 +1,6 @@
 from typing import List, Tuple, Dict
 import numpy as np 
-import torch 
 import os
-from torch_geometric.data import Data, Batch
 
 from engine.core.layer.LayerBoard import LayerBoard
 from engine.core.layer.LayerTile import LayerTile
@@ -214,13 +212,18 @@ class LayerMatrixBoard:
 
 
 class BaseMatrixBoard: 
+    # Edge index and batch vector of the largest batch built so far, for every topology (size, game mode) and device. 
+    # The edges of graph i are shifted by i * num_nodes, so a smaller batch is a prefix of them
+    _graphs: Dict[Tuple, Tuple] = {}
+
     def __init__(self, size: Tuple[int, int], gamemode: str = 'wormhole', 
              innitialize: bool = True, load_from_file=True, **kwargs) -> None:
         self.size = size
         self.game_mode = gamemode
         
-        self.nodes: np.array
+        self.nodes: np.array # float32, so the network reads them without a conversion
         self.edges: np.array
+        self._features = None # torch view of nodes
 
         self.num_players = kwargs.get('num_players', 2) 
         self.piece_types = kwargs.get('piece_types', 6)
@@ -244,16 +247,21 @@ class BaseMatrixBoard:
         board_copy.piece_types = self.piece_types
         return board_copy
 
+    def __getstate__(self) -> dict: 
+        state = self.__dict__.copy()
+        state['_features'] = None
+        return state
+
     def save_matrices(self) -> None: 
         file = f'{BOARD_FILES}{self.size[0]}x{self.size[1]}_{self.game_mode}_BASE.npz'
         np.savez(file, 
-                 nodes=self.nodes,
+                 nodes=self.nodes.astype(np.uint8),
                  edges=self.edges, 
             )
         
     def load_matrices(self, file) -> None: 
         matrices = np.load(file)
-        self.nodes = matrices['nodes']
+        self.nodes = matrices['nodes'].astype(np.float32)
         self.edges = matrices['edges']
     
     def create_board(self) -> None: 
@@ -262,7 +270,7 @@ class BaseMatrixBoard:
         elif self.game_mode == 'normal': 
             b = NormalBoard(self.size)
 
-        self.nodes = np.zeros((len(b), len(Pieces) + len(Teams)), dtype=np.uint8)
+        self.nodes = np.zeros((len(b), len(Pieces) + len(Teams)), dtype=np.float32)
         self.nodes[:, Pieces.EMPTY] = 1
         
         self.edges = [[], []] 
@@ -287,24 +295,62 @@ class BaseMatrixBoard:
             piece[type] = 1
             piece[self.piece_types + player] = 1
 
-    def update_board(self, movement: Tuple) -> None: 
+    def update_board(self, movement: Tuple, saved: np.array = None) -> None:
         player, origin_tile, destination_tile, new_type = movement
-        # moving_piece_index should not be necessary because it requires pieces list from the other class. The other variables should give all necessary info? 
+        # moving_piece_index should not be necessary because it requires pieces list from the other class. The other variables should give all necessary info?
+
+        if saved is not None:
+            # Features of both tiles before the move, for undo_update
+            saved[0] = self.nodes[origin_tile]
+            saved[1] = self.nodes[destination_tile]
 
         self.set_piece(Pieces.EMPTY, 0, origin_tile)
         self.set_piece(new_type, player, destination_tile)
 
+    def undo_update(self, movement: Tuple, saved: np.array) -> None:
+        """ Goes back to the features the tiles of the movement had, saved by update_board. """
+        _, origin_tile, destination_tile, _ = movement
+        self.nodes[destination_tile] = saved[1]
+        self.nodes[origin_tile] = saved[0]
+
+    # torch and torch_geometric are imported when the representation is used by a network, 
+    # so that the boards can be imported without them
+    @property
+    def features(self):
+        """ Node features as a torch tensor that shares the memory of nodes, so it follows update_board. """
+        import torch
+        if self._features is None: 
+            self._features = torch.from_numpy(self.nodes)
+        return self._features
+
+    def graph(self, device, num_graphs: int = 1):
+        """ Edge index and batch vector of num_graphs boards of this topology, views of the tensors kept 
+        for the topology and device (built again, once, when a larger batch is asked for). """
+        import torch
+        key = (self.size, self.game_mode, str(device))
+        num_nodes, num_edges = len(self.nodes), self.edges.shape[1]
+        edge_index, batch = BaseMatrixBoard._graphs.get(key, (None, None))
+        if batch is None or len(batch) < num_graphs * num_nodes: 
+            edges = torch.tensor(self.edges, dtype=torch.long)
+            offsets = torch.arange(num_graphs, dtype=torch.long).repeat_interleave(num_edges) * num_nodes
+            edge_index = (edges.repeat(1, num_graphs) + offsets).to(device)
+            batch = torch.arange(num_graphs, dtype=torch.long).repeat_interleave(num_nodes).to(device)
+            BaseMatrixBoard._graphs[key] = (edge_index, batch)
+        return edge_index[:, :num_graphs * num_edges], batch[:num_graphs * num_nodes]
+
     def to_pyg_data(self, device):
-        x = torch.tensor(self.nodes, dtype=torch.float32, device=device) 
-        edge_index = torch.tensor(self.edges, dtype=torch.long, device=device)
-        return Data(x=x, edge_index=edge_index)
+        from torch_geometric.data import Data
+
+        edge_index, _ = self.graph(device)
+        return Data(x=self.features.to(device), edge_index=edge_index)
 
     def batch_to_pyg_data(self, graph_list, device):
-        data_list = []
-        edge_index = torch.tensor(self.edges, dtype=torch.long, device=device)
-        for graph in graph_list:
-            data = Data(x=graph, edge_index=edge_index)
-            data_list.append(data)
-        batch = Batch.from_data_list(data_list)
-        return batch
-    
\ No newline at end of file
+        """ graph_list: node features of the boards, [num_graphs, num_nodes, num_features] (tensor or array). """
+        import torch
+        from torch_geometric.data import Batch
+
+        x = torch.as_tensor(graph_list)
+        num_graphs = x.shape[0]
+        edge_index, batch = self.graph(device, num_graphs)
+        x = x.reshape(-1, x.shape[-1]).to(device=device, dtype=torch.float32)
+        return Batch(x=x, edge_index=edge_index, batch=batch)
@@ -0,0 +1,347 @@
+from numba import njit, objmode
+import numpy as np
+import time
+
+from engine.core.matrices.matrix_constants import *
+from engine.core.matrices.chess_logic_bounds import (
+    generate_legal_moves,
+    get_king_tile
+)
+from engine.core.matrices.attack_maps import (
+    make_move_attacks,
+    undo_move_attacks,
+    is_attacked
+)
+from engine.utils.TranspositionTable import (
+    probe,
+    store,
+    BUCKET_SIZE,
+    EXACT,
+    LOWER_BOUND,
+    UPPER_BOUND
+)
+
+
+# Negamax alpha-beta search (principal variation search) for 2 player games.
+# The search plays the moves with make_move_attacks / undo_move_attacks on copies of the game arrays.
+# The history copy has room for MAX_PLY more rows: the move of ply p is stored at history_base + p, and that same
+# row is the scratch space of the legal move generator at ply p (before any move of that ply is made).
+# Scores are in centipawns from the point of view of the side to move. A mate found at ply p scores MATE_SCORE - p.
+# The search carries the hash of the pieces, side_keys[side] adds the keys of the side to move and the players alive
+# to get the hash of the position (as GameMatrices.hash), which is the key of the repetitions and the table.
+
+MAX_PLY = 64
+MATE_SCORE = 1000000
+INFINITY = 10000000
+MATE_BOUND = MATE_SCORE - MAX_PLY
+
+# Search info: [nodes, node limit, deadline (time.perf_counter_ns), aborted, best root move updated,
+# plies until max_turns, moves without capture limit]
+NODES = 0
+NODE_LIMIT = 1
+DEADLINE = 2
+ABORTED = 3
+ROOT_UPDATED = 4
+PLIES_LEFT = 5
+NO_CAPTURE_LIMIT = 6
+# The clock is read every TIME_CHECK_NODES nodes (a power of 2)
+TIME_CHECK_NODES = 1024
+
+# Tower, knight, bishop, king, pawn, queen
+PIECE_VALUES = np.array([500, 300, 320, 0, 100, 900], dtype=np.int32)
+# Ranks used by MVV-LVA (most valuable victim, least valuable attacker)
+ORDER_VALUES = np.array([4, 2, 3, 6, 1, 5], dtype=np.int32)
+MOBILITY_WEIGHT = 4
+
+TT_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 29
+KILLER_SCORE = 1 << 28
+HISTORY_LIMIT = 1 << 27
+
+
+@njit(cache=True)
+def count_node(info: np.array) -> bool:
+    """ Counts a node and returns whether the search has to stop (node limit reached or out of time). """
+    info[NODES] += 1
+    if info[NODES] >= info[NODE_LIMIT]:
+        info[ABORTED] = 1
+    elif info[NODES] & (TIME_CHECK_NODES - 1) == 0:
+        with objmode(now='int64'):
+            now = time.perf_counter_ns()
+        if now >= info[DEADLINE]:
+            info[ABORTED] = 1
+    return info[ABORTED] != 0
+
+
+@njit(cache=True)
+def evaluate(team: np.uint8, enemy: np.uint8, pieces: np.array, attacks: np.array) -> int:
+    """ Material plus mobility (tiles attacked), from the point of view of team. """
+    score = 0
+    for i in range(pieces.shape[0]):
+        if pieces[i, 0] != -1 and pieces[i, 4] == 0:
+            if pieces[i, 1] == team:
+                score += PIECE_VALUES[pieces[i, 0]]
+            elif pieces[i, 1] == enemy:
+                score -= PIECE_VALUES[pieces[i, 0]]
+
+    for tile in range(attacks.shape[1]):
+        if attacks[team, tile] > 0:
+            score += MOBILITY_WEIGHT
+        if attacks[enemy, tile] > 0:
+            score -= MOBILITY_WEIGHT
+    return score
+
+
+@njit(cache=True)
+def is_repetition(path_hashes: np.array, path_size: int, current_hash: np.uint64) -> bool:
+    for i in range(path_size):
+        if path_hashes[i] == current_hash:
+            return True
+    return False
+
+
+@njit(cache=True)
+def score_moves(moves: np.array, count: int, scores: np.array, nodes: np.array, pieces: np.array,
+                tt_move: np.array, killers: np.array, history_scores: np.array) -> None:
+    """ Ordering: transposition table move, captures by MVV-LVA, killer moves, then quiet moves by history. """
+    for i in range(count):
+        origin_tile = moves[i, 0]
+        destination_tile = moves[i, 1]
+        victim = nodes[destination_tile]
+        if origin_tile == tt_move[0] and destination_tile == tt_move[1]:
+            scores[i] = TT_MOVE_SCORE
+        elif victim != -1:
+            attacker = nodes[origin_tile]
+            scores[i] = CAPTURE_SCORE + 16 * ORDER_VALUES[pieces[victim, 0]] - ORDER_VALUES[pieces[attacker, 0]]
+        elif origin_tile == killers[0, 0] and destination_tile == killers[0, 1]:
+            scores[i] = KILLER_SCORE + 1
+        elif origin_tile == killers[1, 0] and destination_tile == killers[1, 1]:
+            scores[i] = KILLER_SCORE
+        else:
+            scores[i] = history_scores[origin_tile, destination_tile]
+
+
+@njit(cache=True)
+def pick_move(moves: np.array, hashes: np.array, scores: np.array, start: int, count: int) -> None:
+    """ Selection sort step: moves the best scored move left to position start. """
+    best = start
+    for i in range(start + 1, count):
+        if scores[i] > scores[best]:
+            best = i
+    if best != start:
+        for j in range(2):
+            moves[start, j], moves[best, j] = moves[best, j], moves[start, j]
+        hashes[start], hashes[best] = hashes[best], hashes[start]
+        scores[start], scores[best] = scores[best], scores[start]
+
+
+@njit(cache=True)
+def record_cutoff(origin_tile: np.uint8, destination_tile: np.uint8, depth: int, killers: np.array,
+                  history_scores: np.array) -> None:
+    """ A quiet move that caused a beta cutoff becomes the first killer of its ply and gains history score. """
+    if killers[0, 0] != origin_tile or killers[0, 1] != destination_tile:
+        killers[1] = killers[0]
+        killers[0, 0] = origin_tile
+        killers[0, 1] = destination_tile
+    history_scores[origin_tile, destination_tile] += depth * depth
+    if history_scores[origin_tile, destination_tile] > HISTORY_LIMIT:
+        history_scores[:] //= 2
+
+
+@njit(cache=True)
+def store_entry(current_hash: np.uint64, depth: int, score: int, flag: int, move: np.array, ply: int,
+                tt_entries: np.array, tt_header: np.array) -> None:
+    """ Mate scores are stored relative to the node, not to the root. """
+    scores = np.empty(1, dtype=np.int32)
+    if score > MATE_BOUND:
+        score += ply
+    elif score < -MATE_BOUND:
+        score -= ply
+    scores[0] = score
+    store(tt_entries, tt_header, current_hash, depth, flag, move, scores)
+
+
+@njit(cache=True)
+def quiescence(ply: int, alpha: int, beta: int, side: int, current_hash: np.uint64, teams: np.array,
+               nodes: np.array, pieces: np.array, attacks: np.array, history: np.array, history_base: int,
+               adjacency_list: np.array, patterns_offsets: np.array, pieces_offsets: np.array, tiles_offsets: np.array,
+               promotion_zones: np.array, hasher: np.array, pieces_per_player: int, moves: np.array,
+               hashes: np.array, counts: np.array, scores: np.array, info: np.array) -> int:
+    """ Only captures are searched (every move when in check), the side to move can stand pat otherwise. """
+    if count_node(info):
+        return 0
+
+    team = teams[side]
+    enemy = teams[1 - side]
+    if ply >= MAX_PLY - 1:
+        return evaluate(team, enemy, pieces, attacks)
+
+    in_check = is_attacked(team, get_king_tile(pieces, team)[2], attacks)
+    if not in_check:
+        stand_pat = evaluate(team, enemy, pieces, attacks)
+        if stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+    history_index = history_base + ply
+    generate_legal_moves(team, nodes, pieces, adjacency_list, patterns_offsets, pieces_offsets, tiles_offsets,
+                         moves[ply], counts[ply:ply + 1], history, history_index, promotion_zones, current_hash,
+                         hashes[ply], hasher, pieces_per_player)
+    count = np.int64(counts[ply])
+    if count == 0:
+        return -MATE_SCORE + ply if in_check else 0
+
+    ply_moves = moves[ply]
+    ply_hashes = hashes[ply]
+    ply_scores = scores[ply]
+    for i in range(count):
+        victim = nodes[ply_moves[i, 1]]
+        if victim != -1:
+            ply_scores[i] = CAPTURE_SCORE + 16 * ORDER_VALUES[pieces[victim, 0]] - ORDER_VALUES[pieces[nodes[ply_moves[i, 0]], 0]]
+        else:
+            ply_scores[i] = 0 if in_check else -1
+
+    for i in range(count):
+        pick_move(ply_moves, ply_hashes, ply_scores, i, count)
+        if ply_scores[i] < 0:
+            break
+
+        make_move_attacks(ply_moves[i], nodes, pieces, history, history_index, promotion_zones, True,
+                          adjacency_list, patterns_offsets, pieces_offsets, tiles_offsets, attacks)
+        score = -quiescence(ply + 1, -beta, -alpha, 1 - side, ply_hashes[i], teams, nodes, pieces, attacks,
+                            history, history_base, adjacency_list, patterns_offsets, pieces_offsets, tiles_offsets,
+                            promotion_zones, hasher, pieces_per_player, moves, hashes, counts, scores, info)
+        undo_move_attacks(nodes, pieces, history, history_index, adjacency_list, patterns_offsets,
+                          pieces_offsets, tiles_offsets, attacks)
+        if info[ABORTED]:
+            return 0
+
+        if score >= beta:
+            return score
+        if score > alpha:
+            alpha = score
+    return alpha
+
+
+@njit(cache=True)
+def negamax(depth: int, ply: int, alpha: int, beta: int, side: int, current_hash: np.uint64, no_capture: int,
+            teams: np.array, nodes: np.array, pieces: np.array, attacks: np.array, history: np.array,
+            history_base: int, adjacency_list: np.array, patterns_offsets: np.array, pieces_offsets: np.array,
+            tiles_offsets: np.array, promotion_zones: np.array, hasher: np.array, side_keys: np.array,
+            pieces_per_player: int, moves: np.array, hashes: np.array, counts: np.array, scores: np.array,
+            path_hashes: np.array, path_base: int, tt_entries: np.array, tt_header: np.array, killers: np.array,
+            history_scores: np.array, root_move: np.array, info: np.array) -> int:
+    """ Principal variation search. Returns the score of the position for the side to move (0 if aborted). """
+    position_hash = current_hash ^ side_keys[side]
+    if ply > 0:
+        # Draws: repeated position (in the game or in the search path), max_turns or the 50 moves rule
+        if ply >= info[PLIES_LEFT] or no_capture >= info[NO_CAPTURE_LIMIT]:
+            return 0
+        if is_repetition(path_hashes, path_base + ply, position_hash):
+            return 0
+
+    team = teams[side]
+    in_check = is_attacked(team, get_king_tile(pieces, team)[2], attacks)
+    if in_check:
+        depth += 1 # Check extension
+    if depth <= 0 or ply >= MAX_PLY - 1:
+        return quiescence(ply, alpha, beta, side, current_hash, teams, nodes, pieces, attacks, history,
+                          history_base, adjacency_list, patterns_offsets, pieces_offsets, tiles_offsets,
+                          promotion_zones, hasher, pieces_per_player, moves, hashes, counts, scores, info)
+
+    if count_node(info):
+        return 0
+
+    tt_move = np.full(2, 255, dtype=np.uint8)
+    index = probe(tt_entries, tt_header, position_hash)
+    if index != -1:
+        entry = tt_entries[index // BUCKET_SIZE, index % BUCKET_SIZE]
+        tt_move[0] = entry.move[0]
+        tt_move[1] = entry.move[1]
+        if ply > 0 and entry.depth >= depth:
+            tt_score = np.int64(entry.scores[0])
+            if tt_score > MATE_BOUND:
+                tt_score -= ply
+            elif tt_score < -MATE_BOUND:
+                tt_score += ply
+            flag = entry.flag
+            if flag == EXACT:
+                return tt_score
+            if flag == LOWER_BOUND and tt_score >= beta:
+                return tt_score
+            if flag == UPPER_BOUND and tt_score <= alpha:
+                return tt_score
+
+    history_index = history_base + ply
+    generate_legal_moves(team, nodes, pieces, adjacency_list, patterns_offsets, pieces_offsets, tiles_offsets,
+                         moves[ply], counts[ply:ply + 1], history, history_index, promotion_zones, current_hash,
+                         hashes[ply], hasher, pieces_per_player)
+    count = np.int64(counts[ply])
+    if count == 0:
+        return -MATE_SCORE + ply if in_check else 0
+
+    ply_moves = moves[ply]
+    ply_hashes = hashes[ply]
+    ply_scores = scores[ply]
+    score_moves(ply_moves, count, ply_scores, nodes, pieces, tt_move, killers[ply], history_scores)
+
+    path_hashes[path_base + ply] = position_hash
+    original_alpha = alpha
+    best_score = -INFINITY
+    best_move = 0
+    for i in range(count):
+        pick_move(ply_moves, ply_hashes, ply_scores, i, count)
+        origin_tile = ply_moves[i, 0]
+        destination_tile = ply_moves[i, 1]
+        capture = nodes[destination_tile] != -1
+        child_no_capture = 0 if capture else no_capture + 1
+
+        make_move_attacks(ply_moves[i], nodes, pieces, history, history_index, promotion_zones, True,
+                          adjacency_list, patterns_offsets, pieces_offsets, tiles_offsets, attacks)
+        if i == 0:
+            score = -negamax(depth - 1, ply + 1, -beta, -alpha, 1 - side, ply_hashes[i], child_no_capture, teams,
+                             nodes, pieces, attacks, history, history_base, adjacency_list, patterns_offsets,
+                             pieces_offsets, tiles_offsets, promotion_zones, hasher, side_keys, pieces_per_player,
+                             moves, hashes, counts, scores, path_hashes, path_base, tt_entries, tt_header, killers,
+                             history_scores, root_move, info)
+        else:
+            # Null window first, searched again with the full window only if it may improve alpha
+            score = -negamax(depth - 1, ply + 1, -alpha - 1, -alpha, 1 - side, ply_hashes[i], child_no_capture,
+                             teams, nodes, pieces, attacks, history, history_base, adjacency_list, patterns_offsets,
+                             pieces_offsets, tiles_offsets, promotion_zones, hasher, side_keys, pieces_per_player,
+                             moves, hashes, counts, scores, path_hashes, path_base, tt_entries, tt_header, killers,
+                             history_scores, root_move, info)
+            if alpha < score < beta and not info[ABORTED]:
+                score = -negamax(depth - 1, ply + 1, -beta, -alpha, 1 - side, ply_hashes[i], child_no_capture,
+                                 teams, nodes, pieces, attacks, history, history_base, adjacency_list,
+                                 patterns_offsets, pieces_offsets, tiles_offsets, promotion_zones, hasher,
+                                 side_keys, pieces_per_player, moves, hashes, counts, scores, path_hashes, path_base,
+                                 tt_entries, tt_header, killers, history_scores, root_move, info)
+        undo_move_attacks(nodes, pieces, history, history_index, adjacency_list, patterns_offsets,
+                          pieces_offsets, tiles_offsets, attacks)
+        if info[ABORTED]:
+            return 0
+
+        if score > best_score:
+            best_score = score
+            best_move = i
+            if score > alpha:
+                alpha = score
+                if ply == 0:
+                    root_move[0] = origin_tile
+                    root_move[1] = destination_tile
+                    info[ROOT_UPDATED] = 1
+        if alpha >= beta:
+            if not capture:
+                record_cutoff(origin_tile, destination_tile, depth, killers[ply], history_scores)
+            break
+
+    if best_score <= original_alpha:
+        flag = UPPER_BOUND
+    elif best_score >= beta:
+        flag = LOWER_BOUND
+    else:
+        flag = EXACT
+    store_entry(position_hash, depth, best_score, flag, ply_moves[best_move], ply, tt_entries, tt_header)
+    return best_score
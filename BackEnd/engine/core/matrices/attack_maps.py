@@ -0,0 +1,165 @@
+from numba import njit
+import numpy as np
+
+from engine.core.matrices.matrix_constants import *
+from engine.core.matrices.chess_logic_bounds import (
+    retrieve_move_bounds,
+    make_move,
+    undo_move
+)
+
+
+# Attack maps: attacks[team, tile] is the number of pieces of that team attacking the tile.
+# A tile is attacked by a tower/bishop/queen if it is in one of its rays up to the first piece found
+# (included), by a knight or king if it is in its movement pattern and by a pawn if it is in its attack pattern.
+# Pieces of dead players keep attacking, the same way they are taken into account by is_in_check.
+
+
+@njit(cache=True)
+def add_ray_attacks(tile: np.int16, piece_type: np.uint8, team: np.uint8, sign: np.int16, nodes: np.array,
+                    adjacency_list: np.array, patterns_offsets: np.array, pieces_offsets: np.array,
+                    tiles_offsets: np.array, attacks: np.array) -> None:
+    piece_start, piece_end = retrieve_move_bounds(tile, piece_type, tiles_offsets, pieces_offsets)
+    for i in range(piece_start, piece_end):
+        for j in range(patterns_offsets[i], patterns_offsets[i + 1]):
+            t = adjacency_list[j]
+            attacks[team, t] += sign
+            if nodes[t] != -1:
+                break
+
+
+@njit(cache=True)
+def add_pattern_attacks(pattern: int, team: np.uint8, sign: np.int16, adjacency_list: np.array,
+                        patterns_offsets: np.array, attacks: np.array) -> None:
+    for j in range(patterns_offsets[pattern], patterns_offsets[pattern + 1]):
+        attacks[team, adjacency_list[j]] += sign
+
+
+@njit(cache=True)
+def add_piece_attacks(piece_index: int, sign: np.int16, nodes: np.array, pieces: np.array, adjacency_list: np.array,
+                      patterns_offsets: np.array, pieces_offsets: np.array, tiles_offsets: np.array,
+                      attacks: np.array) -> None:
+    """ Adds (sign = 1) or removes (sign = -1) the attacks of a piece from the maps. """
+    piece = pieces[piece_index]
+    piece_type = piece[0]
+    team = piece[1]
+    tile = piece[2]
+
+    if piece_type == 0 or piece_type == 5:
+        add_ray_attacks(tile, 0, team, sign, nodes, adjacency_list, patterns_offsets, pieces_offsets, tiles_offsets, attacks)
+    if piece_type == 2 or piece_type == 5:
+        add_ray_attacks(tile, 2, team, sign, nodes, adjacency_list, patterns_offsets, pieces_offsets, tiles_offsets, attacks)
+
+    if piece_type == 1 or piece_type == 3:
+        piece_start, _ = retrieve_move_bounds(tile, piece_type, tiles_offsets, pieces_offsets)
+        add_pattern_attacks(piece_start, team, sign, adjacency_list, patterns_offsets, attacks)
+    elif piece_type == 4:
+        piece_start, _ = retrieve_move_bounds(tile, 4, tiles_offsets, pieces_offsets)
+        add_pattern_attacks(piece_start + 2 * team + 1, team, sign, adjacency_list, patterns_offsets, attacks)
+
+
+@njit(cache=True)
+def compute_attack_maps(nodes: np.array, pieces: np.array, adjacency_list: np.array, patterns_offsets: np.array,
+                        pieces_offsets: np.array, tiles_offsets: np.array, attacks: np.array) -> None:
+    attacks[:] = 0
+    for i in range(pieces.shape[0]):
+        if pieces[i, 0] != -1 and pieces[i, 4] == 0:
+            add_piece_attacks(i, 1, nodes, pieces, adjacency_list, patterns_offsets, pieces_offsets, tiles_offsets, attacks)
+
+
+@njit(cache=True)
+def find_slider_attackers(tile: np.int16, nodes: np.array, pieces: np.array, adjacency_list: np.array,
+                          patterns_offsets: np.array, pieces_offsets: np.array, tiles_offsets: np.array,
+                          out_pieces: np.array, count: int) -> int:
+    """ Stores the indexes of the towers, bishops and queens whose rays reach the tile (the same traces
+    used by is_in_check). Those are the only pieces whose attacks change when the tile is emptied or filled. """
+    for piece_type in (0, 2):
+        piece_start, piece_end = retrieve_move_bounds(tile, piece_type, tiles_offsets, pieces_offsets)
+        for i in range(piece_start, piece_end):
+            for j in range(patterns_offsets[i], patterns_offsets[i + 1]):
+                piece_index = nodes[adjacency_list[j]]
+                if piece_index == -1:
+                    continue
+
+                attacker_type = pieces[piece_index, 0]
+                if attacker_type == piece_type or attacker_type == 5:
+                    repeated = False
+                    for k in range(count):
+                        if out_pieces[k] == piece_index:
+                            repeated = True
+                            break
+                    if not repeated:
+                        out_pieces[count] = piece_index
+                        count += 1
+                break
+    return count
+
+
+@njit(cache=True, nogil=True)
+def make_move_attacks(move: np.array, nodes: np.array, pieces: np.array, history: np.array, history_index: int,
+                      promotions: np.array, store: bool, adjacency_list: np.array, patterns_offsets: np.array,
+                      pieces_offsets: np.array, tiles_offsets: np.array, attacks: np.array) -> None:
+    """ make_move that also updates the attack maps. Only the moving piece, the captured piece and
+    the sliders whose rays go through the origin or destination tiles are recomputed. """
+    origin_tile = move[0]
+    destination_tile = move[1]
+    moving_piece_index = nodes[origin_tile]
+    captured_piece_index = nodes[destination_tile]
+
+    affected = np.empty(MAX_CHECK_LINES, dtype=np.int16)
+    affected[0] = moving_piece_index
+    count = 1
+    if captured_piece_index != -1:
+        affected[1] = captured_piece_index
+        count = 2
+    count = find_slider_attackers(origin_tile, nodes, pieces, adjacency_list, patterns_offsets, pieces_offsets,
+                                  tiles_offsets, affected, count)
+    count = find_slider_attackers(destination_tile, nodes, pieces, adjacency_list, patterns_offsets, pieces_offsets,
+                                  tiles_offsets, affected, count)
+
+    for i in range(count):
+        add_piece_attacks(affected[i], -1, nodes, pieces, adjacency_list, patterns_offsets, pieces_offsets, tiles_offsets, attacks)
+
+    make_move(move, nodes, pieces, history, history_index, promotions, store)
+
+    for i in range(count):
+        if affected[i] != captured_piece_index:
+            add_piece_attacks(affected[i], 1, nodes, pieces, adjacency_list, patterns_offsets, pieces_offsets, tiles_offsets, attacks)
+
+
+@njit(cache=True, nogil=True)
+def undo_move_attacks(nodes: np.array, pieces: np.array, history: np.array, history_index: int,
+                      adjacency_list: np.array, patterns_offsets: np.array, pieces_offsets: np.array,
+                      tiles_offsets: np.array, attacks: np.array) -> None:
+    """ undo_move that also restores the attack maps. """
+    moving_piece_index = history[history_index, 0]
+    origin_tile = history[history_index, 1]
+    destination_tile = history[history_index, 2]
+    captured_piece_index = history[history_index, 3]
+
+    affected = np.empty(MAX_CHECK_LINES, dtype=np.int16)
+    affected[0] = moving_piece_index
+    count = 1
+    count = find_slider_attackers(origin_tile, nodes, pieces, adjacency_list, patterns_offsets, pieces_offsets,
+                                  tiles_offsets, affected, count)
+    count = find_slider_attackers(destination_tile, nodes, pieces, adjacency_list, patterns_offsets, pieces_offsets,
+                                  tiles_offsets, affected, count)
+
+    for i in range(count):
+        add_piece_attacks(affected[i], -1, nodes, pieces, adjacency_list, patterns_offsets, pieces_offsets, tiles_offsets, attacks)
+
+    undo_move(nodes, pieces, history, history_index)
+
+    for i in range(count):
+        add_piece_attacks(affected[i], 1, nodes, pieces, adjacency_list, patterns_offsets, pieces_offsets, tiles_offsets, attacks)
+    if captured_piece_index != -1:
+        add_piece_attacks(captured_piece_index, 1, nodes, pieces, adjacency_list, patterns_offsets, pieces_offsets, tiles_offsets, attacks)
+
+
+@njit(cache=True)
+def is_attacked(player: np.uint8, tile: np.int16, attacks: np.array) -> bool:
+    """ Whether any other team attacks the tile. """
+    for team in range(attacks.shape[0]):
+        if team != player and attacks[team, tile] > 0:
+            return True
+    return False
@@ -0,0 +1,52 @@
+from typing import Tuple
+from numba import njit, prange
+import numpy as np
+
+from engine.core.matrices.matrix_constants import *
+from engine.core.matrices.chess_logic_bounds import generate_legal_moves
+
+
+@njit(parallel=True, cache=True)
+def generate_legal_moves_batch(teams: np.array, alive: np.array, nodes: np.array, pieces: np.array, adjacency_list: np.array,
+                               patterns_offsets: np.array, pieces_offsets: np.array, tiles_offsets: np.array,
+                               promotion_zones: np.array, current_hashes: np.array, hasher: np.array,
+                               pieces_per_player: int = 16) -> Tuple[np.array, np.array, np.array]:
+    """ Legal moves and child hashes of N positions that share the same board topology.
+
+    nodes (N, num_tiles) and pieces (N, num_pieces, 6) are the stacked boards, teams (N) the team that
+    moves in each one and current_hashes (N) their hashes. Boards whose player is not alive get no moves. The boards are played and undone while
+    generating, so they are modified during the call but left as they were.
+
+    The result is in CSR format: the moves and hashes of board i are moves[offsets[i]:offsets[i + 1]]
+    and hashes[offsets[i]:offsets[i + 1]], in the same order get_movements would return them.
+    """
+    n = teams.shape[0]
+    moves_buffer = np.empty((n, MAX_POSSIBLE_MOVES, 2), dtype=np.uint8)
+    hashes_buffer = np.empty((n, MAX_POSSIBLE_MOVES), dtype=np.uint64)
+    counts = np.zeros(n, dtype=np.int64)
+
+    for i in prange(n):
+        if not alive[i]:
+            continue
+        # make_move only writes the history row it is given, so a single scratch row is enough
+        history = np.empty((1, 7), dtype=np.int16)
+        out_count = np.zeros(1, dtype=np.uint8)
+        generate_legal_moves(teams[i], nodes[i], pieces[i], adjacency_list, patterns_offsets, pieces_offsets,
+                             tiles_offsets, moves_buffer[i], out_count, history, 0, promotion_zones,
+                             current_hashes[i], hashes_buffer[i], hasher, pieces_per_player)
+        counts[i] = out_count[0]
+
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    for i in range(n):
+        offsets[i + 1] = offsets[i] + counts[i]
+
+    moves = np.empty((offsets[n], 2), dtype=np.uint8)
+    hashes = np.empty(offsets[n], dtype=np.uint64)
+    for i in prange(n):
+        start = offsets[i]
+        for j in range(counts[i]):
+            moves[start + j, 0] = moves_buffer[i, j, 0]
+            moves[start + j, 1] = moves_buffer[i, j, 1]
+            hashes[start + j] = hashes_buffer[i, j]
+
+    return offsets, moves, hashes
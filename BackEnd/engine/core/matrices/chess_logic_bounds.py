@@ -195,7 +195,7 @@ def get_king_possible_atacks(player: np.uint8, tile: np.int16, nodes: np.array,
     move_end = patterns_offsets[piece_start + 2]
     for i in range(move_start, move_end): 
         t = adjacency_list[i]
-        if t == -1: 
+        if nodes[t] == -1: 
             continue
 
         piece = pieces[nodes[t]]
@@ -277,7 +277,7 @@ def get_possible_moves(player: np.uint8, nodes: np.array, pieces: np.array, adja
     out_count[0] = count
 
 
-@njit
+@njit(cache=True)
 def get_king_tile(pieces: np.ndarray, player: np.uint8) -> np.array:
     for i in range(pieces.shape[0]):
         if pieces[i, 0] == 3 and pieces[i, 1] == player and pieces[i, 4] == 0:
@@ -309,6 +309,206 @@ def filter_legal_moves(player: np.uint8, nodes: np.array, pieces: np.array, adja
     out_count[0] = count
 
 
+@njit(cache=True)
+def trace_pins_and_checks(player: np.uint8, king_tile: np.int16, piece_type: np.uint8, nodes: np.array, pieces: np.array, 
+                          adjacency_list: np.array, patterns_offsets: np.array, pieces_offsets: np.array, tiles_offsets: np.array, 
+                          ray_buffer: np.array, ray_count: int, pin_tiles: np.array, pin_starts: np.array, pin_ends: np.array, 
+                          pin_count: int, line_starts: np.array, line_ends: np.array, line_count: int) -> Tuple[int, int, int]: 
+    """ Walks the tower (0) or bishop (2) rays from the king. A ray that reaches an enemy tower/bishop or queen 
+    directly is a check line, and if exactly one of our pieces is in between, that piece is pinned. 
+    The tiles of each line or pin (up to the attacker, included) are stored in ray_buffer. """
+    piece_start, piece_end = retrieve_move_bounds(king_tile, piece_type, tiles_offsets, pieces_offsets)
+
+    for i in range(piece_start, piece_end): 
+        start = ray_count
+        blocker = -1
+        for j in range(patterns_offsets[i], patterns_offsets[i + 1]): 
+            t = adjacency_list[j]
+            ray_buffer[ray_count] = t
+            ray_count += 1
+
+            piece_index = nodes[t]
+            if piece_index == -1: 
+                continue
+
+            piece = pieces[piece_index]
+            if piece[1] == player: 
+                if blocker == -1: 
+                    blocker = t
+                    continue
+                break
+            
+            if piece[0] == piece_type or piece[0] == 5: 
+                if blocker == -1: 
+                    line_starts[line_count] = start
+                    line_ends[line_count] = ray_count
+                    line_count += 1
+                else: 
+                    pin_tiles[pin_count] = blocker
+                    pin_starts[pin_count] = start
+                    pin_ends[pin_count] = ray_count
+                    pin_count += 1
+                start = -1 # Keep the tiles in the buffer
+            break
+        
+        if start != -1: 
+            ray_count = start
+    
+    return ray_count, pin_count, line_count
+
+
+@njit(cache=True)
+def add_check_line(tile: np.int16, ray_buffer: np.array, ray_count: int, 
+                   line_starts: np.array, line_ends: np.array, line_count: int) -> Tuple[int, int]: 
+    ray_buffer[ray_count] = tile
+    line_starts[line_count] = ray_count
+    line_ends[line_count] = ray_count + 1
+    return ray_count + 1, line_count + 1
+
+
+@njit(cache=True)
+def move_hash(current_hash: np.uint64, origin_tile: np.int16, destination_tile: np.int16, 
+              nodes: np.array, pieces: np.array, promotions: np.array, hasher: np.array) -> np.uint64: 
+    """ Same result as update_hash after make_move, without touching the board. """ 
+    piece = pieces[nodes[origin_tile]]
+    original_type = piece[0]
+    color = piece[1]
+    new_type = original_type
+    if original_type == 4: 
+        for promotion_tile in promotions[color]: 
+            if destination_tile == promotion_tile: 
+                new_type = 5
+                break
+
+    current_hash ^= hasher[original_type][color][origin_tile]
+    current_hash ^= hasher[new_type][color][destination_tile]
+
+    captured_piece_index = nodes[destination_tile]
+    if captured_piece_index != -1: 
+        captured_piece = pieces[captured_piece_index]
+        current_hash ^= hasher[captured_piece[0]][captured_piece[1]][destination_tile]
+    return current_hash
+
+
+@njit(cache=True, nogil=True)
+def generate_legal_moves(player: np.uint8, nodes: np.array, pieces: np.array, adjacency_list: np.array, 
+                         patterns_offsets: np.array, pieces_offsets: np.array, tiles_offsets: np.array,
+                         out_moves: np.array, out_count: np.array, history: np.array, history_index: int,
+                         promotion_zones: np.array, current_hash: int, hashes: np.array, hasher: np.array, 
+                         pieces_per_player: int = 16) -> None: 
+    """ Legal move generation without playing every move. 
+    Checking lines and pinned pieces are computed once from the king (using the same traces as is_in_check), 
+    then every non king move is validated against them. Only king moves are played to look for checks. 
+    Gives the same moves, in the same order, as get_possible_moves + filter_legal_moves. """
+    num_tiles = nodes.shape[0]
+    king_tile = get_king_tile(pieces, player)[2]
+
+    ray_buffer = np.empty(MAX_RAY_BUFFER, dtype=np.int16)
+    pin_tiles = np.empty(MAX_CHECK_LINES, dtype=np.int16)
+    pin_starts = np.empty(MAX_CHECK_LINES, dtype=np.int16)
+    pin_ends = np.empty(MAX_CHECK_LINES, dtype=np.int16)
+    line_starts = np.empty(MAX_CHECK_LINES, dtype=np.int16)
+    line_ends = np.empty(MAX_CHECK_LINES, dtype=np.int16)
+
+    ray_count, pin_count, line_count = trace_pins_and_checks(
+        player, king_tile, 0, nodes, pieces, adjacency_list, patterns_offsets, pieces_offsets, tiles_offsets, 
+        ray_buffer, 0, pin_tiles, pin_starts, pin_ends, 0, line_starts, line_ends, 0)
+    ray_count, pin_count, line_count = trace_pins_and_checks(
+        player, king_tile, 2, nodes, pieces, adjacency_list, patterns_offsets, pieces_offsets, tiles_offsets, 
+        ray_buffer, ray_count, pin_tiles, pin_starts, pin_ends, pin_count, line_starts, line_ends, line_count)
+
+    # Knight and king checks
+    piece_start, piece_end = retrieve_move_bounds(king_tile, 1, tiles_offsets, pieces_offsets)
+    for i in range(patterns_offsets[piece_start], patterns_offsets[piece_end]): 
+        t = adjacency_list[i]
+        if nodes[t] != -1 and pieces[nodes[t], 1] != player and pieces[nodes[t], 0] == 1: 
+            ray_count, line_count = add_check_line(t, ray_buffer, ray_count, line_starts, line_ends, line_count)
+
+    piece_start, _ = retrieve_move_bounds(king_tile, 3, tiles_offsets, pieces_offsets)
+    for i in range(patterns_offsets[piece_start], patterns_offsets[piece_start + 1]): 
+        t = adjacency_list[i]
+        if nodes[t] != -1 and pieces[nodes[t], 1] != player and pieces[nodes[t], 0] == 3: 
+            ray_count, line_count = add_check_line(t, ray_buffer, ray_count, line_starts, line_ends, line_count)
+
+    # Pawn checks
+    for i in range(patterns_offsets[piece_start + 1], patterns_offsets[piece_start + 2]): 
+        t = adjacency_list[i]
+        piece_index = nodes[t]
+        if piece_index == -1: 
+            continue
+        pawn = pieces[piece_index]
+        if pawn[0] != 4 or pawn[1] == player or pawn[4]: 
+            continue
+        pawn_start, _ = retrieve_move_bounds(t, 4, tiles_offsets, pieces_offsets)
+        pawn_start += 2 * pawn[1] + 1
+        for j in range(patterns_offsets[pawn_start], patterns_offsets[pawn_start + 1]): 
+            if adjacency_list[j] == king_tile: 
+                ray_count, line_count = add_check_line(t, ray_buffer, ray_count, line_starts, line_ends, line_count)
+                break
+
+    # Tiles where a non king move has to land to stop every check (blocking or capturing)
+    targets = np.zeros(num_tiles, dtype=np.int16)
+    stamps = np.full(num_tiles, -1, dtype=np.int16)
+    can_evade = line_count == 0
+    for l in range(line_count): 
+        for j in range(line_starts[l], line_ends[l]): 
+            t = ray_buffer[j]
+            if stamps[t] != l: 
+                stamps[t] = l
+                targets[t] += 1
+                if targets[t] == line_count: 
+                    can_evade = True
+
+    pinned = np.zeros(num_tiles, dtype=np.bool_)
+    for p in range(pin_count): 
+        pinned[pin_tiles[p]] = True
+
+    if can_evade: 
+        get_possible_moves(player, nodes, pieces, adjacency_list, patterns_offsets, pieces_offsets, tiles_offsets, 
+                           out_moves, out_count, pieces_per_player)
+    else: 
+        # Only the king can get out of a multiple check
+        out_count[0] = get_king_movements(player, king_tile, nodes, pieces, adjacency_list, patterns_offsets, 
+                                          pieces_offsets, tiles_offsets, out_moves, 0)
+
+    king_trace = np.empty((MAX_POSSIBLE_MOVES, 2), dtype=np.uint8)
+    count = 0
+    for i in range(out_count[0]): 
+        move = out_moves[i]
+        origin_tile = move[0]
+        destination_tile = move[1]
+
+        if origin_tile == king_tile: 
+            make_move(move, nodes, pieces, history, history_index, promotion_zones, False)
+            legal = not is_in_check(player, destination_tile, nodes, pieces, adjacency_list, patterns_offsets, 
+                                    pieces_offsets, tiles_offsets, king_trace)
+            if legal: 
+                hashes[count] = update_hash(current_hash, history[history_index], pieces, hasher) 
+            undo_move(nodes, pieces, history, history_index)
+        else: 
+            legal = line_count == 0 or targets[destination_tile] == line_count
+            if legal and pinned[origin_tile]: 
+                for p in range(pin_count): 
+                    if pin_tiles[p] != origin_tile: 
+                        continue
+                    on_ray = False
+                    for j in range(pin_starts[p], pin_ends[p]): 
+                        if ray_buffer[j] == destination_tile: 
+                            on_ray = True
+                            break
+                    if not on_ray: 
+                        legal = False
+                        break
+            if legal: 
+                hashes[count] = move_hash(current_hash, origin_tile, destination_tile, nodes, pieces, promotion_zones, hasher)
+        
+        if legal: 
+            out_moves[count] = move
+            count += 1
+
+    out_count[0] = count
+
+
 @njit(cache=True)
 def move_makes_check(king_trace, count, nodes, pieces, valid_types) -> bool: 
     for i in range(count):
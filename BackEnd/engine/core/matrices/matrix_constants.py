@@ -11,6 +11,11 @@ MAX_POSSIBLE_MOVES = 160
 # Used to create the king trace array
 MAX_POSSIBLE_TRACE = 22
 
+# Buffers used by the legal move generator to store the rays from the king that give check or pin a piece. 
+# There are at most 16 tower and bishop rays (pentagon tiles), plus the knight, king and pawn checks.
+MAX_CHECK_LINES = 64
+MAX_RAY_BUFFER = 512
+
 PLAYER_DTYPE = np.dtype([
     ('id', np.uint8),
     ('team', np.uint8),
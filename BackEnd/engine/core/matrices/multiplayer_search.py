@@ -0,0 +1,400 @@
+from numba import njit
+import numpy as np
+
+from engine.core.matrices.matrix_constants import *
+from engine.core.matrices.chess_logic_bounds import (
+    generate_legal_moves,
+    get_king_tile
+)
+from engine.core.matrices.attack_maps import (
+    make_move_attacks,
+    undo_move_attacks,
+    is_attacked
+)
+from engine.core.matrices.playout import count_alive, next_player
+from engine.utils.ZobristHasherMatrices import state_key
+from engine.utils.TranspositionTable import (
+    probe,
+    store,
+    BUCKET_SIZE,
+    EXACT,
+    LOWER_BOUND,
+    UPPER_BOUND
+)
+from engine.core.matrices.alpha_beta import (
+    count_node,
+    is_repetition,
+    score_moves,
+    pick_move,
+    record_cutoff,
+    MAX_PLY,
+    MATE_SCORE,
+    MATE_BOUND,
+    INFINITY,
+    CAPTURE_SCORE,
+    PIECE_VALUES,
+    MOBILITY_WEIGHT,
+    ABORTED,
+    ROOT_UPDATED,
+    PLIES_LEFT,
+    NO_CAPTURE_LIMIT
+)
+
+
+# Searches for games of more than 2 players, following the turn order of GameMatrices: dead players are skipped,
+# a player without legal moves is killed (checkmate, or stalemate with more than 2 players alive) and so is a
+# player whose king is captured. The kills are undone when the search goes back up.
+#   - paranoid: the root player maximizes its score and all the others minimize it, so alpha-beta applies.
+#     Leaves are extended with a few plies of captures.
+#   - maxn: every player maximizes its own component of a vector of scores. There is no pruning.
+# Scores of a player are its strength (material plus mobility) minus the mean strength of the other players alive.
+# Winning scores MATE_SCORE - ply, a dead player scores -MATE_SCORE.
+# The searches carry the hash of the pieces. The hash of a position adds the keys of the player to move and the
+# players alive (as GameMatrices.hash), and the transposition table key also a search key (the root player in
+# paranoid mode, whose scores depend on it).
+
+QUIESCENCE_PLIES = 4
+
+ROOT_KEYS = np.random.default_rng(20240229).integers(1, np.iinfo(np.int64).max, size=4, dtype=np.int64)
+ROOT_KEYS = ROOT_KEYS.astype(np.uint64)
+
+
+@njit(cache=True)
+def evaluate_players(teams: np.array, alive: np.array, pieces: np.array, attacks: np.array, ply: int,
+                     utilities: np.array) -> None:
+    """ Writes the score of every player into utilities. """
+    number_of_players = teams.shape[0]
+    utilities[:] = 0
+    for i in range(pieces.shape[0]):
+        if pieces[i, 0] != -1 and pieces[i, 4] == 0:
+            for p in range(number_of_players):
+                if teams[p] == pieces[i, 1]:
+                    utilities[p] += PIECE_VALUES[pieces[i, 0]]
+                    break
+
+    total = 0
+    for p in range(number_of_players):
+        if alive[p]:
+            team = teams[p]
+            for tile in range(attacks.shape[1]):
+                if attacks[team, tile] > 0:
+                    utilities[p] += MOBILITY_WEIGHT
+            total += utilities[p]
+
+    players_alive = count_alive(alive)
+    for p in range(number_of_players):
+        if not alive[p]:
+            utilities[p] = -MATE_SCORE
+        elif players_alive == 1:
+            utilities[p] = MATE_SCORE - ply
+        else:
+            utilities[p] -= (total - utilities[p]) // (players_alive - 1)
+
+
+@njit(cache=True)
+def resolve_turn(turn: int, ply: int, teams: np.array, alive: np.array, nodes: np.array, pieces: np.array,
+                 attacks: np.array, history: np.array, history_index: int, adjacency_list: np.array,
+                 patterns_offsets: np.array, pieces_offsets: np.array, tiles_offsets: np.array,
+                 promotion_zones: np.array, current_hash: np.uint64, hasher: np.array, pieces_per_player: int,
+                 moves: np.array, hashes: np.array, counts: np.array, killed: np.array) -> int:
+    """ Finds the player that moves next (from turn on) and generates its moves at the ply.
+    Players without legal moves are killed on the way (marked in killed, to be revived by revive_players).
+    Returns the player, or -1 if the game ended: one player alive, or a stalemate between the last 2. """
+    killed[:] = False
+    if not alive[turn]:
+        turn = next_player(turn, alive)
+    while count_alive(alive) > 1:
+        team = teams[turn]
+        generate_legal_moves(team, nodes, pieces, adjacency_list, patterns_offsets, pieces_offsets, tiles_offsets,
+                             moves[ply], counts[ply:ply + 1], history, history_index, promotion_zones, current_hash,
+                             hashes[ply], hasher, pieces_per_player)
+        if counts[ply] > 0:
+            return turn
+        if not is_attacked(team, get_king_tile(pieces, team)[2], attacks) and count_alive(alive) == 2:
+            return -1
+        alive[turn] = False
+        killed[turn] = True
+        turn = next_player(turn, alive)
+    return -1
+
+
+@njit(cache=True)
+def revive_players(alive: np.array, killed: np.array) -> None:
+    for i in range(alive.shape[0]):
+        if killed[i]:
+            alive[i] = True
+
+
+@njit(cache=True)
+def captured_king_player(history_row: np.array, pieces: np.array, teams: np.array) -> int:
+    """ Player whose king was captured by the move of the history row, -1 if none. """
+    captured_piece_index = history_row[3]
+    if captured_piece_index != -1 and pieces[captured_piece_index, 0] == 3:
+        for p in range(teams.shape[0]):
+            if teams[p] == pieces[captured_piece_index, 1]:
+                return p
+    return -1
+
+
+@njit(cache=True)
+def load_entry(key: np.uint64, depth: int, ply: int, tt_entries: np.array, tt_header: np.array, tt_move: np.array,
+               scores: np.array) -> int:
+    """ Looks the key up. The move of the entry is written into tt_move, and if it was searched deep enough,
+    its scores into scores (back relative to the root). Returns the flag of the entry, -1 if not usable. """
+    index = probe(tt_entries, tt_header, key)
+    if index == -1:
+        return -1
+    entry = tt_entries[index // BUCKET_SIZE, index % BUCKET_SIZE]
+    tt_move[0] = entry.move[0]
+    tt_move[1] = entry.move[1]
+    if entry.depth < depth:
+        return -1
+    for i in range(scores.shape[0]):
+        score = np.int64(entry.scores[i])
+        if score > MATE_BOUND:
+            score -= ply
+        elif score < -MATE_BOUND:
+            score += ply
+        scores[i] = score
+    return entry.flag
+
+
+@njit(cache=True)
+def store_entry(key: np.uint64, depth: int, scores: np.array, flag: int, move: np.array, ply: int,
+                tt_entries: np.array, tt_header: np.array) -> None:
+    """ Winning scores are stored relative to the node. """
+    node_scores = np.empty(scores.shape[0], dtype=np.int32)
+    for i in range(scores.shape[0]):
+        score = scores[i]
+        if score > MATE_BOUND:
+            score += ply
+        elif score < -MATE_BOUND:
+            score -= ply
+        node_scores[i] = score
+    store(tt_entries, tt_header, key, depth, flag, move, node_scores)
+
+
+@njit(cache=True)
+def paranoid(depth: int, ply: int, alpha: int, beta: int, turn: int, root: int, current_hash: np.uint64,
+             no_capture: int, teams: np.array, alive: np.array, nodes: np.array, pieces: np.array,
+             attacks: np.array, history: np.array, history_base: int, adjacency_list: np.array,
+             patterns_offsets: np.array, pieces_offsets: np.array, tiles_offsets: np.array,
+             promotion_zones: np.array, hasher: np.array, state_keys: np.array, pieces_per_player: int,
+             moves: np.array, hashes: np.array, counts: np.array, scores: np.array, utilities: np.array,
+             killed_players: np.array, path_hashes: np.array, path_base: int, tt_entries: np.array,
+             tt_header: np.array, search_key: np.uint64, killers: np.array, history_scores: np.array,
+             root_move: np.array, info: np.array) -> int:
+    """ Alpha-beta search of the score of the root player. depth <= 0 is the quiescence search (captures only,
+    every player can stand pat) down to -QUIESCENCE_PLIES, and no deeper than MAX_PLY - 1. Returns 0 if aborted. """
+    if ply > 0 and depth > 0:
+        if ply >= info[PLIES_LEFT] or no_capture >= info[NO_CAPTURE_LIMIT]:
+            return 0
+        to_move = turn if alive[turn] else next_player(turn, alive)
+        if is_repetition(path_hashes, path_base + ply, current_hash ^ state_key(to_move, alive, state_keys)):
+            return 0
+
+    history_index = history_base + ply
+    killed = killed_players[ply]
+    turn = resolve_turn(turn, ply, teams, alive, nodes, pieces, attacks, history, history_index, adjacency_list,
+                        patterns_offsets, pieces_offsets, tiles_offsets, promotion_zones, current_hash, hasher,
+                        pieces_per_player, moves, hashes, counts, killed)
+    if not alive[root]:
+        revive_players(alive, killed)
+        return -MATE_SCORE + ply
+    if turn == -1:
+        # Only the root player alive, or a stalemate
+        score = MATE_SCORE - ply if count_alive(alive) == 1 else 0
+        revive_players(alive, killed)
+        return score
+    if count_node(info):
+        revive_players(alive, killed)
+        return 0
+
+    maximizing = turn == root
+    original_alpha, original_beta = alpha, beta
+    best_score = -INFINITY if maximizing else INFINITY
+    best_move = 0
+
+    tt_move = np.full(2, 255, dtype=np.uint8)
+    position_hash = current_hash ^ state_key(turn, alive, state_keys)
+    key = position_hash ^ search_key
+    if depth > 0:
+        tt_score = utilities[ply, :1]
+        flag = load_entry(key, depth, ply, tt_entries, tt_header, tt_move, tt_score)
+        if flag != -1 and ply > 0:
+            if (flag == EXACT or (flag == LOWER_BOUND and tt_score[0] >= beta)
+                    or (flag == UPPER_BOUND and tt_score[0] <= alpha)):
+                revive_players(alive, killed)
+                return tt_score[0]
+    else:
+        # Standing pat: the player to move does not have to capture
+        evaluate_players(teams, alive, pieces, attacks, ply, utilities[ply, :4])
+        best_score = utilities[ply, root]
+        if (depth <= -QUIESCENCE_PLIES or ply >= MAX_PLY - 1) or (maximizing and best_score >= beta) or (not maximizing and best_score <= alpha):
+            revive_players(alive, killed)
+            return best_score
+        if maximizing:
+            alpha = max(alpha, best_score)
+        else:
+            beta = min(beta, best_score)
+
+    count = np.int64(counts[ply])
+    ply_moves = moves[ply]
+    ply_hashes = hashes[ply]
+    ply_scores = scores[ply]
+    score_moves(ply_moves, count, ply_scores, nodes, pieces, tt_move, killers[ply], history_scores)
+
+    path_hashes[path_base + ply] = position_hash
+    for i in range(count):
+        pick_move(ply_moves, ply_hashes, ply_scores, i, count)
+        if depth <= 0 and ply_scores[i] < CAPTURE_SCORE:
+            break
+        origin_tile = ply_moves[i, 0]
+        destination_tile = ply_moves[i, 1]
+        capture = nodes[destination_tile] != -1
+        child_no_capture = 0 if capture else no_capture + 1
+
+        make_move_attacks(ply_moves[i], nodes, pieces, history, history_index, promotion_zones, True,
+                          adjacency_list, patterns_offsets, pieces_offsets, tiles_offsets, attacks)
+        victim = captured_king_player(history[history_index], pieces, teams)
+        if victim != -1:
+            alive[victim] = False
+        score = paranoid(depth - 1, ply + 1, alpha, beta, (turn + 1) % teams.shape[0], root, ply_hashes[i],
+                         child_no_capture, teams, alive, nodes, pieces, attacks, history, history_base,
+                         adjacency_list, patterns_offsets, pieces_offsets, tiles_offsets, promotion_zones, hasher,
+                         state_keys, pieces_per_player, moves, hashes, counts, scores, utilities, killed_players,
+                         path_hashes, path_base, tt_entries, tt_header, search_key, killers, history_scores, root_move,
+                         info)
+        if victim != -1:
+            alive[victim] = True
+        undo_move_attacks(nodes, pieces, history, history_index, adjacency_list, patterns_offsets,
+                          pieces_offsets, tiles_offsets, attacks)
+        if info[ABORTED]:
+            revive_players(alive, killed)
+            return 0
+
+        if (maximizing and score > best_score) or (not maximizing and score < best_score):
+            best_score = score
+            best_move = i
+            if maximizing:
+                alpha = max(alpha, score)
+                if ply == 0:
+                    root_move[0] = origin_tile
+                    root_move[1] = destination_tile
+                    info[ROOT_UPDATED] = 1
+            else:
+                beta = min(beta, score)
+        if alpha >= beta:
+            if not capture and depth > 0:
+                record_cutoff(origin_tile, destination_tile, depth, killers[ply], history_scores)
+            break
+
+    if depth > 0:
+        if best_score <= original_alpha:
+            flag = UPPER_BOUND
+        elif best_score >= original_beta:
+            flag = LOWER_BOUND
+        else:
+            flag = EXACT
+        utilities[ply, 0] = best_score
+        store_entry(key, depth, utilities[ply, :1], flag, ply_moves[best_move], ply, tt_entries, tt_header)
+    revive_players(alive, killed)
+    return best_score
+
+
+@njit(cache=True)
+def draw_scores(alive: np.array, values: np.array) -> None:
+    for p in range(values.shape[0]):
+        values[p] = 0 if alive[p] else -MATE_SCORE
+
+
+@njit(cache=True)
+def maxn(depth: int, ply: int, turn: int, current_hash: np.uint64, no_capture: int, teams: np.array,
+         alive: np.array, nodes: np.array, pieces: np.array, attacks: np.array, history: np.array,
+         history_base: int, adjacency_list: np.array, patterns_offsets: np.array, pieces_offsets: np.array,
+         tiles_offsets: np.array, promotion_zones: np.array, hasher: np.array, state_keys: np.array,
+         pieces_per_player: int, moves: np.array, hashes: np.array, counts: np.array, scores: np.array,
+         utilities: np.array, killed_players: np.array, path_hashes: np.array, path_base: int, tt_entries: np.array,
+         tt_header: np.array, search_key: np.uint64, killers: np.array, history_scores: np.array,
+         root_move: np.array, info: np.array) -> None:
+    """ Max^n search: writes the scores of every player into utilities[ply] (undefined if aborted). """
+    number_of_players = teams.shape[0]
+    values = utilities[ply, :number_of_players]
+    if ply > 0:
+        to_move = turn if alive[turn] else next_player(turn, alive)
+        if (ply >= info[PLIES_LEFT] or no_capture >= info[NO_CAPTURE_LIMIT]
+                or is_repetition(path_hashes, path_base + ply, current_hash ^ state_key(to_move, alive, state_keys))):
+            draw_scores(alive, values)
+            return
+
+    history_index = history_base + ply
+    killed = killed_players[ply]
+    turn = resolve_turn(turn, ply, teams, alive, nodes, pieces, attacks, history, history_index, adjacency_list,
+                        patterns_offsets, pieces_offsets, tiles_offsets, promotion_zones, current_hash, hasher,
+                        pieces_per_player, moves, hashes, counts, killed)
+    if turn == -1:
+        if count_alive(alive) == 1:
+            evaluate_players(teams, alive, pieces, attacks, ply, values)
+        else:
+            draw_scores(alive, values)
+        revive_players(alive, killed)
+        return
+    if count_node(info) or depth <= 0 or ply >= MAX_PLY - 1:
+        evaluate_players(teams, alive, pieces, attacks, ply, values)
+        revive_players(alive, killed)
+        return
+
+    tt_move = np.full(2, 255, dtype=np.uint8)
+    position_hash = current_hash ^ state_key(turn, alive, state_keys)
+    key = position_hash ^ search_key
+    if load_entry(key, depth, ply, tt_entries, tt_header, tt_move, values) != -1 and ply > 0:
+        revive_players(alive, killed)
+        return
+
+    count = np.int64(counts[ply])
+    ply_moves = moves[ply]
+    ply_hashes = hashes[ply]
+    ply_scores = scores[ply]
+    score_moves(ply_moves, count, ply_scores, nodes, pieces, tt_move, killers[ply], history_scores)
+
+    path_hashes[path_base + ply] = position_hash
+    child_values = utilities[ply + 1, :number_of_players]
+    values[turn] = -INFINITY
+    best_move = 0
+    for i in range(count):
+        pick_move(ply_moves, ply_hashes, ply_scores, i, count)
+        origin_tile = ply_moves[i, 0]
+        destination_tile = ply_moves[i, 1]
+        capture = nodes[destination_tile] != -1
+        child_no_capture = 0 if capture else no_capture + 1
+
+        make_move_attacks(ply_moves[i], nodes, pieces, history, history_index, promotion_zones, True,
+                          adjacency_list, patterns_offsets, pieces_offsets, tiles_offsets, attacks)
+        victim = captured_king_player(history[history_index], pieces, teams)
+        if victim != -1:
+            alive[victim] = False
+        maxn(depth - 1, ply + 1, (turn + 1) % number_of_players, ply_hashes[i], child_no_capture, teams, alive,
+             nodes, pieces, attacks, history, history_base, adjacency_list, patterns_offsets, pieces_offsets,
+             tiles_offsets, promotion_zones, hasher, state_keys, pieces_per_player, moves, hashes, counts, scores,
+             utilities, killed_players, path_hashes, path_base, tt_entries, tt_header, search_key, killers,
+             history_scores, root_move, info)
+        if victim != -1:
+            alive[victim] = True
+        undo_move_attacks(nodes, pieces, history, history_index, adjacency_list, patterns_offsets,
+                          pieces_offsets, tiles_offsets, attacks)
+        if info[ABORTED]:
+            revive_players(alive, killed)
+            return
+
+        if child_values[turn] > values[turn]:
+            values[:] = child_values
+            best_move = i
+            if ply == 0:
+                root_move[0] = origin_tile
+                root_move[1] = destination_tile
+                info[ROOT_UPDATED] = 1
+            if values[turn] >= MATE_SCORE - ply - 1:
+                break # Winning on the next move can not be improved
+
+    store_entry(key, depth, values, EXACT, ply_moves[best_move], ply, tt_entries, tt_header)
+    revive_players(alive, killed)
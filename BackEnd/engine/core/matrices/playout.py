@@ -0,0 +1,259 @@
+from typing import Tuple
+from numba import njit
+import numpy as np
+
+from engine.core.matrices.matrix_constants import *
+from engine.core.matrices.chess_logic_bounds import (
+    generate_legal_moves,
+    get_possible_moves,
+    get_king_tile,
+    is_in_check,
+    make_move,
+    undo_move,
+    update_hash
+)
+from engine.utils.ZobristHasherMatrices import state_key
+
+
+@njit(cache=True)
+def count_alive(alive: np.array) -> int:
+    count = 0
+    for i in range(alive.shape[0]):
+        if alive[i]:
+            count += 1
+    return count
+
+
+@njit(cache=True)
+def next_player(turn: int, alive: np.array) -> int:
+    """ Next player alive after turn (turn itself if it is the only one). """
+    turn = (turn + 1) % alive.shape[0]
+    while not alive[turn]:
+        turn = (turn + 1) % alive.shape[0]
+    return turn
+
+
+@njit(cache=True)
+def count_repetitions(hash_stack: np.array, stack_size: int, current_hash: np.uint64) -> int:
+    count = 0
+    for i in range(stack_size):
+        if hash_stack[i] == current_hash:
+            count += 1
+    return count
+
+
+@njit(cache=True)
+def is_dead_position(pieces: np.array) -> bool:
+    piece_counts = np.zeros(6, dtype=np.int16)
+    for i in range(pieces.shape[0]):
+        if pieces[i, 0] != -1 and pieces[i, 4] == 0:
+            piece_counts[pieces[i, 0]] += 1
+
+    # Only the two kings left
+    if piece_counts[3] == 2 and piece_counts[0] + piece_counts[1] + piece_counts[2] + piece_counts[4] + piece_counts[5] == 0:
+        return True
+
+    # A single minor piece can not force a mate
+    if piece_counts[5] == 0 and piece_counts[0] == 0 and piece_counts[4] == 0:
+        if piece_counts[2] + piece_counts[1] == 1:
+            return True
+
+    return False
+
+
+@njit(cache=True)
+def kill_team(team: int, teams: np.array, alive: np.array, rewards: np.array) -> None:
+    for i in range(teams.shape[0]):
+        if teams[i] == team:
+            alive[i] = False
+            rewards[i] = -1
+            return
+
+
+@njit(cache=True)
+def playout_turn(turn: int, teams: np.array, alive: np.array, rewards: np.array,
+                 nodes: np.array, pieces: np.array, adjacency_list: np.array,
+                 patterns_offsets: np.array, pieces_offsets: np.array, tiles_offsets: np.array,
+                 out_moves: np.array, out_count: np.array, out_hashes: np.array, king_trace: np.array,
+                 history: np.array, history_index: int, promotion_zones: np.array,
+                 current_hash: np.uint64, hasher: np.array, pieces_per_player: int) -> Tuple[int, bool]:
+    """ Compiled equivalent of GameMatrices.get_turn + check_player_state.
+    Returns the player that has to move (-1 if it can not move) and whether the game ended in a draw. """
+    if not alive[turn]:
+        return -1, False
+
+    team = teams[turn]
+    generate_legal_moves(team, nodes, pieces, adjacency_list, patterns_offsets, pieces_offsets,
+                         tiles_offsets, out_moves, out_count, history, history_index,
+                         promotion_zones, current_hash, out_hashes, hasher, pieces_per_player)
+    if out_count[0] > 0:
+        return turn, False
+
+    king_tile = get_king_tile(pieces, team)[2]
+    if is_in_check(team, king_tile, nodes, pieces, adjacency_list, patterns_offsets,
+                   pieces_offsets, tiles_offsets, king_trace):
+        alive[turn] = False
+        rewards[turn] = -1
+        return -1, False
+
+    # If there are more than 2 players, a stalemate is losing for that player. When there are only 2 players, it is a draw
+    if count_alive(alive) > 2:
+        alive[turn] = False
+        rewards[turn] = -1
+        return -1, False
+    return -1, True
+
+
+@njit(cache=True)
+def sample_legal_move(team: np.uint8, nodes: np.array, pieces: np.array, adjacency_list: np.array,
+                      patterns_offsets: np.array, pieces_offsets: np.array, tiles_offsets: np.array,
+                      out_moves: np.array, out_count: np.array, king_trace: np.array, history: np.array,
+                      history_index: int, promotion_zones: np.array, pieces_per_player: int) -> int:
+    """ Random legal move by rejection sampling: generates the pseudo legal moves and tries random ones
+    (each one once) until one does not leave the king in check. Returns its index in out_moves, or -1 if
+    there is no legal move. Every legal move is equally likely, as when choosing from generate_legal_moves. """
+    get_possible_moves(team, nodes, pieces, adjacency_list, patterns_offsets, pieces_offsets,
+                       tiles_offsets, out_moves, out_count, pieces_per_player)
+    king = get_king_tile(pieces, team) # Row of the king, it follows the king when it moves
+    remaining = np.int64(out_count[0])
+    while remaining > 0:
+        index = np.random.randint(remaining)
+        make_move(out_moves[index], nodes, pieces, history, history_index, promotion_zones, False)
+        legal = not is_in_check(team, king[2], nodes, pieces, adjacency_list, patterns_offsets,
+                                pieces_offsets, tiles_offsets, king_trace)
+        undo_move(nodes, pieces, history, history_index)
+        if legal:
+            return index
+
+        remaining -= 1
+        out_moves[index, 0] = out_moves[remaining, 0]
+        out_moves[index, 1] = out_moves[remaining, 1]
+    return -1
+
+
+@njit(cache=True)
+def sampled_playout_turn(turn: int, teams: np.array, alive: np.array, rewards: np.array,
+                         nodes: np.array, pieces: np.array, adjacency_list: np.array,
+                         patterns_offsets: np.array, pieces_offsets: np.array, tiles_offsets: np.array,
+                         out_moves: np.array, out_count: np.array, king_trace: np.array,
+                         history: np.array, history_index: int, promotion_zones: np.array,
+                         pieces_per_player: int) -> Tuple[int, bool, int]:
+    """ playout_turn choosing the move by rejection sampling. Also returns the index of the move in out_moves. """
+    if not alive[turn]:
+        return -1, False, -1
+
+    team = teams[turn]
+    index = sample_legal_move(team, nodes, pieces, adjacency_list, patterns_offsets, pieces_offsets,
+                              tiles_offsets, out_moves, out_count, king_trace, history, history_index,
+                              promotion_zones, pieces_per_player)
+    if index != -1:
+        return turn, False, index
+
+    # Every pseudo legal move was tried, so there are no legal moves: mate or stalemate
+    king_tile = get_king_tile(pieces, team)[2]
+    if is_in_check(team, king_tile, nodes, pieces, adjacency_list, patterns_offsets,
+                   pieces_offsets, tiles_offsets, king_trace):
+        alive[turn] = False
+        rewards[turn] = -1
+        return -1, False, -1
+
+    if count_alive(alive) > 2:
+        alive[turn] = False
+        rewards[turn] = -1
+        return -1, False, -1
+    return -1, True, -1
+
+
+@njit(cache=True, nogil=True)
+def random_playout(nodes: np.array, pieces: np.array, adjacency_list: np.array,
+                   patterns_offsets: np.array, pieces_offsets: np.array, tiles_offsets: np.array,
+                   promotion_zones: np.array, hasher: np.array, state_keys: np.array, teams: np.array, alive: np.array,
+                   rewards: np.array, turn: int, current_hash: np.uint64, history: np.array,
+                   moves_count: int, moves_without_capture: int, max_turns: int,
+                   max_moves_without_capture: int, hash_stack: np.array, stack_size: int,
+                   pieces_per_player: int = 16, seed: int = -1, rejection_sampling: bool = False) -> int:
+    """ Plays random legal moves until the game ends, without going back to python.
+    With rejection_sampling the move of each turn is found with sample_legal_move instead of generating
+    every legal move (same distribution of moves, much less work per move).
+
+    The board arrays (nodes, pieces, alive, rewards, history, hash_stack) are modified in place,
+    so the caller is expected to pass copies. current_hash is the hash of the game (with the keys of the
+    turn and the players alive) and hash_stack holds the hash of every position reached so far (one entry
+    per occurrence, as GameMatrices.positions_counter) in its first stack_size elements and must have room
+    for max_turns more. The final rewards are written into rewards (1 winner, -1 killed players, 0 draw).
+
+    Returns the number of moves of the finished game.
+    """
+    if seed >= 0:
+        np.random.seed(seed)
+
+    # The moves update the hash of the pieces, the keys of the turn and the players alive are added when needed
+    current_hash ^= state_key(turn, alive, state_keys)
+
+    number_of_players = teams.shape[0]
+    out_moves = np.empty((MAX_POSSIBLE_MOVES, 2), dtype=np.uint8)
+    out_hashes = np.empty(MAX_POSSIBLE_MOVES, dtype=np.uint64)
+    out_count = np.zeros(1, dtype=np.uint8)
+    king_trace = np.empty((MAX_POSSIBLE_MOVES, 2), dtype=np.uint8)
+
+    index = -1
+    if rejection_sampling:
+        player, draw, index = sampled_playout_turn(turn, teams, alive, rewards, nodes, pieces, adjacency_list,
+                                                   patterns_offsets, pieces_offsets, tiles_offsets, out_moves,
+                                                   out_count, king_trace, history, moves_count,
+                                                   promotion_zones, pieces_per_player)
+    else:
+        player, draw = playout_turn(turn, teams, alive, rewards, nodes, pieces, adjacency_list,
+                                    patterns_offsets, pieces_offsets, tiles_offsets, out_moves,
+                                    out_count, out_hashes, king_trace, history, moves_count,
+                                    promotion_zones, current_hash, hasher, pieces_per_player)
+    while True:
+        # Same checks and order as GameMatrices.is_finished
+        if draw or moves_count >= max_turns:
+            break
+
+        if count_alive(alive) == 1:
+            for i in range(number_of_players):
+                if alive[i]:
+                    rewards[i] = 1
+            break
+
+        position_hash = current_hash ^ state_key(turn, alive, state_keys)
+        if (is_dead_position(pieces)
+                or count_repetitions(hash_stack, stack_size, position_hash) >= 3
+                or moves_without_capture >= max_moves_without_capture):
+            break
+
+        if player != -1:
+            if rejection_sampling:
+                make_move(out_moves[index], nodes, pieces, history, moves_count, promotion_zones, True)
+                current_hash = update_hash(current_hash, history[moves_count], pieces, hasher)
+            else:
+                index = np.random.randint(out_count[0])
+                make_move(out_moves[index], nodes, pieces, history, moves_count, promotion_zones, True)
+                current_hash = out_hashes[index]
+
+            moves_without_capture += 1
+            captured_piece_index = history[moves_count, 3]
+            if captured_piece_index != -1:
+                moves_without_capture = 0
+                if pieces[captured_piece_index, 0] == 3: # If a king is a captured
+                    kill_team(pieces[captured_piece_index, 1], teams, alive, rewards)
+
+            hash_stack[stack_size] = current_hash ^ state_key(next_player(turn, alive), alive, state_keys)
+            stack_size += 1
+            moves_count += 1
+
+        turn = (turn + 1) % number_of_players
+        if rejection_sampling:
+            player, draw, index = sampled_playout_turn(turn, teams, alive, rewards, nodes, pieces, adjacency_list,
+                                                       patterns_offsets, pieces_offsets, tiles_offsets, out_moves,
+                                                       out_count, king_trace, history, moves_count,
+                                                       promotion_zones, pieces_per_player)
+        else:
+            player, draw = playout_turn(turn, teams, alive, rewards, nodes, pieces, adjacency_list,
+                                        patterns_offsets, pieces_offsets, tiles_offsets, out_moves,
+                                        out_count, out_hashes, king_trace, history, moves_count,
+                                        promotion_zones, current_hash, hasher, pieces_per_player)
+
+    return moves_count
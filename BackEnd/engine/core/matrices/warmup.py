@@ -0,0 +1,141 @@
+import os
+import time
+from typing import Dict, List, Tuple
+
+import numpy as np
+from numba.core.registry import CPUDispatcher
+
+from engine.ChessFactory import ChessFactory, BOARD_FILES, POSITIONS_PATH
+from engine.core.GameMatrices import GameMatrices
+from engine.core.matrices import chess_logic_bounds, attack_maps, playout, batch_moves, alpha_beta, multiplayer_search
+from engine.core.matrices.matrix_constants import MAX_POSSIBLE_MOVES
+from engine.agents import MCTSTree, MCTSWorkerPool
+from engine.utils import TranspositionTable, ZobristHasherMatrices
+from engine.agents.AlphaBeta import AlphaBeta
+from engine.agents.MultiplayerSearch import MultiplayerSearch
+
+
+# Compiling the kernels takes seconds, which is paid by the first game after a restart and by every new
+# worker process. warm_up compiles (or loads from the numba cache) every kernel signature used by the
+# engine before any game is played. Running this module populates the on disk cache ahead of time
+# (e.g. when building the server image): python -m engine.core.matrices.warmup
+# Workers share that cache as long as they use the same NUMBA_CACHE_DIR (default: the __pycache__ folders).
+
+KERNEL_MODULES = [chess_logic_bounds, attack_maps, playout, batch_moves, alpha_beta, multiplayer_search, MCTSTree,
+                  MCTSWorkerPool, TranspositionTable, ZobristHasherMatrices]
+
+
+def kernel_dispatchers() -> Dict[str, CPUDispatcher]:
+    kernels = {}
+    for module in KERNEL_MODULES:
+        for name, value in vars(module).items():
+            if isinstance(value, CPUDispatcher) and value.__module__ == module.__name__:
+                kernels[f'{module.__name__.split(".")[-1]}.{name}'] = value
+    return kernels
+
+
+def board_configs() -> List[Tuple[int, Tuple[int, int], str]]:
+    """ (players, size, game mode) of every starting position with a matrix board. """
+    configs = []
+    for f in sorted(os.listdir(POSITIONS_PATH)):
+        if not f.endswith('.yaml'):
+            continue
+        num_players, size, game_mode = f[:-5].split('_')
+        if os.path.exists(f'{BOARD_FILES}{size}_{game_mode}_LAYER.npz'):
+            configs.append((int(num_players), tuple(int(x) for x in size.split('x')), game_mode))
+    return configs
+
+
+def warm_up_board(num_players: int, size: Tuple[int, int], game_mode: str) -> None:
+    """ Calls every kernel the game loop, the searches and the tests use, on one board topology. """
+    game = ChessFactory.create_game(
+        player_data=ChessFactory.create_player_data(num_players=num_players),
+        program_mode='matrix',
+        game_mode=game_mode,
+        size=size,
+    )
+    game.verbose = 0
+    b = game.board
+    team = game.players[game.turn]['team']
+
+    moves, hashes = game.get_movements(include_hashes=True)
+    game.make_move(moves[0], precomputed_hash=hashes[0])
+    game.is_in_check(team)
+    game.undo_move()
+    game.make_move(moves[0], store=False)
+    game.undo_move(remove=False)
+    game.update_attack_maps()
+    game.random_playout(seed=0)
+    game.random_playout(seed=0, rejection_sampling=False)
+    GameMatrices.get_movements_batch([game])
+    if num_players == 2: 
+        AlphaBeta(game, max_depth=2, tt_bytes=1 << 16).choose_move()
+    else: 
+        for mode in ['paranoid', 'maxn']: 
+            MultiplayerSearch(game, mode=mode, max_depth=2, tt_bytes=1 << 16).choose_move()
+
+    # Pseudo legal generation + filter, still used as reference and by the older agents
+    out_moves = np.empty((MAX_POSSIBLE_MOVES, 2), dtype=np.uint8)
+    out_hashes = np.empty(MAX_POSSIBLE_MOVES, dtype=np.uint64)
+    count = np.zeros(1, dtype=np.uint8)
+    chess_logic_bounds.get_possible_moves(team, b.nodes, b.pieces, b.adjacency_list, b.patterns_offsets,
+                                          b.pieces_offsets, b.tiles_offsets, out_moves, count, b.pieces_per_player)
+    chess_logic_bounds.filter_legal_moves(team, b.nodes, b.pieces, b.adjacency_list, b.patterns_offsets,
+                                          b.pieces_offsets, b.tiles_offsets, out_moves, count, game.history,
+                                          game.moves_count, b.promotion_zones, game.hash, out_hashes, game.hasher.table)
+
+
+def warm_up_search() -> None: 
+    """ Calls the kernels of the MCTS trees, of the shared statistics table and of the transposition table
+    (they do not depend on the board). """
+    hashes = np.arange(1, 4, dtype=np.uint64)
+    moves = np.zeros((3, 2), dtype=np.uint8)
+
+    tree = MCTSTree.MCTSTree(capacity=4)
+    root = tree.get_node(-1, 0)
+    tree.expand(root, 0, moves, hashes)
+    tree.select(root, 1.4)
+    tree.backpropagate([tree.children(root)[0]], [1, -1])
+    tree.prune(root, 1)
+
+    stats = MCTSWorkerPool.SharedStats(max_nodes=4)
+    slot = stats.insert(0, hashes[0])
+    MCTSWorkerPool.select_node(stats.find(0, hashes), stats.visits, stats.wins, 1.4)
+    stats.backpropagate([slot], [1, -1], 1)
+    stats.evict(1)
+    stats.close()
+
+    table = TranspositionTable.TranspositionTable(max_bytes=1 << 12)
+    table.store(hashes[0], 1, TranspositionTable.EXACT, moves[0], [0])
+    table.probe(hashes[0])
+
+
+def warm_up(configs: List[Tuple[int, Tuple[int, int], str]] = None, verbose: int = 0) -> Dict:
+    """ Compiles the kernels for every board config (all the ones available by default).
+    Returns startup metrics: total time, and how many kernel signatures were loaded from the cache or compiled. """
+    configs = board_configs() if configs is None else configs
+    kernels = kernel_dispatchers()
+
+    start = time.perf_counter()
+    for config in configs:
+        warm_up_board(*config)
+    warm_up_search()
+    elapsed = time.perf_counter() - start
+
+    cache_hits = sum(sum(kernel.stats.cache_hits.values()) for kernel in kernels.values())
+    cache_misses = sum(sum(kernel.stats.cache_misses.values()) for kernel in kernels.values())
+    metrics = {
+        'time': elapsed,
+        'boards': len(configs),
+        'signatures': sum(len(kernel.signatures) for kernel in kernels.values()),
+        'cache_hits': cache_hits,
+        'compiled': cache_misses,
+    }
+    if verbose > 0:
+        print(f"Numba warm up: {metrics['signatures']} kernel signatures for {metrics['boards']} boards in "
+              f"{metrics['time']:.2f}s ({metrics['cache_hits']} loaded from cache, {metrics['compiled']} compiled)")
+    return metrics
+
+
+if __name__ == "__main__":
+    warm_up(verbose=1)
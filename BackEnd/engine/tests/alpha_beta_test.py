@@ -0,0 +1,82 @@
+import time
+
+from engine.ChessFactory import ChessFactory
+from engine.agents.AlphaBeta import AlphaBeta
+from engine.core.matrices.alpha_beta import MATE_SCORE, MATE_BOUND
+from engine.tests.legal_moves_test import get_positions
+
+
+def create_game(size, game_mode, initial_position=None, types=['human']):
+    game = ChessFactory.create_game(
+        player_data=ChessFactory.create_player_data(num_players=2, types=types),
+        program_mode='matrix',
+        game_mode=game_mode,
+        size=size,
+        initial_positions=initial_position,
+    )
+    game.verbose = 0
+    return game
+
+
+def play_mate(size, game_mode, initial_position, seconds):
+    """ When the search finds a mate, both sides play the search moves and the mate has to happen
+    in the number of plies announced. Returns the announced plies (None if no mate was found) and whether it held. """
+    game = create_game(size, game_mode, initial_position)
+    agent = AlphaBeta(game, time=seconds)
+    player = game.get_turn(auto_play_bots=False)
+    move = agent.choose_move()
+    if agent.score <= MATE_BOUND:
+        return None, True
+
+    plies = MATE_SCORE - agent.score
+    for _ in range(plies):
+        if move is None:
+            break
+        game.make_move(move)
+        game.next_turn()
+        game.get_turn(auto_play_bots=False)
+        if game.is_finished():
+            break
+        move = agent.choose_move()
+    return plies, game.is_finished() and game.winner() == player
+
+
+def play_games(size, game_mode, num_games, seconds):
+    """ AlphaBeta against the random bot. Returns the results of AlphaBeta and the longest move. """
+    results, max_move_time = [], 0.0
+    for i in range(num_games):
+        types = ['alphabeta', 'random'] if i % 2 == 0 else ['random', 'alphabeta']
+        game = create_game(size, game_mode, types=types)
+        agent = game.get_bot_engine(6)
+        agent.time = seconds
+        player = types.index('alphabeta')
+
+        while not game.is_finished():
+            start = time.perf_counter()
+            turn = game.get_turn()
+            if turn == player:
+                max_move_time = max(max_move_time, time.perf_counter() - start)
+            game.next_turn()
+        results.append(game.rewards[player])
+    return results, max_move_time
+
+
+def test(num_games=4, seconds=0.5):
+    all_mates = True
+    for name, num_players, size, game_mode, initial_position in get_positions():
+        if num_players != 2 or initial_position is None:
+            continue
+        plies, mated = play_mate(size, game_mode, initial_position, seconds=5)
+        all_mates &= mated
+        print(f'{name}: ' + ('no mate found' if plies is None else f'mate in {plies} plies {"played" if mated else "NOT played"}'))
+
+    for size, game_mode in [((8, 8), 'normal'), ((8, 8), 'wormhole'), ((6, 6), 'wormhole'), ((5, 5), 'normal')]:
+        results, max_move_time = play_games(size, game_mode, num_games, seconds)
+        print(f'2_{size[0]}x{size[1]}_{game_mode} vs random: {results.count(1)} wins, {results.count(0)} draws, '
+              f'{results.count(-1)} losses, longest move {max_move_time:.2f}s (limit {seconds}s)')
+
+    return all_mates
+
+
+if __name__ == "__main__":
+    test()
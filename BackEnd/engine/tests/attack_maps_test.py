@@ -0,0 +1,86 @@
+import numpy as np
+
+from engine.ChessFactory import ChessFactory
+from engine.tests.legal_moves_test import get_positions
+from engine.core.matrices.attack_maps import compute_attack_maps
+from engine.core.matrices.chess_logic_bounds import get_king_tile, is_in_check
+from engine.core.matrices.matrix_constants import MAX_POSSIBLE_MOVES
+
+
+def recomputed_attacks(game):
+    b = game.board
+    attacks = np.zeros_like(game.attacks)
+    compute_attack_maps(b.nodes, b.pieces, b.adjacency_list, b.patterns_offsets, b.pieces_offsets,
+                        b.tiles_offsets, attacks)
+    return attacks
+
+
+def traced_check(game, team):
+    """ Reference: is_in_check tracing the rays from the king. """
+    b = game.board
+    king_tile = get_king_tile(b.pieces, team)[2]
+    return is_in_check(team, king_tile, b.nodes, b.pieces, b.adjacency_list, b.patterns_offsets,
+                       b.pieces_offsets, b.tiles_offsets, np.empty((MAX_POSSIBLE_MOVES, 2), dtype=np.uint8))
+
+
+def check_random_games(num_players, size, game_mode, initial_position, num_games, rng):
+    positions, mismatches = 0, 0
+    for _ in range(num_games):
+        game = ChessFactory.create_game(
+            player_data=ChessFactory.create_player_data(num_players=num_players),
+            program_mode='matrix',
+            game_mode=game_mode,
+            size=size,
+            initial_positions=initial_position,
+        )
+        game.verbose = 0
+
+        player = game.get_turn(auto_play_bots=False)
+        while not game.is_finished():
+            if player == -1:
+                game.next_turn()
+                player = game.get_turn(auto_play_bots=False)
+                continue
+
+            positions += 1
+            if not np.array_equal(game.attacks, recomputed_attacks(game)):
+                mismatches += 1
+                print(f'Incremental attack maps differ at move {game.moves_count}')
+
+            for p in game.players[:game.number_of_players]:
+                if p['is_alive'] and game.is_in_check(p['team']) != traced_check(game, p['team']):
+                    mismatches += 1
+                    print(f'Check detection differs for team {p["team"]} at move {game.moves_count}')
+
+            # Every move has to leave the maps as they were when it is undone
+            moves = game.get_movements()
+            before = game.attacks.copy()
+            for move in moves:
+                game.make_move(move, store=False)
+                game.undo_move(remove=False)
+                if not np.array_equal(game.attacks, before):
+                    mismatches += 1
+                    print(f'Undo of {game.board.get_names(move)} does not restore the attack maps')
+                    break
+
+            game.make_move(moves[rng.integers(len(moves))])
+            game.next_turn()
+            player = game.get_turn(auto_play_bots=False)
+
+    return positions, mismatches
+
+
+def test(num_games=10):
+    rng = np.random.default_rng(0)
+    total_mismatches = 0
+    for name, num_players, size, game_mode, initial_position in get_positions():
+        positions, mismatches = check_random_games(num_players, size, game_mode, initial_position, num_games, rng)
+        total_mismatches += mismatches
+        print(f'{name}: {positions} positions, {mismatches} mismatches')
+
+    print(f'Total mismatches: {total_mismatches}')
+    assert total_mismatches == 0, f'{total_mismatches} mismatches'
+
+
+if __name__ == "__main__":
+    test()
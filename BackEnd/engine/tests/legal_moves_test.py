@@ -0,0 +1,111 @@
+import os
+import time
+import numpy as np
+
+from engine.ChessFactory import ChessFactory, BOARD_FILES, POSITIONS_PATH
+from engine.core.matrices.chess_logic_bounds import get_possible_moves, filter_legal_moves, generate_legal_moves
+from engine.core.matrices.matrix_constants import MAX_POSSIBLE_MOVES
+
+
+def filtered_moves(game, team):
+    """ Reference: pseudo legal moves filtered by playing each one and looking for checks. """
+    b = game.board
+    moves = np.empty((MAX_POSSIBLE_MOVES, 2), dtype=np.uint8)
+    hashes = np.empty(MAX_POSSIBLE_MOVES, dtype=np.uint64)
+    count = np.zeros(1, dtype=np.uint8)
+    get_possible_moves(team, b.nodes, b.pieces, b.adjacency_list, b.patterns_offsets, b.pieces_offsets,
+                       b.tiles_offsets, moves, count, b.pieces_per_player)
+    filter_legal_moves(team, b.nodes, b.pieces, b.adjacency_list, b.patterns_offsets, b.pieces_offsets,
+                       b.tiles_offsets, moves, count, game.history, game.moves_count, b.promotion_zones,
+                       game.hash, hashes, game.hasher.table)
+    return moves[:count[0]], hashes[:count[0]]
+
+
+def generated_moves(game, team):
+    b = game.board
+    moves = np.empty((MAX_POSSIBLE_MOVES, 2), dtype=np.uint8)
+    hashes = np.empty(MAX_POSSIBLE_MOVES, dtype=np.uint64)
+    count = np.zeros(1, dtype=np.uint8)
+    generate_legal_moves(team, b.nodes, b.pieces, b.adjacency_list, b.patterns_offsets, b.pieces_offsets,
+                         b.tiles_offsets, moves, count, game.history, game.moves_count, b.promotion_zones,
+                         game.hash, hashes, game.hasher.table, b.pieces_per_player)
+    return moves[:count[0]], hashes[:count[0]]
+
+
+def get_positions():
+    """ Every starting position (default and tests) with a board config available. """
+    positions = []
+    for folder in [POSITIONS_PATH, POSITIONS_PATH + 'tests/']:
+        for f in sorted(os.listdir(folder)):
+            if not f.endswith('.yaml'):
+                continue
+            name = f[:-5]
+            config, _, initial_position = name.partition('-')
+            num_players, size, game_mode = config.split('_')
+            if not os.path.exists(f'{BOARD_FILES}{size}_{game_mode}_LAYER.npz'):
+                continue
+            size = tuple(int(x) for x in size.split('x'))
+            positions.append((name, int(num_players), size, game_mode, initial_position or None))
+    return positions
+
+
+def compare_random_games(num_players, size, game_mode, initial_position, num_games, rng):
+    positions, mismatches = 0, 0
+    filter_time, generator_time = 0.0, 0.0
+    for _ in range(num_games):
+        game = ChessFactory.create_game(
+            player_data=ChessFactory.create_player_data(num_players=num_players),
+            program_mode='matrix',
+            game_mode=game_mode,
+            size=size,
+            initial_positions=initial_position,
+        )
+        game.verbose = 0
+
+        player = game.get_turn(auto_play_bots=False)
+        while not game.is_finished():
+            if player == -1:
+                game.next_turn()
+                player = game.get_turn(auto_play_bots=False)
+                continue
+
+            team = game.players[game.turn]['team']
+            start = time.time()
+            expected_moves, expected_hashes = filtered_moves(game, team)
+            filter_time += time.time() - start
+            start = time.time()
+            moves, hashes = generated_moves(game, team)
+            generator_time += time.time() - start
+
+            positions += 1
+            if not (np.array_equal(expected_moves, moves) and np.array_equal(expected_hashes, hashes)):
+                mismatches += 1
+                print(f'Mismatch at move {game.moves_count}:')
+                print(' - filter:   ', [game.board.get_names(m) for m in expected_moves])
+                print(' - generator:', [game.board.get_names(m) for m in moves])
+
+            moves = game.get_movements()
+            game.make_move(moves[rng.integers(len(moves))])
+            game.next_turn()
+            player = game.get_turn(auto_play_bots=False)
+
+    return positions, mismatches, filter_time, generator_time
+
+
+def test(num_games=20):
+    rng = np.random.default_rng(0)
+    total_mismatches = 0
+    for name, num_players, size, game_mode, initial_position in get_positions():
+        positions, mismatches, filter_time, generator_time = compare_random_games(
+            num_players, size, game_mode, initial_position, num_games, rng)
+        total_mismatches += mismatches
+
+        speedup = filter_time / generator_time if generator_time > 0 else 0
+        print(f'{name}: {positions} positions, {mismatches} mismatches, generator speedup x{speedup:.1f}')
+
+    print(f'Total mismatches: {total_mismatches}')
+    assert total_mismatches == 0, f'{total_mismatches} mismatches'
+
+
+if __name__ == "__main__":
+    test()
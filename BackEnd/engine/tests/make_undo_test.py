@@ -0,0 +1,103 @@
+import numpy as np
+
+from engine.ChessFactory import ChessFactory
+from engine.tests.legal_moves_test import get_positions
+
+
+def game_state(game):
+    """ Everything make_move + undo_move has to give back. """
+    return (
+        game.board.nodes.copy(),
+        game.board.pieces.copy(),
+        game.attacks.copy(),
+        game.players.copy(),
+        game.history[:game.moves_count].copy(),
+        game.rewards.copy(),
+        game.positions_counter.copy(),
+        game.turn,
+        game.hash,
+        game.moves_count,
+        game.moves_without_capture,
+        game.killed_player,
+        game.game_state,
+    )
+
+
+def same_state(state, other):
+    return all(
+        np.array_equal(a, b) if isinstance(a, np.ndarray) else a == b
+        for a, b in zip(state, other)
+    )
+
+
+def play_move(game, rng, representation=None, saved=None):
+    """ Makes a random move and moves on to the next player that can move, as a game would.
+    Returns the movement, after updating the representation if one is given. """
+    moves = game.get_movements()
+    movement = game.make_move(moves[rng.integers(len(moves))])
+    if representation is not None:
+        representation.update_board(movement, saved)
+    game.next_turn()
+    player = game.get_turn(auto_play_bots=False)
+    while player == -1 and not game.is_finished():
+        game.next_turn()
+        player = game.get_turn(auto_play_bots=False)
+    return movement
+
+
+def check_random_games(num_players, size, game_mode, initial_position, num_games, max_depth, rng):
+    sequences, mismatches = 0, 0
+    for _ in range(num_games):
+        game = ChessFactory.create_game(
+            player_data=ChessFactory.create_player_data(num_players=num_players),
+            program_mode='matrix',
+            game_mode=game_mode,
+            size=size,
+            initial_positions=initial_position,
+        )
+        game.verbose = 0
+        representation = game.representation
+        saved = np.empty((max_depth, 2, representation.nodes.shape[1]), dtype=representation.nodes.dtype)
+
+        player = game.get_turn(auto_play_bots=False)
+        while player == -1 and not game.is_finished():
+            game.next_turn()
+            player = game.get_turn(auto_play_bots=False)
+
+        while not game.is_finished():
+            # Play a random sequence of moves from this position and undo all of them
+            state = game_state(game)
+            nodes = representation.nodes.copy()
+            movements = []
+            while len(movements) < max_depth and not game.is_finished():
+                movements.append(play_move(game, rng, representation, saved[len(movements)]))
+            depth = len(movements)
+            while movements:
+                game.undo_move()
+                representation.undo_update(movements.pop(), saved[len(movements)])
+
+            sequences += 1
+            if not same_state(state, game_state(game)) or not np.array_equal(nodes, representation.nodes):
+                mismatches += 1
+                print(f'State not restored after undoing {depth} moves from move {game.moves_count}')
+
+            play_move(game, rng, representation)
+
+    return sequences, mismatches
+
+
+def test(num_games=10, max_depth=8):
+    rng = np.random.default_rng(0)
+    total_mismatches = 0
+    for name, num_players, size, game_mode, initial_position in get_positions():
+        sequences, mismatches = check_random_games(
+            num_players, size, game_mode, initial_position, num_games, max_depth, rng)
+        total_mismatches += mismatches
+        print(f'{name}: {sequences} make/undo sequences, {mismatches} mismatches')
+
+    print(f'Total mismatches: {total_mismatches}')
+    assert total_mismatches == 0, f'{total_mismatches} mismatches'
+
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,97 @@
+import time
+
+import numpy as np
+
+from engine.ChessFactory import ChessFactory
+from engine.utils.MoveCache import MoveCache
+from engine.tests.legal_moves_test import get_positions
+from engine.tests.make_undo_test import play_move
+
+
+def create_game(num_players, size, game_mode, initial_position=None, move_cache=None):
+    game = ChessFactory.create_game(
+        player_data=ChessFactory.create_player_data(num_players=num_players),
+        program_mode='matrix',
+        game_mode=game_mode,
+        size=size,
+        initial_positions=initial_position,
+        move_cache=move_cache,
+    )
+    game.verbose = 0
+    return game
+
+
+def same_moves(moves, hashes, other_moves, other_hashes):
+    """ Same moves and child hashes, in any order. """
+    return (sorted(zip(map(tuple, moves.tolist()), hashes.tolist()))
+            == sorted(zip(map(tuple, other_moves.tolist()), other_hashes.tolist())))
+
+
+def check_random_games(num_players, size, game_mode, initial_position, num_games, max_depth, rng):
+    """ Plays random sequences of moves and undoes them (so positions are visited again) on a game with a small
+    cache, checking its moves against the ones generated. Returns the positions checked and the mismatches. """
+    cache = MoveCache(max_entries=64)
+    positions, mismatches = 0, 0
+    for _ in range(num_games):
+        game = create_game(num_players, size, game_mode, initial_position, cache)
+        reference = create_game(num_players, size, game_mode, initial_position)
+
+        while not game.is_finished():
+            depth = 0
+            while depth < max_depth and not game.is_finished():
+                if game.get_turn(auto_play_bots=False) == -1:
+                    break
+                positions += 1
+                moves, hashes = game.get_movements(include_hashes=True)
+                reference.restore(game.snapshot())
+                if not same_moves(moves, hashes, *reference.get_movements(include_hashes=True)):
+                    mismatches += 1
+                    print(f'Cached moves differ at move {game.moves_count}')
+                play_move(game, rng)
+                depth += 1
+            for _ in range(depth - 1):
+                game.undo_move()
+            if depth == 0:
+                game.next_turn()
+    return positions, mismatches, cache.stats()
+
+
+def mcts_statistics(num_players, size, game_mode, simulations):
+    """ Simulations per second of MonteCarlo from the starting position with and without the cache. """
+    results = {}
+    for use_cache in [False, True]:
+        cache = MoveCache() if use_cache else None
+        game = create_game(num_players, size, game_mode, move_cache=cache)
+        agent = game.get_bot_engine(2)
+        agent.simulations_per_move = simulations
+        game.get_turn(auto_play_bots=False)
+        agent.prepare_search(game.copy())
+        start = time.perf_counter()
+        agent.search()
+        results[use_cache] = (simulations / (time.perf_counter() - start), cache.stats() if cache else None)
+    return results
+
+
+def test(num_games=3, max_depth=6, simulations=2000):
+    rng = np.random.default_rng(0)
+    total_mismatches = 0
+    for name, num_players, size, game_mode, initial_position in get_positions():
+        positions, mismatches, stats = check_random_games(num_players, size, game_mode, initial_position,
+                                                          num_games, max_depth, rng)
+        total_mismatches += mismatches
+        print(f'{name}: {positions} positions, {mismatches} mismatches, hit rate {stats["hit_rate"]:.2f}, '
+              f'{stats["evictions"]} evictions')
+    print(f'Total mismatches: {total_mismatches}')
+
+    for num_players, size, game_mode in [(2, (8, 8), 'wormhole'), (4, (8, 8), 'wormhole')]:
+        results = mcts_statistics(num_players, size, game_mode, simulations)
+        stats = results[True][1]
+        print(f'{num_players}_{size[0]}x{size[1]}_{game_mode} MCTS, {simulations} simulations: '
+              f'{results[False][0]:.0f} simulations/s without the cache, {results[True][0]:.0f} with it '
+              f'(hit rate {stats["hit_rate"]:.2f}, {stats["hits"]} move generations saved, '
+              f'{stats["entries"]} entries, {stats["bytes"] / 2 ** 20:.1f} MB)')
+    assert total_mismatches == 0, f'{total_mismatches} mismatches'
+
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,50 @@
+import time
+
+import numpy as np
+
+from engine.ChessFactory import ChessFactory
+
+
+def play_games(size, mode, num_games, seconds):
+    """ One search bot against 3 random bots, in a different seat each game.
+    Returns the rewards of the search bot, the plies it survived and its longest move. """
+    results, survived, max_move_time = [], [], 0.0
+    for i in range(num_games):
+        player = i % 4
+        types = ['random'] * 4
+        types[player] = mode
+        game = ChessFactory.create_game(
+            player_data=ChessFactory.create_player_data(num_players=4, types=types),
+            program_mode='matrix',
+            game_mode='wormhole',
+            size=size,
+        )
+        game.verbose = 0
+        agent = game.get_bot_engine(7 if mode == 'paranoid' else 8)
+        agent.time = seconds
+
+        death = None
+        while not game.is_finished():
+            start = time.perf_counter()
+            turn = game.get_turn()
+            if turn == player:
+                max_move_time = max(max_move_time, time.perf_counter() - start)
+            if death is None and not game.players[player]['is_alive']:
+                death = game.moves_count
+            game.next_turn()
+        results.append(int(game.rewards[player]))
+        survived.append(game.moves_count if death is None else death)
+    return results, survived, max_move_time
+
+
+def test(num_games=4, seconds=0.3):
+    for size in [(8, 8), (6, 6)]:
+        for mode in ['paranoid', 'maxn']:
+            results, survived, max_move_time = play_games(size, mode, num_games, seconds)
+            print(f'4_{size[0]}x{size[1]}_wormhole {mode} vs 3 random: {results.count(1)} wins, '
+                  f'{results.count(0)} draws, {results.count(-1)} losses, survived {np.mean(survived):.0f} plies '
+                  f'on average, longest move {max_move_time:.2f}s (limit {seconds}s)')
+
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,80 @@
+from engine.ChessFactory import ChessFactory
+from engine.agents.AlphaZero import AlphaZero
+from engine.tests.make_undo_test import game_state, same_state
+
+import numpy as np
+import torch
+import time
+
+
+def create_game(size, game_mode):
+    game = ChessFactory.create_game(
+        player_data=ChessFactory.create_player_data(num_players=2, types=['human'] * 2),
+        program_mode='matrix',
+        game_mode=game_mode,
+        size=size,
+    )
+    game.verbose = 0
+    return game
+
+
+def same_evaluation(game, batch_size):
+    """ The priors and values of a batch are the ones of its positions evaluated one by one. """
+    agent = AlphaZero(game, game.representation, batch_size=batch_size)
+    agent.allocate(game, game.representation)
+    rng = np.random.default_rng(0)
+    for i in range(batch_size):
+        copy, representation = game.copy(), game.representation.copy()
+        for _ in range(int(rng.integers(0, 6))):
+            moves = copy.get_movements()
+            representation.update_board(copy.make_move(moves[rng.integers(len(moves))]))
+            copy.next_turn()
+        moves = copy.get_movements()
+        agent.players[i] = copy.get_turn(auto_play_bots=False)
+        agent.states[i] = representation.nodes
+        agent.moves[i, :len(moves)] = moves
+        agent.counts[i] = len(moves)
+
+    buffers = agent.states, agent.players, agent.moves, agent.counts
+    priors, values = agent.evaluate(*buffers)
+    for i in range(batch_size):
+        prior, value = agent.evaluate(*(buffer[i:i + 1] for buffer in buffers))
+        if not (np.allclose(value, values[i], atol=1e-5)
+                and np.allclose(prior[0, :agent.counts[i]], priors[i, :agent.counts[i]], atol=1e-5)):
+            return False
+    return True
+
+
+def search_unwinds(game, batch_size, simulations):
+    """ After the search, the game and the representation it plays the moves on are back at the root. """
+    agent = AlphaZero(game, game.representation, batch_size=batch_size)
+    copy, representation = game.copy(), game.representation.copy()
+    agent.allocate(copy, representation)
+    state = game_state(copy)
+    N, W, Q, P = {}, {}, {}, {}
+    for _ in range(simulations // batch_size):
+        agent.run_batch(copy, representation, N, W, Q, P, batch_size)
+    return same_state(state, game_state(copy)) and np.array_equal(representation.nodes, game.representation.nodes)
+
+
+def simulations_per_second(game, batch_size, simulations):
+    agent = AlphaZero(game, game.representation, mcts_simulations=simulations, batch_size=batch_size, use_cache=False)
+    start = time.time()
+    agent.choose_move()
+    return simulations / (time.time() - start)
+
+
+def test(simulations=1500):
+    torch.set_num_threads(1)
+    for size, game_mode in [((6, 6), 'wormhole'), ((8, 8), 'wormhole')]:
+        game = create_game(size, game_mode)
+        AlphaZero(game, game.representation, mcts_simulations=8).choose_move() # Load the network
+        print(f'{size[0]}x{size[1]}_{game_mode}: batched evaluation equals single evaluations: '
+              f'{same_evaluation(game, 16)}, the search goes back to the root: {search_unwinds(game, 8, 200)}')
+        for batch_size in [1, 8, 32, 64]:
+            rate = simulations_per_second(game, batch_size, simulations)
+            print(f'    Batch size {batch_size}: {rate:.0f} simulations/s')
+
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,65 @@
+from engine.ChessFactory import ChessFactory
+from engine.core.GameMatrices import GameMatrices
+
+import numpy as np
+import time
+
+
+def random_games(num_games, num_players, game_mode, size, rng):
+    """ Games played a random number of moves, so that every board of the batch is different. """
+    games = []
+    for _ in range(num_games):
+        game = ChessFactory.create_game(
+            player_data=ChessFactory.create_player_data(num_players=num_players),
+            program_mode="matrix",
+            game_mode=game_mode,
+            size=size
+        )
+        game.verbose = 0
+        for _ in range(rng.integers(0, 40)):
+            player = game.get_turn(auto_play_bots=False)
+            if game.is_finished():
+                break
+            if player != -1:
+                moves = game.get_movements()
+                game.make_move(moves[rng.integers(len(moves))])
+            game.next_turn()
+        games.append(game)
+    return games
+
+
+def test():
+    num_games = 512
+    num_tests = 20
+    rng = np.random.default_rng(0)
+
+    for num_players, game_mode, size in [(2, 'wormhole', (8, 8)), (4, 'wormhole', (8, 8)), (2, 'normal', (8, 8))]:
+        games = random_games(num_games, num_players, game_mode, size, rng)
+
+        # Same moves and hashes as generating them one game at a time
+        batch = GameMatrices.get_movements_batch(games, include_hashes=True)
+        mismatches = 0
+        for game, (moves, hashes) in zip(games, batch):
+            game._recalculate = True
+            expected_moves, expected_hashes = game.get_movements(include_hashes=True)
+            if not (np.array_equal(moves, expected_moves) and np.array_equal(hashes, expected_hashes)):
+                mismatches += 1
+
+        start = time.time()
+        for _ in range(num_tests):
+            for game in games:
+                game._recalculate = True
+                game.get_movements()
+        sequential_time = (time.time() - start) / num_tests
+
+        start = time.time()
+        for _ in range(num_tests):
+            GameMatrices.get_movements_batch(games)
+        batch_time = (time.time() - start) / num_tests
+
+        print(f'{num_players} players {size[0]}x{size[1]} {game_mode}: {num_games} boards, {mismatches} mismatches')
+        print(f' - One game at a time: {sequential_time:.6f} seconds')
+        print(f' - Batched:            {batch_time:.6f} seconds (x{sequential_time / batch_time:.1f})')
+
+
+test()
@@ -0,0 +1,41 @@
+import subprocess
+import sys
+
+
+# Every import is measured in a new interpreter, as a server or a worker process would do it. 
+MODULES = [
+    'engine.ChessFactory',
+    'engine.core.GameMatrices',
+    'engine.agents.MonteCarloParallel',
+    'engine.agents.AlphaZero',
+]
+HEAVY_MODULES = ['torch', 'torch_geometric', 'matplotlib']
+
+CODE = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed, ','.join(m for m in {heavy} if m in sys.modules))
+"""
+
+
+def import_time(module, repeats=3):
+    times = []
+    for _ in range(repeats):
+        result = subprocess.run(
+            [sys.executable, '-c', CODE.format(module=module, heavy=HEAVY_MODULES)],
+            capture_output=True, text=True, check=True
+        )
+        elapsed, loaded = result.stdout.strip().splitlines()[-1].partition(' ')[::2]
+        times.append(float(elapsed))
+    return min(times), loaded
+
+
+def test():
+    for module in MODULES:
+        elapsed, loaded = import_time(module)
+        print(f'{module}: {elapsed:.3f} seconds, heavy modules loaded: {loaded or "none"}')
+
+
+test()
@@ -0,0 +1,52 @@
+from engine.ChessFactory import ChessFactory
+from engine.agents.AlphaZero import AlphaZero
+from engine.utils.InferenceCache import InferenceCache
+
+import torch
+import time
+
+
+def play(size, game_mode, num_moves, simulations, use_cache):
+    """ Plays the first num_moves moves with AlphaZero on both sides (one search, sequential, so the moves do not
+    depend on the cache). Returns the moves, the time of every search and the statistics of the cache. """
+    game = ChessFactory.create_game(
+        player_data=ChessFactory.create_player_data(num_players=2, types=['human'] * 2),
+        program_mode='matrix',
+        game_mode=game_mode,
+        size=size,
+    )
+    game.verbose = 0
+    representation = game.representation
+    agent = AlphaZero(game, representation, mcts_simulations=simulations, batch_size=1, use_cache=use_cache)
+    cache = InferenceCache.for_network(agent.network)
+    cache.clear()
+
+    moves, times = [], []
+    while len(moves) < num_moves and not game.is_finished():
+        if game.get_turn(auto_play_bots=False) == -1:
+            game.next_turn()
+            continue
+        start = time.time()
+        move = agent.choose_move()
+        times.append(time.time() - start)
+        moves.append(tuple(move))
+        representation.update_board(game.make_move(move))
+        game.next_turn()
+    return moves, times, cache.stats()
+
+
+def test(num_moves=10, simulations=400):
+    torch.set_num_threads(1)
+    for size, game_mode in [((6, 6), 'wormhole'), ((8, 8), 'wormhole')]:
+        play(size, game_mode, 1, 8, False) # Load the network
+        moves, times, _ = play(size, game_mode, num_moves, simulations, False)
+        cached_moves, cached_times, stats = play(size, game_mode, num_moves, simulations, True)
+        print(f'{size[0]}x{size[1]}_{game_mode}, {simulations} simulations per move: same moves {moves == cached_moves}')
+        print(f'    Without the cache: {sum(times) / len(times):.2f}s per move')
+        print(f'    With the cache: {sum(cached_times) / len(cached_times):.2f}s per move, from the second move '
+              f'{sum(cached_times[1:]) / (len(cached_times) - 1):.2f}s, hit rate {stats["hit_rate"]:.2f}, '
+              f'{stats["entries"]} entries, {stats["bytes"] / 2 ** 20:.1f} MB')
+
+
+if __name__ == "__main__":
+    test()
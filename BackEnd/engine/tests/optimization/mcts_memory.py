@@ -0,0 +1,48 @@
+from engine.ChessFactory import ChessFactory
+from engine.agents.MonteCarlo import MonteCarlo
+
+import contextlib
+import io
+import time
+
+
+def test(num_turns=120, simulations=300, max_nodes=20000):
+    game = ChessFactory.create_game(
+        player_data=ChessFactory.create_player_data(num_players=4, types=['human']),
+        program_mode='matrix',
+        game_mode='wormhole',
+        size=(8, 8),
+    )
+    game.verbose = 0
+    agent = MonteCarlo(game, simulations_per_move=simulations, max_nodes=max_nodes)
+    tree = agent.tree
+
+    created, reused = 0, 0
+    sizes = []
+    start = time.time()
+    for turn in range(num_turns):
+        player = game.get_turn(auto_play_bots=False)
+        if game.is_finished():
+            break
+        if player != -1:
+            with contextlib.redirect_stdout(io.StringIO()):
+                agent.prepare_search(game.copy())
+                reused += tree.visits[agent.root_node] > 0
+                nodes_before = len(tree)
+                move = agent.choose_move()
+            created += len(tree) - nodes_before # Nodes added by the search (what the dictionaries kept forever)
+            game.make_move(move)
+            sizes.append((len(tree), tree.nbytes))
+        game.next_turn()
+
+        if (turn + 1) % 20 == 0:
+            nodes, nbytes = sizes[-1]
+            print(f'Turn {turn + 1}: {nodes} nodes, {nbytes / 1e6:.2f} MB (nodes created so far: {created})')
+
+    peak_nodes = max(n for n, _ in sizes)
+    peak_bytes = max(b for _, b in sizes)
+    print(f'{len(sizes)} searches in {time.time() - start:.1f}s, root statistics reused in {reused} of them')
+    print(f'Peak tree: {peak_nodes} nodes, {peak_bytes / 1e6:.2f} MB (limit {max_nodes} nodes)')
+
+
+test()
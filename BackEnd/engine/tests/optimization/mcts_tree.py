@@ -0,0 +1,67 @@
+from engine.agents.MCTSTree import MCTSTree
+
+from math import log, sqrt
+from pympler import asizeof
+import numpy as np
+import random
+import time
+
+
+def dict_select(plays, wins, player, moves_states, C):
+    """ Selection as MonteCarlo did it with the (player, hash) dictionaries. """
+    if all(plays.get((player, S), 0) > 0 for _, S in moves_states):
+        log_total = log(sum(plays[(player, S)] for move, S in moves_states))
+        return max(
+            (
+                ((wins[(player, S)] / plays[(player, S)]) +
+                C * sqrt(log_total / plays[(player, S)]), move, S)
+                for move, S in moves_states
+            ),
+            key=lambda x: x[0]
+        )[1]
+    return random.choice(moves_states)[0]
+
+
+def test():
+    num_nodes = 30000
+    num_children = 35
+    num_tests = 20000
+    rng = np.random.default_rng(0)
+
+    # Same statistics in both structures: num_nodes / num_children positions with all their children visited
+    tree = MCTSTree()
+    plays, wins = {}, {}
+    parents = []
+    for _ in range(num_nodes // num_children):
+        parent = tree.get_node(0, int(rng.integers(1 << 62)))
+        tree.in_tree[parent] = True
+        moves = rng.integers(0, 96, size=(num_children, 2)).astype(np.uint8)
+        hashes = rng.integers(1 << 62, size=num_children).astype(np.uint64)
+        tree.expand(parent, 1, moves, hashes)
+        for child, S in zip(tree.children(parent), hashes):
+            n, w = int(rng.integers(1, 100)), int(rng.integers(-50, 50))
+            tree.in_tree[child] = True
+            tree.visits[child], tree.wins[child] = n, w
+            plays[(1, S)], wins[(1, S)] = n, w
+        parents.append((parent, list(zip(moves, hashes))))
+    tree.select(parents[0][0], 1.4) # Compile
+
+    start = time.time()
+    for i in range(num_tests):
+        _, moves_states = parents[i % len(parents)]
+        dict_select(plays, wins, 1, moves_states, 1.4)
+    dict_time = (time.time() - start) / num_tests
+
+    start = time.time()
+    for i in range(num_tests):
+        parent, _ = parents[i % len(parents)]
+        tree.select(parent, 1.4)
+    tree_time = (time.time() - start) / num_tests
+
+    dict_bytes = (asizeof.asizeof(plays) + asizeof.asizeof(wins)) / len(plays)
+    tree_bytes = tree.nbytes / tree.num_nodes
+    print(f'Selection among {num_children} moves: {dict_time * 1e6:.1f} us (dicts) vs {tree_time * 1e6:.1f} us (tree)')
+    print(f'Memory per node: {dict_bytes:.0f} bytes (dicts) vs {tree_bytes:.0f} bytes (tree)')
+
+
+test()
@@ -0,0 +1,57 @@
+from engine.ChessFactory import ChessFactory
+
+import random
+import time
+
+
+def python_playout(game):
+    player = game.get_turn(auto_play_bots=False)
+    while not game.is_finished():
+        if player == -1:
+            game.next_turn()
+            player = game.get_turn(auto_play_bots=False)
+            continue
+        moves, hashes = game.get_movements(include_hashes=True)
+        i = random.randrange(len(moves))
+        game.make_move(moves[i], precomputed_hash=hashes[i])
+        game.next_turn()
+        player = game.get_turn(auto_play_bots=False)
+    return game.rewards
+
+
+def test():
+    num_tests = 200
+
+    for num_players, game_mode, size in [(2, 'wormhole', (8, 8)), (4, 'wormhole', (8, 8)), (2, 'normal', (8, 8))]:
+        game = ChessFactory.create_game(
+            player_data=ChessFactory.create_player_data(num_players=num_players),
+            program_mode="matrix",
+            game_mode=game_mode,
+            size=size
+        )
+        game.verbose = 0
+        game.random_playout() # Compile
+        game.random_playout(rejection_sampling=False)
+
+        start = time.time()
+        for _ in range(num_tests):
+            python_playout(game.copy())
+        python_time = (time.time() - start) / num_tests
+
+        start = time.time()
+        for _ in range(num_tests):
+            game.random_playout(rejection_sampling=False)
+        compiled_time = (time.time() - start) / num_tests
+
+        start = time.time()
+        for _ in range(num_tests):
+            game.random_playout()
+        sampled_time = (time.time() - start) / num_tests
+
+        print(f'{num_players} players {size[0]}x{size[1]} {game_mode}')
+        print(f' - Python playout:   {python_time:.6f} seconds ({1 / python_time:.1f} playouts/s)')
+        print(f' - Compiled playout: {compiled_time:.6f} seconds ({1 / compiled_time:.1f} playouts/s)')
+        print(f' - Compiled playout, rejection sampling: {sampled_time:.6f} seconds ({1 / sampled_time:.1f} playouts/s)')
+
+
+test()
@@ -0,0 +1,106 @@
+from engine.ChessFactory import ChessFactory
+from engine.agents.alpha_zero_training.GNNetwork import AlphaZeroGNN
+from engine.core.matrices.matrix_constants import MAX_POSSIBLE_MOVES
+
+import numpy as np
+import torch
+import time
+
+
+class LoopPolicyGNN(AlphaZeroGNN):
+    """ Policy head as AlphaZeroGNN computed it, one graph of the batch at a time. """
+    def policy_logits(self, x, move_index, batch):
+        if move_index.dim() == 2:
+            move_index = move_index.unsqueeze(0)
+        B, M, _ = move_index.shape
+        num_nodes = x.size(0) // B
+
+        policy_logits_per_graph = []
+        for i in range(B):
+            moves_i = move_index[i]
+            valid_i = ~(moves_i == -1).any(dim=1)
+
+            src = moves_i[valid_i, 0] + i * num_nodes
+            tgt = moves_i[valid_i, 1] + i * num_nodes
+
+            edge_feat = torch.cat([x[src], x[tgt]], dim=1)
+            logits_i = self.policy_edge_mlp(edge_feat).squeeze(-1)
+
+            full_logits = torch.full((M,), -1e9, device=x.device)
+            full_logits[valid_i] = logits_i
+            policy_logits_per_graph.append(full_logits)
+        return torch.stack(policy_logits_per_graph, dim=0)
+
+
+def random_batch(game, batch_size, rng):
+    """ Positions of random games: node features, legal moves (as indices in their board, padded with -1) and player. """
+    representation = game.representation
+    states = np.empty((batch_size, *representation.nodes.shape), dtype=np.float32)
+    moves = np.full((batch_size, MAX_POSSIBLE_MOVES, 2), -1, dtype=np.int64)
+    players = np.empty(batch_size, dtype=np.int64)
+    for i in range(batch_size):
+        copy, copy_representation = game.copy(), representation.copy()
+        for _ in range(int(rng.integers(0, 10))):
+            legal = copy.get_movements()
+            copy_representation.update_board(copy.make_move(legal[rng.integers(len(legal))]))
+            copy.next_turn()
+        legal = copy.get_movements()
+        states[i] = copy_representation.nodes
+        moves[i, :len(legal)] = legal.astype(np.int64)
+        players[i] = copy.get_turn(auto_play_bots=False)
+    data = representation.batch_to_pyg_data(states, 'cpu')
+    return dict(x=data.x, edge_index=data.edge_index, batch=data.batch,
+                move_index=torch.from_numpy(moves), player=torch.from_numpy(players))
+
+
+def time_network(network, inputs, backward, num_calls):
+    start = time.time()
+    for _ in range(num_calls):
+        if backward:
+            policy, value = network(**inputs)
+            (torch.log_softmax(policy, dim=1).mean() + value.mean()).backward()
+        else:
+            with torch.no_grad():
+                network(**inputs)
+    return (time.time() - start) / num_calls * 1000
+
+
+def test(num_calls=20):
+    torch.manual_seed(0)
+    rng = np.random.default_rng(0)
+    network = AlphaZeroGNN(13, 256)
+    loop_network = LoopPolicyGNN(13, 256)
+
+    game = ChessFactory.create_game(
+        player_data=ChessFactory.create_player_data(num_players=2, types=['human'] * 2),
+        program_mode='matrix',
+        game_mode='wormhole',
+        size=(8, 8),
+    )
+    game.verbose = 0
+
+    for batch_size in [1, 8, 32, 64]:
+        inputs = random_batch(game, batch_size, rng)
+        # The training passes change the statistics of the batch normalization (after dropout, different in each)
+        loop_network.load_state_dict(network.state_dict())
+
+        network.eval(), loop_network.eval()
+        with torch.no_grad():
+            policy, value = network(**inputs)
+            loop_policy, loop_value = loop_network(**inputs)
+        difference = max((policy - loop_policy).abs().max().item(), (value - loop_value).abs().max().item())
+
+        # Training needs more than one board (batch normalization of the value head)
+        times = []
+        for backward in [False, True] if batch_size > 1 else [False]:
+            for net in [loop_network, network]:
+                net.train(backward)
+                times.append(time_network(net, inputs, backward, num_calls))
+        text = f'Batch size {batch_size}: largest difference {difference:.1e}, forward {times[0]:.1f}ms before, {times[1]:.1f}ms now'
+        if batch_size > 1:
+            text += f', forward + backward {times[2]:.1f}ms before, {times[3]:.1f}ms now'
+        print(text)
+
+
+if __name__ == "__main__":
+    test()
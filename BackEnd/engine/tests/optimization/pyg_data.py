@@ -0,0 +1,66 @@
+from engine.ChessFactory import ChessFactory
+
+import numpy as np
+import torch
+import time
+from torch_geometric.data import Data, Batch
+
+
+def old_to_pyg_data(representation, device):
+    """ As to_pyg_data did it, building both tensors on every call. """
+    x = torch.tensor(representation.nodes, dtype=torch.float32, device=device)
+    edge_index = torch.tensor(representation.edges, dtype=torch.long, device=device)
+    return Data(x=x, edge_index=edge_index)
+
+
+def old_batch_to_pyg_data(representation, graph_list, device):
+    """ As batch_to_pyg_data did it, with Batch.from_data_list. """
+    edge_index = torch.tensor(representation.edges, dtype=torch.long, device=device)
+    return Batch.from_data_list([Data(x=graph, edge_index=edge_index) for graph in graph_list])
+
+
+def time_calls(function, num_calls):
+    start = time.time()
+    for _ in range(num_calls):
+        function()
+    return (time.time() - start) / num_calls * 1e6
+
+
+def test(num_calls=2000, device=torch.device('cpu')):
+    rng = np.random.default_rng(0)
+    for size, game_mode in [((6, 6), 'wormhole'), ((8, 8), 'wormhole'), ((8, 8), 'normal')]:
+        game = ChessFactory.create_game(
+            player_data=ChessFactory.create_player_data(num_players=2, types=['human'] * 2),
+            program_mode='matrix',
+            game_mode=game_mode,
+            size=size,
+        )
+        game.verbose = 0
+        representation = game.representation
+
+        # The features follow update_board without building the data again
+        data = representation.to_pyg_data(device)
+        moves = game.get_movements()
+        representation.update_board(game.make_move(moves[rng.integers(len(moves))]))
+        old = old_to_pyg_data(representation, device)
+        same = torch.equal(data.x, old.x) and torch.equal(data.edge_index, old.edge_index)
+
+        for batch_size in [8, 64]:
+            states = torch.tensor(rng.integers(0, 2, size=(batch_size, *representation.nodes.shape)), dtype=torch.float32)
+            batch = representation.batch_to_pyg_data(states, device)
+            old = old_batch_to_pyg_data(representation, states, device)
+            same = same and all(torch.equal(batch[key], old[key]) for key in ['x', 'edge_index', 'batch'])
+
+        print(f'{size[0]}x{size[1]}_{game_mode}: same data {same}')
+        old_time = time_calls(lambda: old_to_pyg_data(representation, device), num_calls)
+        new_time = time_calls(lambda: representation.to_pyg_data(device), num_calls)
+        print(f'    to_pyg_data: {old_time:.1f}us before, {new_time:.1f}us now')
+        for batch_size in [8, 64]:
+            states = torch.zeros((batch_size, *representation.nodes.shape))
+            old_time = time_calls(lambda: old_batch_to_pyg_data(representation, states, device), num_calls // 10)
+            new_time = time_calls(lambda: representation.batch_to_pyg_data(states, device), num_calls // 10)
+            print(f'    batch_to_pyg_data, {batch_size} boards: {old_time:.1f}us before, {new_time:.1f}us now')
+
+
+if __name__ == "__main__":
+    test()
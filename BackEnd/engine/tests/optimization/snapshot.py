@@ -0,0 +1,75 @@
+from engine.ChessFactory import ChessFactory
+
+import numpy as np
+import random
+import time
+
+
+def play_random_moves(game, num_moves):
+    for _ in range(num_moves):
+        player = game.get_turn(auto_play_bots=False)
+        if game.is_finished():
+            return
+        if player != -1:
+            moves = game.get_movements()
+            game.make_move(moves[random.randrange(len(moves))])
+        game.next_turn()
+
+
+def same_state(game, other):
+    return (
+        np.array_equal(game.board.nodes, other.board.nodes)
+        and np.array_equal(game.board.pieces, other.board.pieces)
+        and np.array_equal(game.attacks, other.attacks)
+        and np.array_equal(game.players, other.players)
+        and np.array_equal(game.history[:game.moves_count], other.history[:other.moves_count])
+        and game.rewards == other.rewards
+        and game.positions_counter == other.positions_counter
+        and game.turn == other.turn
+        and game.hash == other.hash
+        and game.moves_count == other.moves_count
+        and game.moves_without_capture == other.moves_without_capture
+        and game.game_state == other.game_state
+    )
+
+
+def test():
+    num_tests = 1000
+    random.seed(0)
+
+    for num_players in [2, 4]:
+        game = ChessFactory.create_game(
+            player_data=ChessFactory.create_player_data(num_players=num_players),
+            program_mode="matrix",
+            game_mode="wormhole",
+            size=(8, 8)
+        )
+        game.verbose = 0
+        play_random_moves(game, 20)
+
+        # Restoring after playing until the end has to give back the same game
+        reference = game.copy()
+        root = game.snapshot()
+        errors = 0
+        for _ in range(50):
+            play_random_moves(game, 200)
+            game.restore(root)
+            errors += not same_state(game, reference)
+
+        start = time.time()
+        for _ in range(num_tests):
+            game.copy()
+        copy_time = (time.time() - start) / num_tests
+
+        start = time.time()
+        for _ in range(num_tests):
+            game.snapshot(root)
+            game.restore(root)
+        snapshot_time = (time.time() - start) / num_tests
+
+        print(f'{num_players} players: {errors} restore errors')
+        print(f' - copy():             {copy_time * 1e6:.1f} us')
+        print(f' - snapshot/restore(): {snapshot_time * 1e6:.1f} us')
+
+
+test()
@@ -0,0 +1,108 @@
+from engine.utils.TranspositionTable import TranspositionTable, probe, store, BUCKET_SIZE
+
+from numba import njit
+import multiprocessing
+import numpy as np
+import time
+
+
+@njit(cache=True)
+def entry_score(key: np.uint64) -> np.int32:
+    """ Score stored with every key, to detect torn entries. """
+    return np.int32(key & np.uint64(0x7FFFFFFF))
+
+
+@njit(cache=True)
+def stress(entries, header, keys, depths, num_probes) -> int:
+    """ Stores every key, then probes num_probes random ones. Returns the torn entries found. """
+    move = np.zeros(2, dtype=np.uint8)
+    scores = np.empty(1, dtype=np.int32)
+    for i in range(keys.shape[0]):
+        scores[0] = entry_score(keys[i])
+        store(entries, header, keys[i], depths[i], 0, move, scores)
+
+    torn = 0
+    for i in range(num_probes):
+        key = keys[np.random.randint(keys.shape[0])]
+        index = probe(entries, header, key)
+        if index != -1 and entries[index // BUCKET_SIZE, index % BUCKET_SIZE].scores[0] != entry_score(key):
+            torn += 1
+    return torn
+
+
+def run_stress(table, keys, depths, num_probes):
+    return stress(table.entries, table.header, keys, depths, num_probes)
+
+
+def shared_worker(name, seed, num_keys, num_probes):
+    rng = np.random.default_rng(seed)
+    table = TranspositionTable(name=name)
+    torn = run_stress(table, rng.integers(1, 1 << 63, size=num_keys, dtype=np.uint64),
+                      rng.integers(1, 12, size=num_keys).astype(np.int8), num_probes)
+    table.close()
+    return torn
+
+
+def test(max_bytes=16 << 20, num_probes=2000000):
+    rng = np.random.default_rng(0)
+    table = TranspositionTable(max_bytes=max_bytes)
+    print(f'Table: {table.capacity} entries of {table.entries.dtype.itemsize} bytes, {table.nbytes / 2 ** 20:.1f} MB')
+    run_stress(table, np.ones(1, dtype=np.uint64), np.ones(1, dtype=np.int8), 1) # Compile
+
+    # Throughput and hit rate as the table fills up: once it is full, stores replace the shallowest entries
+    for load in [0.25, 0.5, 1, 2, 4]:
+        table.clear()
+        num_keys = int(load * table.capacity)
+        keys = rng.integers(1, 1 << 63, size=num_keys, dtype=np.uint64)
+        depths = rng.integers(1, 12, size=num_keys).astype(np.int8)
+        start = time.time()
+        run_stress(table, keys, depths, num_probes)
+        elapsed = time.time() - start
+        stats = table.stats()
+
+        stored = np.isin(keys, table.entries['key'])
+        deep, shallow = depths >= 8, depths <= 3
+        print(f'Load {load}: {(num_keys + num_probes) / elapsed / 1e6:.1f}M operations/s, hit rate '
+              f'{stats["hit_rate"]:.2f}, {stats["replacements"]} replacements, kept {stored[deep].mean():.2f} of the '
+              f'deep entries (depth >= 8) and {stored[shallow].mean():.2f} of the shallow ones (depth <= 3)')
+
+    # Entries of older searches go first
+    table.clear()
+    old_keys = rng.integers(1, 1 << 63, size=table.capacity, dtype=np.uint64)
+    run_stress(table, old_keys, np.full(table.capacity, 10, dtype=np.int8), 0)
+    for _ in range(3):
+        table.new_search()
+    new_keys = rng.integers(1, 1 << 63, size=table.capacity // 2, dtype=np.uint64)
+    run_stress(table, new_keys, np.full(table.capacity // 2, 2, dtype=np.int8), 0)
+    print(f'After 3 searches, shallow new entries kept {np.isin(new_keys, table.entries["key"]).mean():.2f}, '
+          f'deep old entries kept {np.isin(old_keys, table.entries["key"]).mean():.2f}')
+
+    # Python dictionary with the same operations, for reference
+    num_keys = table.capacity // 2
+    keys = rng.integers(1, 1 << 63, size=num_keys, dtype=np.uint64).tolist()
+    start = time.time()
+    d = {}
+    for key in keys:
+        d[key] = (entry_score(np.uint64(key)), 5, 0)
+    indexes = rng.integers(num_keys, size=num_probes)
+    for i in indexes:
+        d.get(keys[i])
+    print(f'Python dict: {(num_keys + num_probes) / (time.time() - start) / 1e6:.1f}M operations/s, '
+          f'unbounded memory')
+
+    # Several processes storing and probing the same table in shared memory
+    for num_workers in [2, 4]:
+        shared = TranspositionTable(max_bytes=max_bytes, shared=True)
+        ctx = multiprocessing.get_context('spawn')
+        start = time.time()
+        with ctx.Pool(num_workers) as pool:
+            torn = pool.starmap(shared_worker, [(shared.name, seed, shared.capacity // num_workers, num_probes)
+                                                for seed in range(num_workers)])
+        stats = shared.stats()
+        print(f'Shared memory, {num_workers} processes: {time.time() - start:.1f}s (with the process start), '
+              f'{len(shared)} entries, hit rate {stats["hit_rate"]:.2f}, {sum(torn)} torn entries read')
+        shared.close()
+
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,62 @@
+from engine.ChessFactory import ChessFactory
+from engine.agents.MonteCarloParallel import MonteCarloParallel
+from engine.agents.MonteCarloThreads import MonteCarloThreads
+from engine.agents.MCTSWorkerPool import MCTSWorkerPool
+
+import contextlib
+import io
+
+
+# Same positions as parallelization_test.py
+CONFIGS = [
+    (2, (8, 8), 'normal'),
+    (2, (8, 8), 'wormhole'),
+    (4, (8, 8), 'wormhole'),
+    (2, (6, 6), 'normal'),
+    (2, (6, 6), 'wormhole'),
+    (4, (6, 6), 'wormhole'),
+    (2, (5, 5), 'normal'),
+]
+
+
+def root_simulations(agent, game):
+    """ Simulations of the last search: visits of the moves of the root. """
+    player = game.get_turn(auto_play_bots=False)
+    _, hashes = game.get_movements(include_hashes=True)
+    if isinstance(agent, MonteCarloParallel):
+        return sum(agent.stats.visits[slot] for slot in agent.stats.find(player, hashes) if slot != -1)
+    return sum(agent.tree.visits[agent.tree.get_node(player, S)] for S in hashes)
+
+
+def test(workers=(1, 2, 4), seconds=2):
+    for num_players, size, game_mode in CONFIGS:
+        game = ChessFactory.create_game(
+            player_data=ChessFactory.create_player_data(num_players=num_players, types=['human']),
+            program_mode='matrix',
+            game_mode=game_mode,
+            size=size,
+        )
+        game.verbose = 0
+
+        results = []
+        for n in workers:
+            MCTSWorkerPool.get(n) # Started before measuring, as a server would
+            agents = [
+                MonteCarloParallel(game, num_workers=n, time=seconds),
+                MonteCarloThreads(game, num_threads=n, time=seconds),
+            ]
+            for agent in agents:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    agent.choose_move()
+                results.append(root_simulations(agent, game) / seconds)
+            agents[0].stats.close()
+
+        print(f'{num_players}_{size[0]}x{size[1]}_{game_mode} simulations/s: ' + ', '.join(
+            f'{n} workers {results[2 * i]:.0f} (processes) vs {results[2 * i + 1]:.0f} (threads)'
+            for i, n in enumerate(workers)))
+
+    MCTSWorkerPool.shutdown_all()
+
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,71 @@
+from engine.ChessFactory import ChessFactory
+from engine.agents.MonteCarloParallel import MonteCarloParallel
+from engine.agents.MCTSWorkerPool import MCTSWorkerPool, init_worker
+
+from concurrent.futures import ProcessPoolExecutor, wait
+import contextlib
+import io
+import multiprocessing
+import time
+
+
+def create_game():
+    game = ChessFactory.create_game(
+        player_data=ChessFactory.create_player_data(num_players=4, types=['human']),
+        program_mode='matrix',
+        game_mode='wormhole',
+        size=(8, 8),
+    )
+    game.verbose = 0
+    return game
+
+
+def per_move_pool(game, num_workers):
+    """ What every move paid before: a new pool, warmed up, receiving a copy of the game per worker. """
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(
+        max_workers=num_workers,
+        max_tasks_per_child=1,
+        mp_context=context,
+        initializer=init_worker,
+        initargs=(context.Lock(),)
+    ) as executor:
+        wait([executor.submit(game.copy().get_movements) for _ in range(num_workers)])
+
+
+def test(num_moves=5, seconds=3):
+    game = create_game()
+    for num_workers in [1, 2, 4]:
+        start = time.time()
+        per_move_pool(game, num_workers)
+        per_move_time = time.time() - start
+
+        start = time.time()
+        MCTSWorkerPool.get(num_workers)
+        pool_start_time = time.time() - start
+
+        # Overhead of a search with one simulation per worker
+        agent = MonteCarloParallel(game, num_workers=num_workers, simulations_per_move=num_workers)
+        with contextlib.redirect_stdout(io.StringIO()):
+            agent.choose_move()
+            start = time.time()
+            for _ in range(num_moves):
+                agent.choose_move()
+        search_time = (time.time() - start) / num_moves
+
+        agent = MonteCarloParallel(game, num_workers=num_workers, time=seconds)
+        with contextlib.redirect_stdout(io.StringIO()):
+            agent.choose_move()
+        _, hashes = game.get_movements(include_hashes=True)
+        simulations = sum(agent.stats.visits[slot] for slot in agent.stats.find(game.turn, hashes) if slot != -1)
+
+        print(f'{num_workers} workers: new pool per move {per_move_time:.2f}s, persistent pool started in '
+              f'{pool_start_time:.2f}s, then {search_time * 1000:.1f} ms per move (1 simulation per worker), '
+              f'{simulations} simulations in {seconds}s')
+        agent.stats.close()
+
+    MCTSWorkerPool.shutdown_all()
+
+
+if __name__ == "__main__":
+    test()
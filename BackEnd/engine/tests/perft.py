@@ -0,0 +1,167 @@
+import os
+import time
+import argparse
+from typing import Dict, List, Tuple
+
+from engine.ChessFactory import ChessFactory, POSITIONS_PATH, BOARD_FILES
+from engine.core.Game import Game
+from engine.core.GameMatrices import GameMatrices
+
+
+# Perft: number of leaf nodes of the move tree up to a given depth, using make/undo on a single game. 
+# Dead players are skipped without spending depth, and a player without legal moves is a leaf that does not 
+# count (as checkmates are counted in standard perft). Players whose king is captured are eliminated, 
+# as the base and layer engines do. 
+# The base and layer engines also generate castles, which the matrix engine does not, so their counts can 
+# only be higher than the matrix ones in positions where castling is possible. 
+
+PROGRAM_MODES = ['matrix', 'layer', 'base']
+
+
+def next_alive_turn(game: Game | GameMatrices, turn: int) -> int: 
+    for _ in range(game.number_of_players): 
+        turn = (turn + 1) % game.number_of_players
+        if is_alive(game, turn): 
+            return turn
+    return turn
+
+
+def is_alive(game: Game | GameMatrices, turn: int) -> bool: 
+    if isinstance(game, GameMatrices): 
+        return bool(game.players[turn]['is_alive'])
+    return game.players[turn].alive
+
+
+def legal_moves(game: Game | GameMatrices) -> List: 
+    """ Legal moves of the player in turn, copied because both engines reuse their move cache. """
+    if isinstance(game, GameMatrices): 
+        game._recalculate = True
+        return game.get_movements().copy()
+    game._cached_movements = None
+    return list(game.get_movements())
+
+
+def move_name(game: Game | GameMatrices, move) -> str: 
+    if isinstance(game, GameMatrices): 
+        return '-'.join(game.board.get_names(move))
+    return f'{move[0].name}-{move[1].name}'
+
+
+def make(game: Game | GameMatrices, move): 
+    if isinstance(game, GameMatrices): 
+        game.make_move(move)
+        return None
+    return game.make_move(move, store=False, update_hash=False)
+
+
+def undo(game: Game | GameMatrices, movement) -> None: 
+    if isinstance(game, GameMatrices): 
+        game.undo_move()
+    else: 
+        game.undo_move(movement, remove=False, update_hash=False)
+
+
+def perft(game: Game | GameMatrices, depth: int) -> int: 
+    if depth == 0: 
+        return 1
+    
+    moves = legal_moves(game)
+    if depth == 1: 
+        return len(moves)
+    
+    turn = game.turn
+    nodes = 0
+    for move in moves: 
+        movement = make(game, move)
+        game.turn = next_alive_turn(game, turn)
+        nodes += perft(game, depth - 1)
+        game.turn = turn
+        undo(game, movement)
+    return nodes
+
+
+def divide(game: Game | GameMatrices, depth: int) -> Dict[str, int]: 
+    """ Perft of every root move. """
+    turn = game.turn
+    result = {}
+    for move in legal_moves(game): 
+        movement = make(game, move)
+        game.turn = next_alive_turn(game, turn)
+        result[move_name(game, move)] = perft(game, depth - 1)
+        game.turn = turn
+        undo(game, movement)
+    return result
+
+
+def get_configs() -> List[Tuple[str, int, Tuple[int], str]]: 
+    """ Every (players, size, mode) combination with a starting position. """
+    configs = []
+    for f in sorted(os.listdir(POSITIONS_PATH)): 
+        if not f.endswith('.yaml'): 
+            continue
+        name = f[:-5]
+        num_players, size, game_mode = name.split('_')
+        configs.append((name, int(num_players), tuple(int(x) for x in size.split('x')), game_mode))
+    return configs
+
+
+def create_game(num_players: int, size: Tuple[int], game_mode: str, program_mode: str) -> Game | GameMatrices: 
+    game = ChessFactory.create_game(
+        player_data=ChessFactory.create_player_data(num_players=num_players), 
+        program_mode=program_mode, 
+        game_mode=game_mode, 
+        size=size
+    )
+    game.verbose = 0
+    return game
+
+
+def run(depth: int, configs: List[str] = None, program_modes: List[str] = PROGRAM_MODES, show_divide: bool = False) -> Dict: 
+    results = {}
+    for name, num_players, size, game_mode in get_configs(): 
+        if configs and name not in configs: 
+            continue
+
+        counts = {}
+        for program_mode in program_modes: 
+            if program_mode == 'matrix' and not os.path.exists(f'{BOARD_FILES}{size[0]}x{size[1]}_{game_mode}_LAYER.npz'): 
+                print(f'{name} [{program_mode}]: no matrix board config')
+                continue
+            try: 
+                game = create_game(num_players, size, game_mode, program_mode)
+            except Exception as e: 
+                print(f'{name} [{program_mode}]: could not create the game ({type(e).__name__}: {e})')
+                continue
+
+            if program_mode == 'matrix': 
+                perft(game, min(depth, 2)) # Compile the kernels before timing
+
+            start = time.time()
+            if show_divide: 
+                moves = divide(game, depth)
+                nodes = sum(moves.values())
+                for move, count in moves.items(): 
+                    print(f'  {move}: {count}')
+            else: 
+                nodes = perft(game, depth)
+            elapsed = time.time() - start
+
+            counts[program_mode] = nodes
+            nps = nodes / elapsed if elapsed > 0 else 0
+            print(f'{name} [{program_mode}] depth {depth}: {nodes} nodes in {elapsed:.3f}s ({nps:,.0f} nodes/s)')
+
+        if len(set(counts.values())) > 1: 
+            print(f'{name}: node counts differ between engines {counts}')
+        results[name] = counts
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Perft (move path enumeration) for every board config")
+    parser.add_argument("--depth", type=int, default=3, help="Depth of the search")
+    parser.add_argument("--config", nargs="*", default=None, help="Configs to run, e.g. 2_8x8_wormhole (default: all)")
+    parser.add_argument("--engine", nargs="*", default=PROGRAM_MODES, choices=PROGRAM_MODES, help="Engines to run")
+    parser.add_argument("--divide", action="store_true", help="Print the node count of every root move")
+    args = parser.parse_args()
+
+    run(args.depth, args.config, args.engine, args.divide)
@@ -0,0 +1,107 @@
+import numpy as np
+
+from engine.ChessFactory import ChessFactory
+from engine.core.matrices.playout import sample_legal_move
+from engine.core.matrices.matrix_constants import MAX_POSSIBLE_MOVES
+from engine.tests.legal_moves_test import get_positions, generated_moves
+
+
+def sampled_moves(game, team, num_samples):
+    """ Moves chosen by rejection sampling in num_samples independent draws (-1 if there was no legal move). """
+    b = game.board
+    moves = np.empty((MAX_POSSIBLE_MOVES, 2), dtype=np.uint8)
+    count = np.zeros(1, dtype=np.uint8)
+    king_trace = np.empty((MAX_POSSIBLE_MOVES, 2), dtype=np.uint8)
+    samples = []
+    for _ in range(num_samples):
+        index = sample_legal_move(team, b.nodes, b.pieces, b.adjacency_list, b.patterns_offsets, b.pieces_offsets,
+                                  b.tiles_offsets, moves, count, king_trace, game.history, game.moves_count,
+                                  b.promotion_zones, b.pieces_per_player)
+        samples.append(tuple(moves[index]) if index != -1 else -1)
+    return samples
+
+
+def compare_random_games(num_players, size, game_mode, initial_position, num_games, num_samples, rng):
+    """ Every sampled move must be legal, there must be one exactly when there are legal moves, and the
+    moves must be chosen uniformly (the largest deviation from the expected count is returned, in sigmas). """
+    positions, mismatches, max_deviation = 0, 0, 0.0
+    for _ in range(num_games):
+        game = ChessFactory.create_game(
+            player_data=ChessFactory.create_player_data(num_players=num_players),
+            program_mode='matrix',
+            game_mode=game_mode,
+            size=size,
+            initial_positions=initial_position,
+        )
+        game.verbose = 0
+
+        player = game.get_turn(auto_play_bots=False)
+        while not game.is_finished():
+            team = game.players[game.turn]['team']
+            legal_moves, _ = generated_moves(game, team)
+            legal_moves = [tuple(m) for m in legal_moves]
+            samples = sampled_moves(game, team, num_samples)
+
+            positions += 1
+            if len(legal_moves) == 0:
+                mismatches += any(s != -1 for s in samples)
+            elif any(s not in legal_moves for s in samples):
+                mismatches += 1
+                print(f'Illegal move sampled at move {game.moves_count}')
+            elif len(set(legal_moves)) > 1:
+                # A move can be in the list more than once (reached through different wormhole paths),
+                # it is then chosen that many times more often in both modes
+                for move in set(legal_moves):
+                    p = legal_moves.count(move) / len(legal_moves)
+                    deviation = abs(samples.count(move) - num_samples * p) / np.sqrt(num_samples * p * (1 - p))
+                    max_deviation = max(max_deviation, deviation)
+
+            if player == -1:
+                game.next_turn()
+                player = game.get_turn(auto_play_bots=False)
+                continue
+            moves = game.get_movements()
+            game.make_move(moves[rng.integers(len(moves))])
+            game.next_turn()
+            player = game.get_turn(auto_play_bots=False)
+
+    return positions, mismatches, max_deviation
+
+
+def compare_playouts(num_players, size, game_mode, initial_position, num_playouts):
+    """ Mean result of each player in playouts from the starting position, with and without rejection sampling. """
+    game = ChessFactory.create_game(
+        player_data=ChessFactory.create_player_data(num_players=num_players),
+        program_mode='matrix',
+        game_mode=game_mode,
+        size=size,
+        initial_positions=initial_position,
+    )
+    game.verbose = 0
+    game.get_turn(auto_play_bots=False)
+
+    results = []
+    for rejection_sampling in [False, True]:
+        rewards = np.array([game.random_playout(rejection_sampling=rejection_sampling) for _ in range(num_playouts)])
+        results.append(rewards.mean(axis=0))
+    return results
+
+
+def test(num_games=5, num_samples=200, num_playouts=2000):
+    rng = np.random.default_rng(0)
+    total_mismatches = 0
+    for name, num_players, size, game_mode, initial_position in get_positions():
+        positions, mismatches, max_deviation = compare_random_games(
+            num_players, size, game_mode, initial_position, num_games, num_samples, rng)
+        total_mismatches += mismatches
+
+        legal_rewards, sampled_rewards = compare_playouts(num_players, size, game_mode, initial_position, num_playouts)
+        print(f'{name}: {positions} positions, {mismatches} mismatches, max deviation from uniform {max_deviation:.1f} sigmas, '
+              f'mean rewards {np.round(legal_rewards, 3).tolist()} (legal) vs {np.round(sampled_rewards, 3).tolist()} (sampled)')
+
+    print(f'Total mismatches: {total_mismatches}')
+    assert total_mismatches == 0, f'{total_mismatches} mismatches'
+
+
+if __name__ == "__main__":
+    test()
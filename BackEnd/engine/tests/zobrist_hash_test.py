@@ -0,0 +1,107 @@
+import numpy as np
+
+from engine.ChessFactory import ChessFactory
+from engine.utils.ZobristHasherMatrices import ZobristHasher
+from engine.tests.legal_moves_test import get_positions
+from engine.tests.make_undo_test import play_move
+
+
+def full_hash(game):
+    """ Hash of the game computed from scratch. """
+    return game.hasher.compute_hash(game.board.pieces, game.turn, game.players['is_alive'][:game.number_of_players])
+
+
+def check_random_games(num_players, size, game_mode, initial_position, num_games, rng):
+    """ Plays random games checking that the hash kept by the game is the one computed from scratch, that the hashes
+    of the legal moves are the ones of the positions they lead to, and that the counted positions include the
+    player to move. Returns the positions checked and the mismatches. """
+    positions, mismatches = 0, 0
+    for _ in range(num_games):
+        game = ChessFactory.create_game(
+            player_data=ChessFactory.create_player_data(num_players=num_players),
+            program_mode='matrix',
+            game_mode=game_mode,
+            size=size,
+            initial_positions=initial_position,
+        )
+        game.verbose = 0
+
+        while not game.is_finished():
+            positions += 1
+            if game.hash != full_hash(game):
+                mismatches += 1
+                print(f'Hash of the game differs from the computed one at move {game.moves_count}')
+
+            if game.get_turn(auto_play_bots=False) == -1:
+                game.next_turn()
+                continue
+
+            moves, hashes = game.get_movements(include_hashes=True)
+            i = rng.integers(len(moves))
+            game.make_move(moves[i], store=False)
+            if game.hash != hashes[i] or game.hash != full_hash(game):
+                mismatches += 1
+                print(f'Hash of the move {game.translate_movement_to_str(moves[i])} differs')
+            game.undo_move(remove=False)
+
+            alive = game.players['is_alive'].sum()
+            play_move(game, rng)
+            if not game.is_finished() and game.players['is_alive'].sum() == alive:
+                # Nobody was killed: the position was counted with the player now in turn
+                if game.position_hashes[-1] != game.hash:
+                    mismatches += 1
+                    print(f'Position of move {game.moves_count} not counted with the player in turn')
+    return positions, mismatches
+
+
+def check_keys():
+    """ The turn and the players alive change the hash, and the 128 bit keys extend the 64 bit hash. """
+    game = ChessFactory.create_game(
+        player_data=ChessFactory.create_player_data(num_players=4),
+        program_mode='matrix',
+        game_mode='wormhole',
+        size=(8, 8),
+    )
+    game.verbose = 0
+    pieces, alive = game.board.pieces, game.players['is_alive'][:4].copy()
+    hasher = game.hasher
+
+    distinct = {hasher.compute_hash(pieces, turn, alive) for turn in range(4)}
+    for player in range(4):
+        dead = alive.copy()
+        dead[player] = False
+        distinct.add(hasher.compute_hash(pieces, 0, dead))
+
+    initial_hash = game.hash
+    game.kill_player(game.players[1])
+    killed_hash = game.hash
+    game.revive_player(game.players[1])
+
+    wide = ZobristHasher(hash_size=128)
+    key = wide.compute_key(pieces, 0, alive)
+    return (
+        len(distinct) == 8
+        and killed_hash == hasher.compute_hash(pieces, 0, game.players['is_alive'][:4]) ^ hasher.alive_keys[1]
+        and killed_hash != initial_hash
+        and game.hash == initial_hash
+        and key & ((1 << 64) - 1) == int(hasher.compute_hash(pieces, 0, alive))
+        and key >> 64 != 0
+    )
+
+
+def test(num_games=5):
+    rng = np.random.default_rng(0)
+    total_mismatches = 0
+    for name, num_players, size, game_mode, initial_position in get_positions():
+        positions, mismatches = check_random_games(num_players, size, game_mode, initial_position, num_games, rng)
+        total_mismatches += mismatches
+        print(f'{name}: {positions} positions, {mismatches} mismatches')
+
+    keys_ok = check_keys()
+    print(f'Total mismatches: {total_mismatches}, turn / alive / 128 bit keys: {"ok" if keys_ok else "wrong"}')
+    assert total_mismatches == 0, f'{total_mismatches} mismatches'
+    assert keys_ok, 'the turn, alive or 128 bit keys are wrong'
+
+
+if __name__ == "__main__":
+    test()
@@ -0,0 +1,50 @@
+from typing import Tuple
+import threading
+import weakref
+
+import numpy as np
+
+from engine.utils.LRUCache import LRUCache
+
+
+# Outputs of an AlphaZero network for the positions it evaluated recently, so the positions of the previous
+# searches (the subtree of the move played, the other games of the process) are not evaluated again.
+# The key is (player in turn, position hash). Every entry keeps the hashes of the positions the legal moves lead to,
+# with their priors, and the value of the position, so the priors do not depend on the order of the moves.
+# There is one cache per network object (for_network), shared by every agent and game using it. A network replaced
+# in the ModelRegistry is a new object, with a new cache; a network trained in place must clear its cache.
+
+ENTRY_DTYPE = np.dtype([('hash', np.uint64), ('prior', np.float32)])
+
+
+class InferenceCache(LRUCache):
+    _caches = weakref.WeakKeyDictionary()
+    _caches_lock = threading.Lock()
+
+    def __init__(self, max_entries: int = 100000) -> None:
+        super().__init__(max_entries)
+
+    @classmethod
+    def for_network(cls, network, max_entries: int = 100000) -> 'InferenceCache':
+        """ Cache shared by every user of the network, created the first time it is asked for. """
+        cache = cls._caches.get(network)
+        if cache is None:
+            with cls._caches_lock:
+                cache = cls._caches.get(network)
+                if cache is None:
+                    cache = cls(max_entries)
+                    cls._caches[network] = cache
+        return cache
+
+    def load(self, player: int, position_hash: int) -> Tuple[np.array, float]:
+        """ Priors of the moves (as hash, prior entries) and value of the position, None if it is not in the cache. """
+        return self.get((player, int(position_hash)))
+
+    def store(self, player: int, position_hash: int, hashes: np.array, priors: np.array, value: float) -> None:
+        priors_entry = np.empty(len(hashes), dtype=ENTRY_DTYPE)
+        priors_entry['hash'] = hashes
+        priors_entry['prior'] = priors
+        self.put((player, int(position_hash)), (priors_entry, float(value)))
+
+    def entry_bytes(self, entry: Tuple[np.array, float]) -> int:
+        return entry[0].nbytes
@@ -0,0 +1,58 @@
+from collections import OrderedDict
+from typing import Any, Hashable
+import threading
+
+
+class LRUCache:
+    """ Bounded mapping that evicts the least recently used entry when it is full. Thread safe, and it counts
+    the hits, misses and evictions. The caches of the engine (MoveCache, InferenceCache) are built on it. """
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: Hashable) -> Any:
+        """ The entry of key (now the most recently used), None if it is not in the cache. """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        return entry
+
+    def put(self, key: Hashable, entry: Any) -> None:
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def entry_bytes(self, entry: Any) -> int:
+        """ Memory of an entry, for stats. """
+        return 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'bytes': sum(self.entry_bytes(entry) for entry in list(self.entries.values())),
+        }
@@ -0,0 +1,40 @@
+import numpy as np
+
+from engine.utils.LRUCache import LRUCache
+
+
+# Legal moves of the positions seen recently, so a position visited again (MCTS descents, repetitions, the API
+# asking for the moves of the same position) does not generate them again. The key is the position hash, which
+# includes the player in turn and the players alive, so it identifies the moves of the player to move.
+# Every entry packs the moves and the hashes of the positions they lead to in a single array. When the cache is
+# full, the least recently used entry is evicted. The cache can be shared by copies of the same game (and by the
+# threads playing them).
+
+ENTRY_DTYPE = np.dtype([('move', np.uint8, (2,)), ('hash', np.uint64)])
+
+
+class MoveCache(LRUCache):
+    def __init__(self, max_entries: int = 100000) -> None:
+        super().__init__(max_entries)
+
+    def load(self, key: int, out_moves: np.array, out_hashes: np.array, out_count: np.array) -> bool:
+        """ Writes the moves of the position into the buffers, as generate_legal_moves does.
+        Returns False if the position is not in the cache. """
+        entry = self.get(key)
+        if entry is None:
+            return False
+
+        count = len(entry)
+        out_moves[:count] = entry['move']
+        out_hashes[:count] = entry['hash']
+        out_count[0] = count
+        return True
+
+    def store(self, key: int, moves: np.array, hashes: np.array) -> None:
+        entry = np.empty(len(moves), dtype=ENTRY_DTYPE)
+        entry['move'] = moves
+        entry['hash'] = hashes
+        self.put(key, entry)
+
+    def entry_bytes(self, entry: np.array) -> int:
+        return entry.nbytes
@@ -0,0 +1,190 @@
+from multiprocessing import shared_memory
+
+from numba import njit
+import numpy as np
+
+
+# Transposition table with a fixed memory budget, usable from compiled code.
+# The entries are a structured numpy array of buckets of BUCKET_SIZE entries. A key is looked up in its bucket
+# only (key & (buckets - 1)), and a store into a full bucket replaces the entry with the lowest priority: its depth,
+# minus AGE_WEIGHT for every search since it was stored. Key 0 marks the empty entries (a key 0 is stored as 1).
+# The compiled functions take the entries and the header, so a search kernel receives both arrays;
+# TranspositionTable is the python side: allocation (optionally in shared memory), age and counters.
+# Entries are not locked: processes writing the same entry at the same time can leave it torn. Searches
+# have to tolerate it as they tolerate a key collision (the move of an entry is only used for ordering).
+
+BUCKET_SIZE = 4
+AGE_WEIGHT = 4
+
+# Header: [buckets, values per entry, age, probes, hits, stores, replacements, unused]
+HEADER_SIZE = 8
+BUCKETS = 0
+VALUES = 1
+AGE = 2
+PROBES = 3
+HITS = 4
+STORES = 5
+REPLACEMENTS = 6
+
+EXACT = 0
+LOWER_BOUND = 1
+UPPER_BOUND = 2
+
+
+def entry_dtype(values: int = 1) -> np.dtype:
+    """ An entry stores values scores (one per player for max^n searches). """
+    return np.dtype([
+        ('key', np.uint64),
+        ('scores', np.int32, (values,)),
+        ('move', np.uint8, (2,)),
+        ('depth', np.int8),
+        ('flag', np.int8),
+        ('age', np.uint8),
+    ], align=True)
+
+
+@njit(cache=True)
+def table_key(key: np.uint64) -> np.uint64:
+    return key if key != 0 else np.uint64(1)
+
+
+@njit(cache=True)
+def probe(entries: np.array, header: np.array, key: np.uint64) -> int:
+    """ Index of the entry of the key (bucket * BUCKET_SIZE + position), -1 if it is not in the table. """
+    key = table_key(key)
+    bucket = np.int64(key & np.uint64(entries.shape[0] - 1))
+    header[PROBES] += 1
+    for i in range(BUCKET_SIZE):
+        if entries[bucket, i].key == key:
+            header[HITS] += 1
+            return bucket * BUCKET_SIZE + i
+    return -1
+
+
+@njit(cache=True)
+def store(entries: np.array, header: np.array, key: np.uint64, depth: int, flag: int, move: np.array,
+          scores: np.array) -> None:
+    """ Stores the entry, over the one of the same key if there is one, else over an empty or the least valuable one. """
+    key = table_key(key)
+    bucket = np.int64(key & np.uint64(entries.shape[0] - 1))
+    age = header[AGE]
+    victim = 0
+    victim_priority = np.iinfo(np.int64).max
+    for i in range(BUCKET_SIZE):
+        entry_key = entries[bucket, i].key
+        if entry_key == key or entry_key == 0:
+            victim = i
+            victim_priority = np.iinfo(np.int64).min
+            break
+        priority = np.int64(entries[bucket, i].depth) - AGE_WEIGHT * ((age - entries[bucket, i].age) & 255)
+        if priority < victim_priority:
+            victim = i
+            victim_priority = priority
+
+    entry = entries[bucket, victim]
+    if victim_priority != np.iinfo(np.int64).min:
+        header[REPLACEMENTS] += 1
+    header[STORES] += 1
+    entry.key = key
+    for i in range(scores.shape[0]):
+        entry.scores[i] = scores[i]
+    entry.move[0] = move[0]
+    entry.move[1] = move[1]
+    entry.depth = depth
+    entry.flag = flag
+    entry.age = age
+
+
+class TranspositionTable:
+    """ Fixed size transposition table (see above). With shared=True the table lives in shared memory and other
+    processes can attach to it with TranspositionTable(name=table.name). """
+    def __init__(self, max_bytes: int = 16 << 20, values: int = 1, shared: bool = False, name: str = None) -> None:
+        self.shm = None
+        self.owner = name is None
+        if self.owner:
+            dtype = entry_dtype(values)
+            buckets = 1
+            while self.nbytes_for(2 * buckets, dtype) <= max_bytes:
+                buckets *= 2
+            if shared:
+                self.shm = shared_memory.SharedMemory(create=True, size=self.nbytes_for(buckets, dtype))
+                buffer = self.shm.buf
+            else:
+                buffer = bytearray(self.nbytes_for(buckets, dtype))
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            buffer = self.shm.buf
+            buckets, values = np.ndarray(HEADER_SIZE, dtype=np.int64, buffer=buffer)[:2]
+            dtype = entry_dtype(int(values))
+
+        self.header = np.ndarray(HEADER_SIZE, dtype=np.int64, buffer=buffer)
+        self.entries = np.ndarray((int(buckets), BUCKET_SIZE), dtype=dtype, buffer=buffer,
+                                  offset=HEADER_SIZE * np.dtype(np.int64).itemsize)
+        if self.owner:
+            self.header[:] = 0
+            self.header[BUCKETS] = buckets
+            self.header[VALUES] = values
+            self.entries['key'] = 0
+
+    @staticmethod
+    def nbytes_for(buckets: int, dtype: np.dtype) -> int:
+        return HEADER_SIZE * np.dtype(np.int64).itemsize + buckets * BUCKET_SIZE * dtype.itemsize
+
+    @property
+    def name(self) -> str:
+        return self.shm.name if self.shm is not None else None
+
+    @property
+    def capacity(self) -> int:
+        return self.entries.size
+
+    @property
+    def nbytes(self) -> int:
+        return self.nbytes_for(self.entries.shape[0], self.entries.dtype)
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.entries['key']))
+
+    def new_search(self) -> None:
+        """ Ages the entries stored so far, they are replaced first. """
+        self.header[AGE] = (self.header[AGE] + 1) % 256
+
+    def clear(self) -> None:
+        self.entries['key'] = 0
+        self.header[AGE:] = 0
+
+    def probe(self, key: int):
+        """ The entry of the key (a record of the table, writes go to the table), None if not found. """
+        index = probe(self.entries, self.header, np.uint64(key))
+        return None if index == -1 else self.entries.reshape(-1)[index]
+
+    def store(self, key: int, depth: int, flag: int, move, scores) -> None:
+        store(self.entries, self.header, np.uint64(key), depth, flag, np.asarray(move, dtype=np.uint8),
+              np.asarray(scores, dtype=np.int32).reshape(-1))
+
+    def stats(self) -> dict:
+        probes, hits = int(self.header[PROBES]), int(self.header[HITS])
+        return {
+            'entries': len(self),
+            'capacity': self.capacity,
+            'bytes': self.nbytes,
+            'probes': probes,
+            'hits': hits,
+            'misses': probes - hits,
+            'hit_rate': hits / probes if probes else 0.0,
+            'stores': int(self.header[STORES]),
+            'replacements': int(self.header[REPLACEMENTS]),
+        }
+
+    def close(self) -> None:
+        if getattr(self, 'shm', None) is None:
+            return
+        # The views must be released before the memory is unmapped
+        self.header = self.entries = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+        self.shm = None
+
+    def __del__(self) -> None:
+        self.close()
@@ -1,43 +1,104 @@
+from numba import njit
 import numpy as np
 import random
 
 
+# Zobrist hashing of the matrix boards. The hash of a position is the XOR of
+#   - a key for every piece on the board (type, colour, tile),
+#   - the turn key of the player in turn,
+#   - the alive key of every player alive,
+# so the same pieces with another player to move, or another set of players alive, is another position.
+# The compiled search and playout kernels receive the board hash (pieces only) and the state keys, and add the keys
+# of the turn and the alive players where they need the hash of a position (see state_key).
+# With hash_size=128 a second set of independent keys gives the high word of the key (compute_key). The 64 bit hash,
+# the one GameMatrices keeps up to date, is always the low word.
+
+# Rows of the state keys
+TURN_KEYS = 0
+ALIVE_KEYS = 1
+
+
+@njit(cache=True)
+def state_key(turn: int, alive: np.array, state_keys: np.array) -> np.uint64:
+    """ Keys of the player in turn and the players alive. """
+    key = state_keys[TURN_KEYS, turn]
+    for i in range(alive.shape[0]):
+        if alive[i]:
+            key ^= state_keys[ALIVE_KEYS, i]
+    return key
+
+
+@njit(cache=True)
+def compute_hash(pieces: np.array, turn: int, alive: np.array, table: np.array, state_keys: np.array) -> np.uint64:
+    h = state_key(turn, alive, state_keys)
+    for i in range(pieces.shape[0]):
+        if pieces[i, 0] != -1 and pieces[i, 4] == 0:
+            h ^= table[pieces[i, 0], pieces[i, 1], pieces[i, 2]]
+    return h
+
+
 class ZobristHasher:
-    _shared_table = None
+    _shared_tables = {}
 
-    def __init__(self, 
-                 num_piece_types: int = 6, 
-                 num_players: int = 4, 
-                 num_positions: int = 144, 
-                 hash_size: int = 64, 
+    def __init__(self,
+                 num_piece_types: int = 6,
+                 num_players: int = 4,
+                 num_positions: int = 144,
+                 hash_size: int = 64,
                  seed: int = 42) -> None:
 
+        if hash_size not in (64, 128):
+            raise ValueError(f"Unsupported hash size: {hash_size} (64 or 128 bits)")
+
         self.num_piece_types = num_piece_types
         self.num_players = num_players
         self.num_positions = num_positions
         self.hash_size = hash_size
 
-        if ZobristHasher._shared_table is None:
+        # The keys of every word are drawn after the ones of the previous word, so the low word (the 64 bit hash)
+        # is the same for both sizes
+        words = hash_size // 64
+        shape = (num_piece_types, num_players, num_positions, words, seed)
+        if shape not in ZobristHasher._shared_tables:
             rng = random.Random(seed)
-            ZobristHasher._shared_table = [
-                [
-                    [rng.getrandbits(hash_size) for _ in range(num_positions)]
-                    for _ in range(num_players)
-                ]
-                for _ in range(num_piece_types)
-            ]
-            ZobristHasher._shared_table = np.array(ZobristHasher._shared_table, dtype=np.uint64)
-
-        self.table = ZobristHasher._shared_table
-
-    def compute_hash(self, pieces: np.array) -> int:
-        h = 0
-        for piece in pieces: 
-            if piece[0] != -1 and not piece[4]: 
-                h ^= self.table[piece[0]][piece[1]][piece[2]]
-        return h
-
-    def update_hash(self, old_hash: int, movement: np.array, pieces: np.array) -> int: 
+            tables, state_tables = [], []
+            for _ in range(words):
+                tables.append([
+                    [
+                        [rng.getrandbits(64) for _ in range(num_positions)]
+                        for _ in range(num_players)
+                    ]
+                    for _ in range(num_piece_types)
+                ])
+                state_tables.append([
+                    [rng.getrandbits(64) for _ in range(num_players)]
+                    for _ in (TURN_KEYS, ALIVE_KEYS)
+                ])
+            ZobristHasher._shared_tables[shape] = (
+                np.array(tables, dtype=np.uint64),
+                np.array(state_tables, dtype=np.uint64)
+            )
+
+        self.tables, self.state_tables = ZobristHasher._shared_tables[shape]
+        self.table = self.tables[0]
+        self.state_keys = self.state_tables[0]
+        self.turn_keys = self.state_keys[TURN_KEYS]
+        self.alive_keys = self.state_keys[ALIVE_KEYS]
+
+    def compute_hash(self, pieces: np.array, turn: int, alive: np.array) -> np.uint64:
+        return np.uint64(compute_hash(pieces, turn, alive, self.table, self.state_keys))
+
+    def compute_key(self, pieces: np.array, turn: int, alive: np.array) -> int:
+        """ Key of hash_size bits, the 64 bit hash is its low word. """
+        key = 0
+        for word in range(self.tables.shape[0]):
+            key |= int(compute_hash(pieces, turn, alive, self.tables[word], self.state_tables[word])) << (64 * word)
+        return key
+
+    def state_key(self, turn: int, alive: np.array) -> np.uint64:
+        return np.uint64(state_key(turn, alive, self.state_keys))
+
+    def update_hash(self, old_hash: int, movement: np.array, pieces: np.array) -> int:
         moving_piece_index, origin_tile, destination_tile, captured_piece_index, _, original_type, new_type = movement
 
         piece = pieces[moving_piece_index]
@@ -46,9 +107,8 @@ class ZobristHasher:
         old_hash ^= self.table[original_type][color][origin_tile]
         old_hash ^= self.table[new_type][color][destination_tile]
 
-        if captured_piece_index != -1: 
+        if captured_piece_index != -1:
             captured_piece = pieces[captured_piece_index]
             old_hash ^= self.table[captured_piece[0]][captured_piece[1]][destination_tile]
 
         return old_hash
-    
\ No newline at end of file
@@ -295,7 +295,17 @@ const PlayLocalPage = () => {
                                                 <>
                                                     <option value="mcts">mcts</option>
                                                     <option value="mcts-parallel">mcts (parallel)</option>
+                                                    <option value="mcts-threads">mcts (threads)</option>
                                                     <option value="alphazero">alphazero</option>
+                                                    {playerCount === 2 && (
+                                                        <option value="alphabeta">alpha-beta</option>
+                                                    )}
+                                                    {playerCount === 4 && (
+                                                        <>
+                                                            <option value="paranoid">paranoid</option>
+                                                            <option value="maxn">max^n</option>
+                                                        </>
+                                                    )}
                                                 </>
                                             )}
                                         </select>